@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""Attention fusion and query-sliced attention for exported UNet and text encoder.
+
+torch.onnx traces every attention layer as a chain of separate ops:
+
+    q, k, v projections -> Reshape/Transpose into heads
+    MatMul(q, k^T) -> Mul/Div by the scale [-> Add mask] -> Softmax
+    MatMul(probs, v) -> Transpose/Reshape back to (batch, tokens, channels)
+
+and the full (batch, heads, tokens, tokens) score matrix is materialized.
+This rewrite finds those chains and replaces each one with either
+
+- fused: one com.microsoft MultiHeadAttention op, when the execution
+  provider implements it, or
+- sliced: a Loop over chunks of --slice-size query rows, so only a
+  (batch, heads, slice_size, key_tokens) block of scores exists at a time.
+
+--mode auto uses the fused op where it is available and the sliced subgraph
+otherwise. A probe run at a small size reads the head count and the block
+shapes, and every candidate is checked numerically against its original
+chain before it is rewritten; chains that do not match are left untouched.
+"""
+
+import argparse
+import sys
+
+import numpy as np
+import onnx
+import onnxruntime as ort
+from onnx import TensorProto, helper, numpy_helper
+
+from graph_rewrite import (GraphBuilder, consumers_of, default_opset, load_model, probe_tensors, producers_of,
+                           remove_unused_nodes, save_model, topological_sort)
+
+MODES = ["auto", "fused", "sliced"]
+DEFAULT_SLICE_SIZE = 1024
+MIN_OPSET = 13  # Softmax over the last axis only, Unsqueeze/Squeeze axes as inputs
+FUSED_DOMAIN = "com.microsoft"
+# Depth limit when deciding which operand of a score Add is the mask
+MAX_SCORE_DEPTH = 8
+
+
+def _constants(graph):
+    """Scalar constants by name, from initializers and Constant nodes"""
+    constants = {}
+    for init in graph.initializer:
+        if int(np.prod(init.dims)) == 1:
+            constants[init.name] = float(numpy_helper.to_array(init).reshape(()))
+    for node in graph.node:
+        if node.op_type == "Constant" and node.attribute and node.attribute[0].name == "value":
+            value = numpy_helper.to_array(node.attribute[0].t)
+            if value.size == 1:
+                constants[node.output[0]] = float(value.reshape(()))
+    return constants
+
+
+def _scaled_operand(node, constants):
+    """(operand, factor) when node multiplies or divides by a constant scalar"""
+    if node.op_type not in ("Mul", "Div") or len(node.input) != 2:
+        return None
+    a, b = node.input
+    if b in constants and constants[b] != 0:
+        return a, constants[b] if node.op_type == "Mul" else 1.0 / constants[b]
+    if node.op_type == "Mul" and a in constants:
+        return b, constants[a]
+    return None
+
+
+def _walk_heads(name, producers, constants, allow_scale):
+    """Follow a head-split tensor back through Reshape/Transpose (and scalar scaling) to its source"""
+    scale = 1.0
+    while name in producers:
+        node = producers[name]
+        if node.op_type in ("Reshape", "Transpose"):
+            name = node.input[0]
+            continue
+        scaled = _scaled_operand(node, constants) if allow_scale else None
+        if scaled is None:
+            break
+        name, factor = scaled
+        scale *= factor
+    return name, scale
+
+
+def _is_zero(name, producers, constants):
+    """True for x * 0, as traced from baddbmm(..., beta=0)"""
+    node = producers.get(name)
+    return (node is not None and node.op_type == "Mul"
+            and any(constants.get(operand) == 0 for operand in node.input))
+
+
+def _reaches_matmul(name, producers, constants, depth=MAX_SCORE_DEPTH):
+    node = producers.get(name)
+    if node is None or depth == 0:
+        return False
+    if node.op_type == "MatMul":
+        return not any(operand in constants for operand in node.input)
+    if node.op_type == "Reshape":
+        return _reaches_matmul(node.input[0], producers, constants, depth - 1)
+    scaled = _scaled_operand(node, constants)
+    if scaled is not None:
+        return _reaches_matmul(scaled[0], producers, constants, depth - 1)
+    if node.op_type == "Add":
+        return any(_reaches_matmul(operand, producers, constants, depth - 1) for operand in node.input)
+    return False
+
+
+def find_attention_blocks(graph):
+    """
+    Find traced scaled dot-product attention chains.
+
+    Each block is a Softmax over MatMul(q, k^T) - through constant scalar
+    scaling, Reshapes and additive masks - whose only consumer is
+    MatMul(probs, v). q, k and v are followed back through the head
+    Reshape/Transpose ops to their (batch, tokens, channels) sources, and
+    the output is followed forward through the merging Transpose/Reshape ops.
+    """
+    producers = producers_of(graph)
+    consumers = consumers_of(graph)
+    constants = _constants(graph)
+    blocks = []
+    for softmax in graph.node:
+        if softmax.op_type != "Softmax":
+            continue
+        probs = softmax.output[0]
+        if len(consumers[probs]) != 1:
+            continue
+        pv = consumers[probs][0]
+        if pv.op_type != "MatMul" or pv.input[0] != probs:
+            continue
+
+        # Back from the scores to MatMul(q, k^T), collecting scale and masks
+        name, scale, masks, qk = softmax.input[0], 1.0, [], None
+        while name in producers:
+            node = producers[name]
+            if node.op_type == "MatMul":
+                qk = node
+                break
+            if node.op_type == "Reshape":
+                name = node.input[0]
+                continue
+            scaled = _scaled_operand(node, constants)
+            if scaled is not None:
+                name, factor = scaled
+                scale *= factor
+                continue
+            if node.op_type == "Add":
+                scores = [operand for operand in node.input if _reaches_matmul(operand, producers, constants)]
+                if len(scores) != 1:
+                    break
+                mask = node.input[1] if node.input[0] == scores[0] else node.input[0]
+                if not _is_zero(mask, producers, constants):
+                    masks.append(mask)
+                name = scores[0]
+                continue
+            break
+        if qk is None:
+            continue
+
+        q, q_scale = _walk_heads(qk.input[0], producers, constants, allow_scale=True)
+        k, k_scale = _walk_heads(qk.input[1], producers, constants, allow_scale=True)
+        v, _ = _walk_heads(pv.input[1], producers, constants, allow_scale=False)
+
+        # Forward from the attention output through the head-merging ops
+        chain = [pv.output[0]]
+        while len(consumers[chain[-1]]) == 1 and consumers[chain[-1]][0].op_type in ("Reshape", "Transpose"):
+            chain.append(consumers[chain[-1]][0].output[0])
+
+        blocks.append({
+            "name": softmax.name or probs,
+            "q": q,
+            "k": k,
+            "v": v,
+            "scale": scale * q_scale * k_scale,
+            "masks": masks,
+            "probs": probs,
+            "chain": chain,
+        })
+    return blocks
+
+
+def _split_heads(x, heads):
+    batch, tokens, channels = x.shape
+    return x.reshape(batch, tokens, heads, channels // heads).transpose(0, 2, 1, 3)
+
+
+def reference_attention(q, k, v, heads, scale, mask=None):
+    """Multi-head attention in numpy on (batch, tokens, channels) inputs"""
+    scores = np.matmul(_split_heads(q, heads), _split_heads(k, heads).transpose(0, 1, 3, 2)) * scale
+    if mask is not None:
+        scores = scores + mask
+    scores = np.exp(scores - scores.max(axis=-1, keepdims=True))
+    probs = scores / scores.sum(axis=-1, keepdims=True)
+    out = np.matmul(probs, _split_heads(v, heads)).transpose(0, 2, 1, 3)
+    return out.reshape(q.shape[0], q.shape[1], v.shape[2])
+
+
+def resolve_block(block, values):
+    """
+    Check a block against its probe values.
+
+    Returns (None, details) when the chain computes multi-head attention
+    with the found scale - details has heads, output and mask_shape - or
+    (reason, None) when it does not.
+    """
+    q, k, v = values[block["q"]], values[block["k"]], values[block["v"]]
+    if q.ndim != 3 or k.ndim != 3 or v.ndim != 3:
+        return "q/k/v are not (batch, tokens, channels) tensors", None
+    if q.shape[0] != k.shape[0] or k.shape[:2] != v.shape[:2] or q.shape[2] != k.shape[2]:
+        return "q/k/v shapes do not match", None
+    probs = values[block["probs"]]
+    heads = probs.shape[1] if probs.ndim == 4 else probs.shape[0] // q.shape[0]
+    if heads < 1 or q.shape[2] % heads or v.shape[2] % heads:
+        return f"channels are not divisible by {heads} heads", None
+
+    mask = None
+    for name in block["masks"]:
+        if values[name].ndim != 4:
+            return "mask is not (batch, heads, query, key) shaped", None
+        mask = values[name] if mask is None else mask + values[name]
+
+    target = (q.shape[0], q.shape[1], v.shape[2])
+    outputs = [name for name in block["chain"] if values[name].shape == target]
+    if not outputs:
+        return "attention output is not merged back to (batch, tokens, channels)", None
+    output = outputs[-1]
+
+    expected = values[output]
+    actual = reference_attention(q, k, v, heads, block["scale"], mask)
+    tolerance = 1e-4 * max(1.0, float(np.abs(expected).max()))
+    if not np.allclose(actual, expected, rtol=1e-3, atol=tolerance):
+        return "chain does not compute multi-head attention", None
+    return None, {"heads": heads, "output": output, "mask_shape": None if mask is None else mask.shape,
+                  "dtype": q.dtype, "channels": q.shape[2], "value_channels": v.shape[2], "query_tokens": q.shape[1],
+                  "key_tokens": k.shape[1]}
+
+
+def fused_attention_available(providers=None):
+    """True when the providers run com.microsoft MultiHeadAttention"""
+    node = helper.make_node("MultiHeadAttention", ["q", "k", "v"], ["o"], domain=FUSED_DOMAIN, num_heads=1)
+    graph = helper.make_graph(
+        [node], "mha_check",
+        [helper.make_tensor_value_info(name, TensorProto.FLOAT, [1, 2, 4]) for name in "qkv"],
+        [helper.make_tensor_value_info("o", TensorProto.FLOAT, [1, 2, 4])],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17),
+                                                    helper.make_opsetid(FUSED_DOMAIN, 1)])
+    model.ir_version = 8
+    try:
+        session = ort.InferenceSession(model.SerializeToString(), providers=providers or ["CPUExecutionProvider"])
+        feed = {name: np.ones((1, 2, 4), dtype=np.float32) for name in "qkv"}
+        session.run(None, feed)
+    except Exception:
+        return False
+    return True
+
+
+def _combined_mask(b, block):
+    mask = block["masks"][0]
+    for name in block["masks"][1:]:
+        mask = b.op("Add", [mask, name])
+    return mask
+
+
+def _fused_supported(block, details):
+    """MultiHeadAttention takes an attention bias of (batch or 1, heads or 1, query, key)"""
+    shape = details["mask_shape"]
+    return shape is None or (shape[2] == details["query_tokens"] and shape[3] == details["key_tokens"])
+
+
+def insert_fused_attention(graph, block, details):
+    """Replace one chain with a MultiHeadAttention node writing the block output"""
+    b = GraphBuilder(graph, block["name"] + "/fused")
+    inputs = [block["q"], block["k"], block["v"]]
+    if block["masks"]:
+        inputs += ["", "", _combined_mask(b, block)]
+    b.op("MultiHeadAttention", inputs, domain=FUSED_DOMAIN, num_heads=details["heads"], scale=block["scale"])
+    graph.node[-1].output[0] = details["output"]
+
+
+def insert_sliced_attention(graph, block, details, slice_size):
+    """
+    Replace one chain with attention computed slice_size query rows at a time.
+
+    Queries are padded to a whole number of slices; a Loop computes each
+    slice's scores, softmax and weighted values, and its scan output is
+    merged back and cropped to the real token count.
+    """
+    b = GraphBuilder(graph, block["name"] + "/sliced")
+    heads = details["heads"]
+    value_head_dim = details["value_channels"] // heads
+    i0, i1, i2 = (b.const(np.array([i], np.int64), "axis") for i in range(3))
+    split = b.const(np.array([0, -1, heads, details["channels"] // heads], np.int64), "heads")
+    value_split = b.const(np.array([0, -1, heads, value_head_dim], np.int64), "heads")
+
+    scale = b.const(np.array(block["scale"], dtype=details["dtype"]), "scale")
+    query = b.op("Mul", [b.op("Transpose", [b.op("Reshape", [block["q"], split])], perm=[0, 2, 1, 3]), scale])
+    key_t = b.op("Transpose", [b.op("Reshape", [block["k"], split])], perm=[0, 2, 3, 1])
+    value = b.op("Transpose", [b.op("Reshape", [block["v"], value_split])], perm=[0, 2, 1, 3])
+
+    # Pad the query rows (and a per-query mask) to whole slices
+    slice_rows = b.const(np.array([slice_size], np.int64), "slice")
+    tokens = b.op("Slice", [b.op("Shape", [block["q"]]), i1, i2])
+    num_slices = b.op("Div", [b.op("Add", [tokens, b.const(np.array([slice_size - 1], np.int64))]), slice_rows])
+    padding = b.op("Sub", [b.op("Mul", [num_slices, slice_rows]), tokens])
+    zeros = b.const(np.zeros(6, np.int64), "pads")
+    pads = b.op("Concat", [zeros, padding, b.const(np.zeros(1, np.int64), "pads")], axis=0)
+    query = b.op("Pad", [query, pads])
+    mask = None
+    if block["masks"]:
+        mask = _combined_mask(b, block)
+        if details["mask_shape"][2] != 1:
+            mask = b.op("Pad", [mask, pads])
+
+    body = helper.make_graph([], block["name"] + "/sliced/body", [
+        helper.make_tensor_value_info("iteration", TensorProto.INT64, []),
+        helper.make_tensor_value_info("condition", TensorProto.BOOL, []),
+    ], [])
+    inner = GraphBuilder(body, block["name"] + "/sliced/body", constants=graph)
+    start = inner.op("Mul", [inner.op("Unsqueeze", ["iteration", i0]), slice_rows])
+    end = inner.op("Add", [start, slice_rows])
+    scores = inner.op("MatMul", [inner.op("Slice", [query, start, end, i2]), key_t])
+    if mask is not None:
+        sliced_mask = inner.op("Slice", [mask, start, end, i2]) if details["mask_shape"][2] != 1 else mask
+        scores = inner.op("Add", [scores, sliced_mask])
+    out = inner.op("MatMul", [inner.op("Softmax", [scores], axis=-1), value])
+    condition = inner.op("Identity", ["condition"])
+    elem_type = helper.np_dtype_to_tensor_dtype(np.dtype(details["dtype"]))
+    body.output.extend([
+        helper.make_tensor_value_info(condition, TensorProto.BOOL, []),
+        helper.make_tensor_value_info(out, elem_type, None),
+    ])
+
+    # Loop stacks the slices: (slices, batch, heads, slice_size, head_dim)
+    stacked = b.op("Loop", [b.op("Squeeze", [num_slices, i0]), ""], body=body)
+    merged = b.op("Reshape", [b.op("Transpose", [stacked], perm=[1, 2, 0, 3, 4]),
+                              b.const(np.array([0, 0, -1, value_head_dim], np.int64), "shape")])
+    merged = b.op("Slice", [merged, b.const(np.array([0], np.int64)), tokens, i2])
+    b.op("Reshape", [b.op("Transpose", [merged], perm=[0, 2, 1, 3]),
+                     b.const(np.array([0, 0, details["value_channels"]], np.int64), "shape")])
+    graph.node[-1].output[0] = details["output"]
+
+
+def apply_attention_fusion(model_path, output_path, mode="auto", slice_size=DEFAULT_SLICE_SIZE, probe_size=16,
+                           providers=None):
+    """
+    Rewrite the traced attention chains of an exported model.
+
+    Args:
+        model_path: Exported UNet or text encoder ONNX model
+        output_path: Path to save the rewritten model
+        mode: 'auto', 'fused' (MultiHeadAttention only) or 'sliced' (Loop only)
+        slice_size: Query rows per slice in the sliced subgraph
+        probe_size: Latent size of the probe run that checks each chain
+        providers: Execution providers the fused op has to run on (default: CPU)
+    Returns:
+        List of (block name, 'fused' | 'sliced' | 'skipped', heads or reason)
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode}, expected one of {MODES}")
+    model, external = load_model(model_path)
+    opset = default_opset(model)
+    if opset < MIN_OPSET:
+        raise ValueError(f"Attention rewrite needs opset {MIN_OPSET} or newer, model uses {opset}")
+
+    graph = model.graph
+    blocks = find_attention_blocks(graph)
+    if not blocks:
+        raise ValueError("No attention chains found")
+    names = [name for block in blocks
+             for name in [block["q"], block["k"], block["v"], block["probs"]] + block["masks"] + block["chain"]]
+    values = probe_tensors(model, names, batch_size=2, dims={"height": probe_size, "width": probe_size})
+    fused_available = mode != "sliced" and fused_attention_available(providers)
+
+    producers = producers_of(graph)
+    results = []
+    for block in blocks:
+        reason, details = resolve_block(block, values)
+        if reason is None:
+            if fused_available and _fused_supported(block, details):
+                kind = "fused"
+            elif mode != "fused":
+                kind = "sliced"
+            else:
+                reason = "MultiHeadAttention is unavailable for this block"
+        if reason is not None:
+            results.append((block["name"], "skipped", reason))
+            continue
+        # The new subgraph writes the block output, its old producer goes away
+        graph.node.remove(producers[details["output"]])
+        if kind == "fused":
+            insert_fused_attention(graph, block, details)
+        else:
+            insert_sliced_attention(graph, block, details, slice_size)
+        results.append((block["name"], kind, details["heads"]))
+
+    if any(kind == "fused" for _, kind, _ in results):
+        if not any(o.domain == FUSED_DOMAIN for o in model.opset_import):
+            model.opset_import.append(helper.make_opsetid(FUSED_DOMAIN, 1))
+    topological_sort(graph)
+    remove_unused_nodes(graph)
+    save_model(model, output_path, external)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuse or slice the attention chains of an exported model")
+    parser.add_argument("input", help="Exported UNet or text encoder ONNX model")
+    parser.add_argument("output", help="Path for the rewritten model")
+    parser.add_argument("--mode", choices=MODES, default="auto",
+                        help="fused: MultiHeadAttention, sliced: query-sliced Loop, auto: fused where available")
+    parser.add_argument("--slice-size", type=int, default=DEFAULT_SLICE_SIZE,
+                        help="Query rows per slice; bounds the score matrix to heads x slice x key tokens")
+    parser.add_argument("--probe-size", type=int, default=16,
+                        help="Latent size of the probe run that checks each attention chain")
+    args = parser.parse_args()
+
+    if args.slice_size < 1:
+        print("Error: Slice size must be positive")
+        sys.exit(1)
+
+    try:
+        results = apply_attention_fusion(args.input, args.output, args.mode, args.slice_size, args.probe_size)
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+
+    for name, kind, detail in results:
+        print(f"  {kind:>7}: {name} ({detail if kind == 'skipped' else f'{detail} heads'})")
+    rewritten = sum(1 for _, kind, _ in results if kind != "skipped")
+    print(f"Rewrote {rewritten} of {len(results)} attention chains, saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
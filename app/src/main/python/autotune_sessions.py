@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""ONNX Runtime session settings autotuner.
+
+Sweeps intra/inter-op threads, execution mode, memory pattern and arena
+settings, spin-wait policy and graph optimization level for each component,
+benchmarking every point with warmup runs. By default it runs a coordinate
+descent, sweeping one setting at a time around the best point so far, and
+--exhaustive tries the full grid. The fastest settings are written to
+ort_profile.json in the model directory, where the pipeline and benchmark
+tools pick them up.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+
+from benchmark_history import add_history_argument, record_run
+from ort_profile import DEFAULT_SETTINGS, PROFILE_FILENAME, build_session_options, profile_path
+from validate_models import create_seeded_inputs
+
+COMPONENT_FILES = {
+    "text_encoder": "text_encoder.onnx",
+    "unet": "unet.onnx",
+    "vae_decoder": "vae_decoder.onnx",
+}
+
+# UNet runs with classifier-free guidance, so it sees a batch of two
+COMPONENT_BATCH = {"text_encoder": 1, "unet": 2, "vae_decoder": 1}
+
+
+def search_space(cpu_count=None):
+    cpu_count = cpu_count or os.cpu_count() or 1
+    threads = sorted({t for t in (1, 2, 4, 6, 8, 12, 16) if t <= cpu_count} | {cpu_count})
+    return {
+        "execution_mode": ["sequential", "parallel"],
+        "intra_op_num_threads": threads,
+        "inter_op_num_threads": [t for t in (1, 2, 4) if t <= cpu_count],
+        "enable_mem_pattern": [True, False],
+        "enable_cpu_mem_arena": [True, False],
+        "allow_spinning": [True, False],
+        "graph_optimization_level": ["basic", "extended", "all"],
+    }
+
+
+class Benchmark:
+    def __init__(self, model_path, feed, warmup=2, runs=5):
+        self.model_path = model_path
+        self.feed = feed
+        self.warmup = warmup
+        self.runs = runs
+        self.results = {}
+
+    def __call__(self, settings):
+        """Median latency in ms for settings; each point is measured once"""
+        import numpy as np
+        import onnxruntime as ort
+
+        key = tuple(sorted(settings.items()))
+        if key in self.results:
+            return self.results[key]
+        session = ort.InferenceSession(self.model_path, build_session_options(settings),
+                                       providers=["CPUExecutionProvider"])
+        for _ in range(self.warmup):
+            session.run(None, self.feed)
+        timings = []
+        for _ in range(self.runs):
+            start_time = time.perf_counter()
+            session.run(None, self.feed)
+            timings.append((time.perf_counter() - start_time) * 1000)
+        latency = float(np.median(timings))
+        self.results[key] = latency
+        print(f"  {latency:9.2f}ms  {_describe(settings)}")
+        return latency
+
+
+def _describe(settings):
+    return (f"mode={settings['execution_mode']} intra={settings['intra_op_num_threads']} "
+            f"inter={settings['inter_op_num_threads']} mem_pattern={settings['enable_mem_pattern']} "
+            f"arena={settings['enable_cpu_mem_arena']} spin={settings['allow_spinning']} "
+            f"opt={settings['graph_optimization_level']}")
+
+
+def coordinate_descent(benchmark, space, max_passes=3, min_gain=0.02):
+    """Sweep one setting at a time, keeping a change only when it is min_gain faster"""
+    best = dict(DEFAULT_SETTINGS)
+    best["intra_op_num_threads"] = max(space["intra_op_num_threads"])
+    best["inter_op_num_threads"] = 1
+    best_latency = benchmark(best)
+    for _ in range(max_passes):
+        improved = False
+        for key, values in space.items():
+            for value in values:
+                if value == best[key]:
+                    continue
+                candidate = dict(best, **{key: value})
+                if candidate["execution_mode"] == "sequential" and candidate["inter_op_num_threads"] > 1:
+                    continue
+                latency = benchmark(candidate)
+                if latency < best_latency * (1 - min_gain):
+                    best, best_latency = candidate, latency
+                    improved = True
+        if not improved:
+            break
+    return best, best_latency
+
+
+def exhaustive_search(benchmark, space):
+    keys = list(space)
+    best, best_latency = None, float("inf")
+    for values in itertools.product(*(space[key] for key in keys)):
+        candidate = dict(zip(keys, values))
+        if candidate["execution_mode"] == "sequential" and candidate["inter_op_num_threads"] > 1:
+            continue
+        latency = benchmark(candidate)
+        if latency < best_latency:
+            best, best_latency = candidate, latency
+    return best, best_latency
+
+
+def tune_component(model_path, component, warmup, runs, exhaustive, dims=None):
+    import onnxruntime as ort
+
+    session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    feed = create_seeded_inputs(session, COMPONENT_BATCH.get(component, 1), seed=0, dims=dims)
+    del session
+
+    benchmark = Benchmark(model_path, feed, warmup, runs)
+    default_latency = benchmark(dict(DEFAULT_SETTINGS))
+    space = search_space()
+    if exhaustive:
+        best, best_latency = exhaustive_search(benchmark, space)
+    else:
+        best, best_latency = coordinate_descent(benchmark, space)
+    if default_latency <= best_latency:
+        best, best_latency = dict(DEFAULT_SETTINGS), default_latency
+    return {
+        "settings": best,
+        "latency_ms": best_latency,
+        "default_latency_ms": default_latency,
+        "points_measured": len(benchmark.results),
+    }
+
+
+def host_info():
+    import onnxruntime as ort
+
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "onnxruntime": ort.__version__,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the fastest ORT session settings per component")
+    parser.add_argument("model_dir", help="Directory with the ONNX models")
+    parser.add_argument("--components", nargs="+", choices=list(COMPONENT_FILES),
+                        default=list(COMPONENT_FILES), help="Components to tune")
+    parser.add_argument("--warmup", type=int, default=2, help="Warmup runs per point")
+    parser.add_argument("--runs", type=int, default=5, help="Timed runs per point")
+    parser.add_argument("--exhaustive", action="store_true", help="Try the full settings grid")
+    parser.add_argument("--latent-size", type=int, default=64, help="Latent height and width")
+    parser.add_argument("--output", default=None,
+                        help=f"Profile path (default: <model_dir>/{PROFILE_FILENAME})")
+    add_history_argument(parser)
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.model_dir):
+        print(f"Error: Model directory {args.model_dir} does not exist")
+        sys.exit(1)
+
+    output = args.output or profile_path(args.model_dir)
+    profile = {}
+    if os.path.exists(output):
+        with open(output) as f:
+            profile = json.load(f)
+    profile["host"] = host_info()
+    profile.setdefault("components", {})
+
+    dims = {"height": args.latent_size, "width": args.latent_size}
+    for component in args.components:
+        model_path = os.path.join(args.model_dir, COMPONENT_FILES[component])
+        print(f"\nTuning {component}...")
+        result = tune_component(model_path, component, args.warmup, args.runs, args.exhaustive, dims)
+        profile["components"][component] = result
+        print(f"Best {component}: {result['latency_ms']:.2f}ms "
+              f"(default {result['default_latency_ms']:.2f}ms, {result['points_measured']} points)")
+        print(f"  {_describe(result['settings'])}")
+
+    with open(output, "w") as f:
+        json.dump(profile, f, indent=2)
+    print(f"\nProfile written to: {output}")
+
+    if args.history:
+        record_run(args.history, "autotune", {
+            component: {
+                "latency_ms": profile["components"][component]["latency_ms"],
+                "default_latency_ms": profile["components"][component]["default_latency_ms"],
+            }
+            for component in args.components
+        }, args, args.model_dir)
+
+
+if __name__ == "__main__":
+    main()
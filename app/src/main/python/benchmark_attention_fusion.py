@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""UNet step latency and peak memory before and after the attention rewrite.
+
+Each model variant (original, fused, sliced) runs the same seeded classifier
+free guidance batch (batch of two) at each resolution on the CPU provider.
+Every measurement happens in a fresh process: the first step is run while
+RSS is sampled, and its growth above the loaded session is the step's peak
+memory - with the CPU arena enabled this is the arena's high-water mark,
+since the arena keeps what it allocated. The following steps are timed.
+The rewrite is exact, so parity is gated on the full UNet tolerances.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmark_history import add_history_argument, record_run
+from memory_profiler import format_bytes
+from validate_models import DEFAULT_TOLERANCES, check_tolerances, compare_outputs
+
+SAMPLE_INTERVAL = 0.001
+
+
+def measure_step(model_path, resolution, seed, runs):
+    """Run in a fresh process: (median step ms, peak step memory in bytes, output)"""
+    import numpy as np
+    import onnxruntime as ort
+    import psutil
+
+    from validate_models import create_seeded_inputs
+
+    process = psutil.Process(os.getpid())
+    session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    feed = create_seeded_inputs(session, 2, seed, {"height": resolution // 8, "width": resolution // 8})
+
+    rss_before = process.memory_info().rss
+    peak = [rss_before]
+    done = threading.Event()
+
+    def sample():
+        while not done.is_set():
+            peak[0] = max(peak[0], process.memory_info().rss)
+            time.sleep(SAMPLE_INTERVAL)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    output = session.run(None, feed)[0]
+    done.set()
+    sampler.join()
+    step_memory = max(peak[0], process.memory_info().rss) - rss_before
+
+    timings = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        session.run(None, feed)
+        timings.append(time.perf_counter() - start_time)
+    return float(np.median(timings)) * 1000, step_memory, output
+
+
+def measure_in_subprocess(model_path, resolution, seed, runs):
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(measure_step, model_path, resolution, seed, runs).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the attention rewrite against the original UNet")
+    parser.add_argument("original", help="Original UNet ONNX model")
+    parser.add_argument("--output-dir", default=None,
+                        help="Where the rewritten variants are kept (default: next to the original)")
+    parser.add_argument("--modes", nargs="+", choices=["fused", "sliced"], default=["fused", "sliced"],
+                        help="Rewritten variants to compare")
+    parser.add_argument("--slice-size", type=int, default=None,
+                        help="Query rows per slice (default: attention_fusion.DEFAULT_SLICE_SIZE)")
+    parser.add_argument("--resolutions", type=int, nargs="+", default=[512, 768],
+                        help="Image resolutions to test (latents are 1/8)")
+    parser.add_argument("--runs", type=int, default=3, help="Timed steps per resolution after the first")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the inputs")
+    add_history_argument(parser)
+    args = parser.parse_args()
+
+    from attention_fusion import DEFAULT_SLICE_SIZE, apply_attention_fusion
+
+    if args.slice_size is None:
+        args.slice_size = DEFAULT_SLICE_SIZE
+    output_dir = args.output_dir or os.path.dirname(os.path.abspath(args.original))
+    stem = os.path.splitext(os.path.basename(args.original))[0]
+    variants = {"original": args.original}
+    for mode in args.modes:
+        suffix = f"_sliced{args.slice_size}" if mode == "sliced" else "_fused"
+        path = os.path.join(output_dir, stem + suffix + ".onnx")
+        if not os.path.exists(path):
+            print(f"Creating {path}...")
+            apply_attention_fusion(args.original, path, mode, args.slice_size)
+        variants[mode] = path
+
+    tolerances = DEFAULT_TOLERANCES["unet"]
+    failed = False
+    results = {}
+    print(f"{'resolution':>10} {'variant':>9} {'step':>10} {'speedup':>8} {'memory':>10} {'vs orig':>8} {'max_abs':>9}")
+    for resolution in args.resolutions:
+        reference = None
+        for name, path in variants.items():
+            step_ms, step_memory, output = measure_in_subprocess(path, resolution, args.seed, args.runs)
+            if reference is None:
+                reference = (step_ms, step_memory, output)
+            metrics = compare_outputs("unet", reference[2], output)
+            print(f"{resolution:>10} {name:>9} {step_ms:>8.1f}ms {reference[0] / step_ms:>7.2f}x "
+                  f"{format_bytes(step_memory):>10} {step_memory / max(reference[1], 1):>7.2f}x "
+                  f"{metrics['max_abs_error']:>9.2e}")
+            results[f"{resolution}px {name}"] = {"step_ms": step_ms, "step_memory_bytes": step_memory}
+            for failure in check_tolerances(metrics, tolerances):
+                print(f"  {resolution}px {name} outside tolerance: {failure}")
+                failed = True
+
+    if args.history:
+        record_run(args.history, "attention_fusion", results, args, args.original)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
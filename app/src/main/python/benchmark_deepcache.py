@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Speed and quality benchmark for DeepCache denoising.
+
+Runs the production full-UNet loop (unet.onnx), the DeepCache full graph at
+every step, and DeepCache loops with several refresh intervals from the same
+prompt embeddings and initial latents. It then reports the denoising time and
+the PSNR/SSIM of each image against the unet.onnx image. The "deepcache full"
+row isolates the export itself; the interval rows add caching on top.
+"""
+
+import argparse
+import time
+
+from benchmark_history import add_history_argument, record_run
+from validate_models import cosine_similarity, psnr, ssim
+
+
+def _to_unit(images):
+    import numpy as np
+
+    return images.transpose(0, 3, 1, 2).astype(np.float64) / 255.0
+
+
+def denoise_deepcache_full(pipeline, latents, text_embeddings, steps, guidance_scale):
+    """The scheduler loop with the DeepCache full graph at every step"""
+    import numpy as np
+
+    scheduler = pipeline.scheduler
+    scheduler.set_timesteps(steps)
+    latents = (latents * scheduler.init_noise_sigma).astype(np.float32)
+    for step_index in range(steps):
+        noise_pred, _ = pipeline.predict_noise(latents, step_index, text_embeddings, guidance_scale,
+                                               session=pipeline.unet_deepcache)
+        latents = scheduler.step(noise_pred, step_index, latents)
+    return latents
+
+
+def _label(interval):
+    return {0: "full", 1: "deepcache full"}.get(interval, f"interval {interval}")
+
+
+def run_benchmark(model_dir, prompt, steps, intervals, guidance_scale, height, width, seed):
+    from reference_pipeline import ReferencePipeline
+
+    pipeline = ReferencePipeline(model_dir, deep_cache=True)
+    text_embeddings = pipeline.encode_prompt([prompt], [""])
+    initial = pipeline.prepare_latents(1, height, width, seed)
+
+    results = []
+    reference_latents = None
+    reference_images = None
+    # 0 is the plain unet.onnx loop, 1 the DeepCache full graph at every step
+    for interval in [0, 1] + [interval for interval in intervals if interval > 1]:
+        start_time = time.time()
+        if interval == 1:
+            latents = denoise_deepcache_full(pipeline, initial, text_embeddings, steps, guidance_scale)
+        else:
+            latents = pipeline.denoise(initial, text_embeddings, steps, guidance_scale, deep_cache_interval=interval)
+        elapsed = time.time() - start_time
+        images = pipeline.decode(latents)
+        if reference_images is None:
+            reference_latents, reference_images = latents, images
+        results.append({
+            "interval": interval,
+            "time": elapsed,
+            "step_time": elapsed / steps,
+            "latent_cosine": cosine_similarity(reference_latents, latents),
+            "psnr": psnr(_to_unit(reference_images), _to_unit(images)),
+            "ssim": ssim(_to_unit(reference_images), _to_unit(images)),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DeepCache against the full UNet loop")
+    parser.add_argument("model_dir", help="Directory with the regular and DeepCache exports")
+    parser.add_argument("--prompt", default="a photograph of an astronaut riding a horse",
+                        help="Prompt used for every run")
+    parser.add_argument("--steps", type=int, default=20, help="Number of inference steps")
+    parser.add_argument("--intervals", type=int, nargs="+", default=[2, 3, 5],
+                        help="Full UNet refresh intervals to compare")
+    parser.add_argument("--guidance-scale", type=float, default=7.0, help="Guidance scale")
+    parser.add_argument("--height", type=int, default=512, help="Image height")
+    parser.add_argument("--width", type=int, default=512, help="Image width")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the initial latents")
+    add_history_argument(parser)
+    args = parser.parse_args()
+
+    results = run_benchmark(args.model_dir, args.prompt, args.steps, args.intervals,
+                            args.guidance_scale, args.height, args.width, args.seed)
+    baseline = results[0]["time"]
+    print(f"{'interval':>14} {'time':>8} {'step':>8} {'speedup':>8} {'cosine':>8} {'psnr':>8} {'ssim':>8}")
+    for result in results:
+        print(f"{_label(result['interval']):>14} {result['time']:>7.2f}s {result['step_time']:>7.3f}s "
+              f"{baseline / result['time']:>7.2f}x {result['latent_cosine']:>8.4f} "
+              f"{result['psnr']:>8.2f} {result['ssim']:>8.4f}")
+
+    if args.history:
+        record_run(args.history, "deepcache", {
+            _label(result["interval"]): {
+                "latency_s": result["time"],
+                "step_s": result["step_time"],
+                "latent_cosine": result["latent_cosine"],
+                "psnr": result["psnr"],
+                "ssim": result["ssim"],
+            }
+            for result in results
+        }, args, args.model_dir)
+
+
+if __name__ == "__main__":
+    main()
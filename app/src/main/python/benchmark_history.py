@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""Benchmark results history and regression report.
+
+Benchmarks and the session autotuner append their numbers to a local SQLite
+store when they get --history (or PIXELVITA_HISTORY is set). Every run is
+tagged with the git commit, a hash of the model files, their quantization
+scheme, the host and the benchmark's own arguments.
+
+A series is one metric of one component for one benchmark configuration on
+one host. Each point is compared with the median of the previous --window
+points of its series; it is a regression when it is worse by more than
+--threshold and by more than the noise (3 scaled MADs) of that baseline.
+Metric names carry their direction: throughput, speedup, similarity and
+reuse metrics (see HIGHER_IS_BETTER) are better when higher, everything else
+(latency, size, memory) when lower. test_benchmark_history.py pins the
+direction of every metric the tools emit, so a new metric name has to be
+added there.
+
+Usage:
+    benchmark_history.py report [--history PATH] [--output report.html]
+    benchmark_history.py list [--history PATH] [--benchmark NAME]
+    benchmark_history.py check [--history PATH]
+"""
+
+import argparse
+import hashlib
+import html
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter, OrderedDict
+
+HISTORY_ENV = "PIXELVITA_HISTORY"
+DEFAULT_HISTORY = "benchmark_history.sqlite"
+
+DEFAULT_WINDOW = 5
+DEFAULT_THRESHOLD = 0.10
+# A baseline needs this many earlier points before regressions are flagged
+MIN_BASELINE_POINTS = 3
+# Scaled MAD multiplier: points within the usual run-to-run noise never regress
+NOISE_MADS = 3.0
+
+HIGHER_IS_BETTER = ("per_sec", "mb_s", "speedup", "cosine", "psnr", "ssim", "reused")
+
+MODEL_EXTENSIONS = (".onnx", ".onnx.data", ".onnx_data", ".data", ".ort")
+
+QUANTIZED_OP_TYPES = {
+    "MatMulInteger": "int8-dynamic",
+    "ConvInteger": "int8-dynamic",
+    "DynamicQuantizeMatMul": "int8-dynamic",
+    "QLinearMatMul": "int8-static",
+    "QLinearConv": "int8-static",
+    "DequantizeLinear": "int8-qdq",
+    "MatMulNBits": "int4",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    benchmark TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    git_commit TEXT,
+    git_dirty INTEGER,
+    model_hash TEXT,
+    quantization TEXT,
+    host_id TEXT NOT NULL,
+    host TEXT NOT NULL,
+    parameters TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    component TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (run_id, component, metric)
+);
+CREATE TABLE IF NOT EXISTS model_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    quantization TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_benchmark ON runs(benchmark, created_at);
+"""
+
+
+def add_history_argument(parser):
+    parser.add_argument("--history", default=os.environ.get(HISTORY_ENV),
+                        help=f"SQLite benchmark history to append the results to (default: ${HISTORY_ENV})")
+
+
+def higher_is_better(metric):
+    return any(token in metric for token in HIGHER_IS_BETTER)
+
+
+def git_revision(path=None):
+    """(commit, dirty) of the checkout containing path, or (None, None) outside git"""
+    cwd = path or os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=cwd, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=cwd,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def host_info():
+    """Host description; library versions are taken from what the benchmark imported"""
+    info = {
+        "hostname": platform.node(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+    try:
+        import psutil
+        info["memory_bytes"] = psutil.virtual_memory().total
+    except ImportError:
+        pass
+    for name in ("numpy", "onnx", "onnxruntime", "torch"):
+        module = sys.modules.get(name)
+        if module is not None:
+            info[name] = getattr(module, "__version__", None)
+    return info
+
+
+def host_id(info):
+    """Stable id of the machine itself, so library upgrades stay within one series"""
+    keys = ("hostname", "platform", "processor", "cpu_count", "memory_bytes")
+    identity = json.dumps({key: info.get(key) for key in keys}, sort_keys=True)
+    return hashlib.sha256(identity.encode()).hexdigest()[:12]
+
+
+def _model_files(model_path):
+    if os.path.isfile(model_path):
+        return [model_path]
+    files = []
+    for root, _, names in os.walk(model_path):
+        files.extend(os.path.join(root, name) for name in sorted(names) if name.endswith(MODEL_EXTENSIONS))
+    return sorted(files)
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for buffer in iter(lambda: f.read(4 * 1024 * 1024), b""):
+            digest.update(buffer)
+    return digest.hexdigest()
+
+
+def describe_quantization(model_path):
+    """Quantization scheme of one ONNX file, e.g. 'int8-dynamic (412 nodes)', 'fp16' or 'fp32'"""
+    try:
+        import onnx
+    except ImportError:
+        return None
+    model = onnx.load(model_path, load_external_data=False)
+    schemes = Counter(QUANTIZED_OP_TYPES[node.op_type] for node in model.graph.node
+                      if node.op_type in QUANTIZED_OP_TYPES)
+    if schemes:
+        scheme, count = schemes.most_common(1)[0]
+        return f"{scheme} ({count} nodes)"
+    weight_types = Counter(initializer.data_type for initializer in model.graph.initializer)
+    if weight_types and weight_types.most_common(1)[0][0] == onnx.TensorProto.FLOAT16:
+        return "fp16"
+    return "fp32"
+
+
+class BenchmarkHistory:
+    def __init__(self, path):
+        """
+        Args:
+            path: SQLite file, created on first use
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def _model_file(self, path):
+        """(sha256, quantization) of one file, cached by size and modification time"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        row = self.connection.execute("SELECT * FROM model_files WHERE path = ?", (path,)).fetchone()
+        if row is not None and row["size"] == stat.st_size and row["mtime_ns"] == stat.st_mtime_ns:
+            return row["sha256"], row["quantization"]
+        sha256 = _file_sha256(path)
+        quantization = describe_quantization(path) if path.endswith(".onnx") else None
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO model_files VALUES (?, ?, ?, ?, ?)",
+                                    (path, stat.st_size, stat.st_mtime_ns, sha256, quantization))
+        return sha256, quantization
+
+    def model_summary(self, model_path):
+        """
+        Hash and quantization of a model file or directory.
+
+        The hash covers every model file (ONNX and external data), so
+        re-exports and re-quantizations start a new model version while
+        profiles or images written next to the models do not.
+        """
+        files = _model_files(model_path)
+        if not files:
+            return None, None
+        digest = hashlib.sha256()
+        quantization = OrderedDict()
+        root = model_path if os.path.isdir(model_path) else os.path.dirname(model_path)
+        for path in files:
+            sha256, scheme = self._model_file(path)
+            name = os.path.relpath(path, root)
+            digest.update(f"{name}:{sha256}\n".encode())
+            if scheme is not None:
+                quantization[name] = scheme
+        return digest.hexdigest(), quantization or None
+
+    def record(self, benchmark, results, parameters=None, model_path=None, quantization=None):
+        """
+        Append one run and return its id.
+
+        Args:
+            benchmark: Benchmark name, e.g. 'io_binding'
+            results: {component: {metric: value}}, metric names ending in their unit
+            parameters: Benchmark arguments (dict or argparse namespace); part of the series key
+            model_path: Model file or directory to hash and inspect
+            quantization: Overrides the quantization detected from the model
+        """
+        if isinstance(parameters, argparse.Namespace):
+            parameters = {key: value for key, value in vars(parameters).items() if key != "history"}
+        model_hash, detected = self.model_summary(model_path) if model_path else (None, None)
+        quantization = quantization if quantization is not None else detected
+        commit, dirty = git_revision()
+        host = host_info()
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (benchmark, created_at, git_commit, git_dirty, model_hash, quantization, "
+                "host_id, host, parameters) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    benchmark,
+                    time.time(),
+                    commit,
+                    None if dirty is None else int(dirty),
+                    model_hash,
+                    json.dumps(quantization, sort_keys=True) if quantization is not None else None,
+                    host_id(host),
+                    json.dumps(host, sort_keys=True),
+                    json.dumps(parameters or {}, sort_keys=True, default=str),
+                ),
+            )
+            self.connection.executemany(
+                "INSERT INTO results VALUES (?, ?, ?, ?)",
+                [
+                    (cursor.lastrowid, component, metric, float(value))
+                    for component, metrics in results.items()
+                    for metric, value in metrics.items()
+                    if value is not None
+                ],
+            )
+        return cursor.lastrowid
+
+    def runs(self, benchmark=None):
+        query = "SELECT * FROM runs"
+        if benchmark is not None:
+            return self.connection.execute(query + " WHERE benchmark = ? ORDER BY created_at, id",
+                                           (benchmark,)).fetchall()
+        return self.connection.execute(query + " ORDER BY created_at, id").fetchall()
+
+    def series(self, benchmark=None):
+        """Group every result into series keyed by (benchmark, host_id, parameters, component, metric)"""
+        query = (
+            "SELECT runs.*, results.component, results.metric, results.value "
+            "FROM results JOIN runs ON runs.id = results.run_id"
+        )
+        arguments = ()
+        if benchmark is not None:
+            query += " WHERE runs.benchmark = ?"
+            arguments = (benchmark,)
+        series = OrderedDict()
+        for row in self.connection.execute(query + " ORDER BY runs.created_at, runs.id", arguments):
+            key = (row["benchmark"], row["host_id"], row["parameters"], row["component"], row["metric"])
+            series.setdefault(key, []).append(dict(row))
+        return series
+
+
+def record_run(history_path, benchmark, results, parameters=None, model_path=None, quantization=None):
+    """Append one run to the history at history_path; see BenchmarkHistory.record"""
+    history = BenchmarkHistory(history_path)
+    try:
+        run_id = history.record(benchmark, results, parameters, model_path, quantization)
+    finally:
+        history.close()
+    print(f"Recorded run {run_id} in {history_path}")
+    return run_id
+
+
+def detect_regressions(points, metric, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD):
+    """
+    Annotate the points of one series with their rolling baseline.
+
+    Adds 'baseline', 'change' (relative, positive = worse) and 'regression'
+    to every point and returns them.
+    """
+    sign = -1.0 if higher_is_better(metric) else 1.0
+    values = [point["value"] for point in points]
+    for index, point in enumerate(points):
+        previous = values[max(0, index - window):index]
+        point["baseline"] = point["change"] = None
+        point["regression"] = False
+        if len(previous) < MIN_BASELINE_POINTS:
+            continue
+        baseline = statistics.median(previous)
+        if baseline == 0:
+            continue
+        noise = NOISE_MADS * 1.4826 * statistics.median(abs(value - baseline) for value in previous)
+        change = sign * (point["value"] - baseline) / abs(baseline)
+        point["baseline"] = baseline
+        point["change"] = change
+        point["regression"] = change > max(threshold, noise / abs(baseline))
+    return points
+
+
+def analyze(history, benchmark=None, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD):
+    """Every series with annotated points, as {key: points}"""
+    return OrderedDict(
+        (key, detect_regressions(points, key[4], window, threshold))
+        for key, points in history.series(benchmark).items()
+    )
+
+
+def current_regressions(analyzed):
+    """Series whose latest point is a regression"""
+    return [(key, points[-1]) for key, points in analyzed.items() if points[-1]["regression"]]
+
+
+def _describe_point(point):
+    commit = (point["git_commit"] or "unknown")[:10] + ("+dirty" if point["git_dirty"] else "")
+    model = (point["model_hash"] or "-")[:12]
+    quantization = ", ".join(f"{name}: {scheme}" for name, scheme in
+                             json.loads(point["quantization"] or "{}").items()) or "-"
+    when = time.strftime("%Y-%m-%d %H:%M", time.localtime(point["created_at"]))
+    return f"{when}  commit {commit}  model {model}  {quantization}"
+
+
+def _format_value(value):
+    return f"{value:.4g}"
+
+
+def _chart(points, metric, width=640, height=180, margin=36):
+    """Inline SVG line chart with the rolling baseline and regressions marked"""
+    values = [point["value"] for point in points]
+    baselines = [point["baseline"] for point in points if point["baseline"] is not None]
+    low, high = min(values + baselines), max(values + baselines)
+    if high == low:
+        low, high = low - abs(low or 1) * 0.05, high + abs(high or 1) * 0.05
+    step = (width - 2 * margin) / max(len(points) - 1, 1)
+
+    def x(index):
+        return margin + index * step
+
+    def y(value):
+        return height - margin + (value - low) / (high - low) * (2 * margin - height)
+
+    line = " ".join(f"{x(i):.1f},{y(point['value']):.1f}" for i, point in enumerate(points))
+    baseline = " ".join(f"{x(i):.1f},{y(point['baseline']):.1f}"
+                        for i, point in enumerate(points) if point["baseline"] is not None)
+    parts = [
+        f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+        f'<text x="4" y="{margin - 8}" class="axis">{_format_value(high)}</text>',
+        f'<text x="4" y="{height - margin + 12}" class="axis">{_format_value(low)}</text>',
+        f'<line x1="{margin}" y1="{height - margin}" x2="{width - margin}" y2="{height - margin}" class="grid"/>',
+        f'<polyline points="{baseline}" class="baseline"/>' if baseline else "",
+        f'<polyline points="{line}" class="series"/>',
+    ]
+    for index, point in enumerate(points):
+        label = f"{_format_value(point['value'])} {metric}\n{_describe_point(point)}"
+        if point["change"] is not None:
+            label += f"\n{point['change']:+.1%} vs baseline {_format_value(point['baseline'])}"
+        css = "regression" if point["regression"] else "point"
+        parts.append(f'<circle cx="{x(index):.1f}" cy="{y(point["value"]):.1f}" r="4" class="{css}">'
+                     f"<title>{html.escape(label)}</title></circle>")
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+REPORT_STYLE = """
+body { font-family: sans-serif; margin: 2em; color: #222; }
+table { border-collapse: collapse; margin-bottom: 2em; }
+td, th { border: 1px solid #ccc; padding: 4px 8px; text-align: left; font-size: 13px; }
+.chart { display: inline-block; margin: 0 1em 1em 0; vertical-align: top; }
+.chart h4 { margin: 0; font-size: 13px; }
+.params { color: #666; font-size: 12px; word-break: break-all; }
+.axis { font-size: 10px; fill: #666; }
+.grid { stroke: #ddd; }
+.series { fill: none; stroke: #2b6cb0; stroke-width: 1.5; }
+.baseline { fill: none; stroke: #999; stroke-dasharray: 4 3; }
+.point { fill: #2b6cb0; }
+.regression { fill: #c53030; }
+.bad { color: #c53030; font-weight: bold; }
+"""
+
+
+def render_report(analyzed, window, threshold):
+    """Static HTML report: current regressions first, then one chart per series"""
+    regressions = current_regressions(analyzed)
+    parts = [
+        "<!DOCTYPE html>",
+        '<html><head><meta charset="utf-8"><title>PixelVita benchmark history</title>',
+        f"<style>{REPORT_STYLE}</style></head><body>",
+        "<h1>PixelVita benchmark history</h1>",
+        f"<p>Generated {html.escape(time.strftime('%Y-%m-%d %H:%M'))}. Baseline: median of the previous "
+        f"{window} runs; regression: more than {threshold:.0%} worse and outside 3 MADs of noise.</p>",
+        f"<h2>Current regressions ({len(regressions)})</h2>",
+    ]
+    if regressions:
+        parts.append("<table><tr><th>benchmark</th><th>component</th><th>metric</th><th>value</th>"
+                     "<th>baseline</th><th>change</th><th>run</th></tr>")
+        for (benchmark, _, _, component, metric), point in regressions:
+            parts.append(
+                f"<tr><td>{html.escape(benchmark)}</td><td>{html.escape(component)}</td>"
+                f"<td>{html.escape(metric)}</td><td>{_format_value(point['value'])}</td>"
+                f"<td>{_format_value(point['baseline'])}</td><td class=\"bad\">{point['change']:+.1%}</td>"
+                f"<td>{html.escape(_describe_point(point))}</td></tr>"
+            )
+        parts.append("</table>")
+    else:
+        parts.append("<p>None.</p>")
+
+    configurations = OrderedDict()
+    for key, points in analyzed.items():
+        configurations.setdefault(key[:3], []).append((key[3], key[4], points))
+    for (benchmark, host, parameters), charts in configurations.items():
+        hostname = json.loads(charts[0][2][-1]["host"]).get("hostname", "")
+        parts.append(f"<h2>{html.escape(benchmark)} <small>on {html.escape(hostname)} ({host})</small></h2>")
+        parts.append(f'<p class="params">{html.escape(parameters)}</p>')
+        for component, metric, points in charts:
+            title = f"{component} {metric}" if component else metric
+            if points[-1]["regression"]:
+                title += f"  ({points[-1]['change']:+.1%})"
+            parts.append(f'<div class="chart"><h4>{html.escape(title)}</h4>{_chart(points, metric)}</div>')
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark history report and regression check")
+    parser.add_argument("command", choices=["report", "list", "check"], help="What to do with the history")
+    parser.add_argument("--history", default=os.environ.get(HISTORY_ENV, DEFAULT_HISTORY),
+                        help=f"SQLite benchmark history (default: ${HISTORY_ENV} or {DEFAULT_HISTORY})")
+    parser.add_argument("--output", default="benchmark_report.html", help="HTML report path")
+    parser.add_argument("--benchmark", default=None, help="Only this benchmark")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="Runs in the rolling baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative change that counts as a regression")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.history):
+        print(f"Error: Benchmark history {args.history} does not exist")
+        sys.exit(1)
+
+    history = BenchmarkHistory(args.history)
+    try:
+        if args.command == "list":
+            for run in history.runs(args.benchmark):
+                print(f"{run['id']:>5} {run['benchmark']:<16} {_describe_point(run)}")
+            return
+        analyzed = analyze(history, args.benchmark, args.window, args.threshold)
+    finally:
+        history.close()
+
+    regressions = current_regressions(analyzed)
+    if args.command == "report":
+        with open(args.output, "w") as f:
+            f.write(render_report(analyzed, args.window, args.threshold))
+        print(f"Report with {len(analyzed)} series written to: {args.output}")
+    for (benchmark, _, _, component, metric), point in regressions:
+        print(f"REGRESSION {benchmark} {component} {metric}: {_format_value(point['value'])} "
+              f"vs baseline {_format_value(point['baseline'])} ({point['change']:+.1%})")
+    if args.command == "check" and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Latency of img2img and inpainting versus strength and mask area.
+
+img2img only runs strength * steps UNet steps, so latency should fall
+roughly linearly with strength. Inpainting with crop_to_mask runs the UNet on
+the mask's bounding tiles, so latency should follow the masked area instead
+of the image size. Each point includes VAE encoding and decoding; prompts are
+replaced by seeded text embeddings so no tokenizer is needed.
+"""
+
+import argparse
+import time
+
+from benchmark_history import add_history_argument, record_run
+from validate_models import create_seeded_inputs
+
+
+def centered_mask(height, width, area):
+    """Square-ish mask in the image center covering about area of the image"""
+    import numpy as np
+
+    mask = np.zeros((height, width), dtype=np.uint8)
+    mask_height, mask_width = int(round(height * area ** 0.5)), int(round(width * area ** 0.5))
+    top, left = (height - mask_height) // 2, (width - mask_width) // 2
+    mask[top:top + mask_height, left:left + mask_width] = 255
+    return mask
+
+
+def timed(fn, repeats):
+    import numpy as np
+
+    timings = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start_time)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark img2img and inpainting latency")
+    parser.add_argument("model_dir", help="Directory with the exported models (including vae_encoder.onnx)")
+    parser.add_argument("--steps", type=int, default=20, help="Number of inference steps")
+    parser.add_argument("--height", type=int, default=512, help="Image height")
+    parser.add_argument("--width", type=int, default=512, help="Image width")
+    parser.add_argument("--strengths", type=float, nargs="+", default=[0.25, 0.5, 0.75, 1.0],
+                        help="img2img strengths to test")
+    parser.add_argument("--mask-areas", type=float, nargs="+", default=[0.05, 0.15, 0.35, 0.6, 1.0],
+                        help="Inpaint mask areas (fraction of the image) to test")
+    parser.add_argument("--guidance-scale", type=float, default=7.0, help="Guidance scale")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per point")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the image, noise and embeddings")
+    add_history_argument(parser)
+    args = parser.parse_args()
+
+    import numpy as np
+
+    from reference_pipeline import ReferencePipeline, latent_mask
+
+    pipeline = ReferencePipeline(args.model_dir)
+    text_embeddings = create_seeded_inputs(pipeline.unet, 2, args.seed)[pipeline.unet.get_inputs()[2].name]
+    rng = np.random.default_rng(args.seed)
+    image = rng.integers(0, 256, size=(args.height, args.width, 3), dtype=np.uint8)
+
+    def text_to_image():
+        latents = pipeline.prepare_latents(1, args.height, args.width, args.seed)
+        pipeline.decode(pipeline.denoise(latents, text_embeddings, args.steps, args.guidance_scale))
+
+    def image_to_image(strength):
+        init_latents = pipeline.encode_image(image)
+        pipeline.decode(pipeline.denoise_image(init_latents, text_embeddings, args.steps,
+                                               args.guidance_scale, strength, args.seed))
+
+    def inpaint(mask, crop_to_mask):
+        init_latents = pipeline.encode_image(image)
+        pipeline.decode(pipeline.denoise_inpaint(init_latents, mask, text_embeddings, args.steps,
+                                                 args.guidance_scale, 1.0, args.seed, crop_to_mask))
+
+    image_to_image(1.0)  # warmup, also loads the encoder
+    baseline = timed(text_to_image, args.repeats)
+    print(f"text-to-image ({args.steps} steps): {baseline:.3f}s")
+    results = {"txt2img": {"latency_s": baseline}}
+
+    print(f"\n{'strength':>8} {'steps':>6} {'latency':>9} {'vs txt2img':>10}")
+    for strength in args.strengths:
+        elapsed = timed(lambda: image_to_image(strength), args.repeats)
+        steps_run = min(int(args.steps * strength), args.steps)
+        print(f"{strength:>8.2f} {steps_run:>6} {elapsed:>8.3f}s {elapsed / baseline:>9.2f}x")
+        results[f"img2img strength {strength:g}"] = {"latency_s": elapsed}
+
+    print(f"\n{'mask area':>9} {'full':>9} {'cropped':>9} {'speedup':>8}")
+    for area in args.mask_areas:
+        mask = latent_mask(centered_mask(args.height, args.width, area))
+        full = timed(lambda: inpaint(mask, False), args.repeats)
+        cropped = timed(lambda: inpaint(mask, True), args.repeats)
+        print(f"{area:>9.2f} {full:>8.3f}s {cropped:>8.3f}s {full / cropped:>7.2f}x")
+        results[f"inpaint area {area:g}"] = {"full_latency_s": full, "cropped_latency_s": cropped}
+
+    if args.history:
+        record_run(args.history, "img2img", results, args, args.model_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""Latency and allocation benchmark for the IO binding denoising loop.
+
+Runs the regular scheduler loop and the preallocated IO binding loop on the
+same seeded latents and text embeddings, and measures each step two ways:
+
+- Python-side allocations (NumPy arrays, including the arrays session.run
+  returns) with tracemalloc: the peak is reset before every step, so the
+  peak growth within a step is what the step allocated, even if it was
+  freed again. This is the gated number.
+- Process RSS, sampled while the step runs: peak growth above the RSS at
+  the start of the step. This covers ONNX Runtime's own allocations, which
+  tracemalloc cannot see, but with the CPU arena enabled the arena keeps
+  what it allocated, so it shows new high-water marks rather than every
+  allocation. It is reported, not gated.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import psutil
+
+from benchmark_history import add_history_argument, record_run
+from memory_profiler import format_bytes
+from validate_models import create_seeded_inputs
+
+# Interpreter bookkeeping (loop counters, scalars) stays well below this
+ALLOCATION_FREE_BYTES = 4096
+RSS_SAMPLE_INTERVAL = 0.0005
+
+
+class StepAllocationCounter:
+    """Records the Python-side bytes (tracemalloc) allocated during each denoising step"""
+
+    def __init__(self):
+        self.step_bytes = []
+        self._baseline = 0
+
+    def start(self):
+        tracemalloc.start()
+        self._reset()
+
+    def _reset(self):
+        tracemalloc.reset_peak()
+        self._baseline = tracemalloc.get_traced_memory()[0]
+
+    def __call__(self, step_index, latents):
+        _, peak = tracemalloc.get_traced_memory()
+        self.step_bytes.append(peak - self._baseline)
+        self._reset()
+
+    def stop(self):
+        tracemalloc.stop()
+        # The first step includes one-off setup inside the loop
+        return max(self.step_bytes[1:] or self.step_bytes)
+
+
+class StepRssSampler:
+    """Records the peak process RSS growth during each denoising step"""
+
+    def __init__(self):
+        self.step_bytes = []
+        self._process = psutil.Process(os.getpid())
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = None
+        self._baseline = 0
+        self._peak = 0
+
+    def _sample(self):
+        while not self._done.is_set():
+            rss = self._process.memory_info().rss
+            with self._lock:
+                self._peak = max(self._peak, rss)
+            time.sleep(RSS_SAMPLE_INTERVAL)
+
+    def _reset(self):
+        rss = self._process.memory_info().rss
+        with self._lock:
+            self._baseline = self._peak = rss
+
+    def start(self):
+        self._reset()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def __call__(self, step_index, latents):
+        rss = self._process.memory_info().rss
+        with self._lock:
+            self.step_bytes.append(max(self._peak, rss) - self._baseline)
+        self._reset()
+
+    def stop(self):
+        self._done.set()
+        self._thread.join()
+        return max(self.step_bytes[1:] or self.step_bytes)
+
+
+def _inputs(pipeline, batch_size, height, width, seed):
+    feed = create_seeded_inputs(pipeline.unet, 2 * batch_size, seed)
+    text_embeddings = feed[pipeline.unet.get_inputs()[2].name]
+    latents = pipeline.prepare_latents(batch_size, height, width, seed)
+    return latents, text_embeddings
+
+
+def measure(pipeline, latents, text_embeddings, steps, guidance_scale, io_binding, repeats):
+    import numpy as np
+
+    timings = []
+    result = None
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = pipeline.denoise(latents, text_embeddings, steps, guidance_scale, io_binding=io_binding)
+        timings.append(time.perf_counter() - start_time)
+
+    # Separate passes: the sampler thread's own allocations would show up in tracemalloc
+    per_step = []
+    for counter in (StepAllocationCounter(), StepRssSampler()):
+        counter.start()
+        pipeline.denoise(latents, text_embeddings, steps, guidance_scale, callback=counter, io_binding=io_binding)
+        per_step.append(counter.stop())
+    return float(np.median(timings)), per_step[0], per_step[1], result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IO binding denoising loop")
+    parser.add_argument("model_dir", help="Directory with the exported models")
+    parser.add_argument("--steps", type=int, default=20, help="Number of inference steps")
+    parser.add_argument("--batch-size", type=int, default=1, help="Images per generation")
+    parser.add_argument("--height", type=int, default=512, help="Image height")
+    parser.add_argument("--width", type=int, default=512, help="Image width")
+    parser.add_argument("--guidance-scale", type=float, default=7.0, help="Guidance scale")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed generations per loop")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latents and embeddings")
+    add_history_argument(parser)
+    args = parser.parse_args()
+
+    import numpy as np
+
+    from reference_pipeline import ReferencePipeline
+
+    pipeline = ReferencePipeline(args.model_dir)
+    latents, text_embeddings = _inputs(pipeline, args.batch_size, args.height, args.width, args.seed)
+
+    results = {}
+    for name, io_binding in (("regular", False), ("io_binding", True)):
+        results[name] = measure(pipeline, latents, text_embeddings, args.steps,
+                                args.guidance_scale, io_binding, args.repeats)
+        elapsed, python_bytes, rss_bytes, _ = results[name]
+        print(f"{name:>10}: {elapsed:.3f}s ({1000 * elapsed / args.steps:.2f}ms/step), "
+              f"Python-side allocations per step: {format_bytes(python_bytes)}, "
+              f"peak RSS growth per step: {format_bytes(rss_bytes)}")
+
+    regular_time, _, _, regular_latents = results["regular"]
+    bound_time, bound_bytes, _, bound_latents = results["io_binding"]
+    max_diff = float(np.max(np.abs(regular_latents - bound_latents)))
+    print(f"Latency gain: {1000 * (regular_time - bound_time) / args.steps:.2f}ms/step "
+          f"({regular_time / bound_time:.2f}x)")
+    print(f"Max abs difference between loops: {max_diff:.2e}")
+    if args.history:
+        record_run(args.history, "io_binding", {
+            name: {"step_ms": 1000 * elapsed / args.steps, "step_python_alloc_bytes": python_bytes,
+                   "step_rss_growth_bytes": rss_bytes}
+            for name, (elapsed, python_bytes, rss_bytes, _) in results.items()
+        }, args, args.model_dir)
+
+    if bound_bytes > ALLOCATION_FREE_BYTES:
+        print(f"FAILED: IO binding loop allocates {format_bytes(bound_bytes)} of Python-side memory per step")
+        sys.exit(1)
+    print("IO binding loop makes no Python-side allocations per step")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Images/sec of the postprocess + encode stage.
+
+Compares the per-batch reference path (reference_pipeline.postprocess and
+sequential Pillow encoding) with the fused Postprocessor writing into reused
+buffers and the thread pool ImageEncoder, on synthetic VAE outputs.
+
+postprocess returns an NHWC view over NCHW memory, which Pillow copies to a
+contiguous buffer before encoding. Postprocessor returns contiguous images,
+so the postprocess-only comparison includes that copy in the reference.
+"""
+
+import argparse
+import io
+import sys
+import time
+
+from benchmark_history import add_history_argument, record_run
+
+FORMAT_OPTIONS = {
+    "PNG": {"compress_level": 1},
+    "WEBP": {"quality": 90},
+}
+
+
+def images_per_sec(fn, batches, batch_size):
+    fn(batches[0])  # warmup
+    start_time = time.perf_counter()
+    for decoded in batches:
+        fn(decoded)
+    return len(batches) * batch_size / (time.perf_counter() - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark postprocessing and image encoding")
+    parser.add_argument("--batch-size", type=int, default=4, help="Images per batch")
+    parser.add_argument("--batches", type=int, default=8, help="Batches per measurement")
+    parser.add_argument("--height", type=int, default=512, help="Image height")
+    parser.add_argument("--width", type=int, default=512, help="Image width")
+    parser.add_argument("--formats", nargs="+", default=list(FORMAT_OPTIONS), choices=list(FORMAT_OPTIONS),
+                        help="Image formats to encode")
+    parser.add_argument("--workers", type=int, default=None, help="Encoding threads (default: CPU count)")
+    add_history_argument(parser)
+    args = parser.parse_args()
+
+    import numpy as np
+    from image_batch import ImageEncoder, Postprocessor, seeded_latents
+    from reference_pipeline import postprocess
+
+    # Smooth images compress like real outputs; pure noise would not
+    shape = (3, args.height, args.width)
+    low_res = seeded_latents(range(args.batches * args.batch_size), (3, args.height // 8, args.width // 8))
+    smooth = np.repeat(np.repeat(low_res, 8, axis=2), 8, axis=3) * 0.5
+    noise = seeded_latents(range(len(smooth)), shape, "philox") * 0.05
+    decoded = np.clip(smooth + noise, -1.2, 1.2).astype(np.float32)
+    batches = [decoded[i:i + args.batch_size] for i in range(0, len(decoded), args.batch_size)]
+
+    start_time = time.perf_counter()
+    seeded_latents(range(args.batch_size), (4, args.height // 8, args.width // 8))
+    print(f"Seeded latents for a batch of {args.batch_size}: {(time.perf_counter() - start_time) * 1000:.2f}ms")
+
+    postprocessor = Postprocessor()
+    if not np.array_equal(postprocessor(batches[0]), postprocess(batches[0])):
+        print("Error: Postprocessor output differs from reference_pipeline.postprocess")
+        sys.exit(1)
+    baseline = images_per_sec(lambda batch: np.ascontiguousarray(postprocess(batch)), batches, args.batch_size)
+    fused = images_per_sec(postprocessor, batches, args.batch_size)
+    speedup = fused / baseline
+    print(f"\nPostprocess only: reference {baseline:.1f} img/s, fused {fused:.1f} img/s ({speedup:.2f}x)")
+    results = {"postprocess": {"reference_images_per_sec": baseline, "fused_images_per_sec": fused,
+                               "speedup": speedup}}
+
+    # Imported lazily like the encoder itself
+    from PIL import Image
+
+    for image_format in args.formats:
+        options = FORMAT_OPTIONS[image_format]
+
+        def sequential(batch):
+            for image in postprocess(batch):
+                buffer = io.BytesIO()
+                Image.fromarray(image).save(buffer, format=image_format, **options)
+
+        encoder = ImageEncoder(image_format, args.workers, **options)
+        reference = images_per_sec(sequential, batches, args.batch_size)
+        pooled = images_per_sec(lambda batch: encoder.encode(postprocessor(batch)), batches, args.batch_size)
+        encoder.close()
+        print(f"{image_format:>5} postprocess + encode: sequential {reference:.1f} img/s, "
+              f"fused + {encoder.workers} threads {pooled:.1f} img/s ({pooled / reference:.2f}x)")
+        results[image_format.lower()] = {"sequential_images_per_sec": reference, "pooled_images_per_sec": pooled,
+                                         "speedup": pooled / reference}
+
+    if args.history:
+        record_run(args.history, "postprocess", results, args)
+
+
+if __name__ == "__main__":
+    main()
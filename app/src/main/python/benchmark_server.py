@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Load generator for the batching generation server.
+
+For each concurrency level, N closed-loop clients send requests back to back
+for a fixed number of requests. Reports images/sec, mean and p95 latency, and
+the average batch size the server formed.
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmark_history import add_history_argument, record_run
+
+
+async def run_level(pipeline, concurrency, total_requests, max_batch_size, max_wait_ms,
+                    steps, height, width):
+    import numpy as np
+
+    from generation_server import GenerationRequest, GenerationServer
+
+    server = GenerationServer(pipeline, max_batch_size, max_wait_ms)
+    await server.start()
+    latencies = []
+    remaining = [total_requests]
+
+    async def client(client_id):
+        index = 0
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            request = GenerationRequest(
+                f"benchmark prompt {client_id}-{index}",
+                num_inference_steps=steps,
+                height=height,
+                width=width,
+                seed=client_id * 1000 + index,
+            )
+            start_time = time.perf_counter()
+            await server.generate(request)
+            latencies.append(time.perf_counter() - start_time)
+            index += 1
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start_time
+    await server.stop()
+
+    return {
+        "concurrency": concurrency,
+        "images_per_sec": len(latencies) / elapsed,
+        "mean_latency": float(np.mean(latencies)),
+        "p95_latency": float(np.percentile(latencies, 95)),
+        "mean_batch": float(np.mean(server.batch_sizes)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batching generation server")
+    parser.add_argument("model_dir", help="Directory with the exported models")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="Concurrent client counts to test")
+    parser.add_argument("--requests", type=int, default=16, help="Requests per concurrency level")
+    parser.add_argument("--max-batch-size", type=int, default=4, help="Maximum requests per batch")
+    parser.add_argument("--max-wait-ms", type=float, default=50, help="Maximum batching delay")
+    parser.add_argument("--steps", type=int, default=20, help="Inference steps per request")
+    parser.add_argument("--height", type=int, default=512, help="Image height")
+    parser.add_argument("--width", type=int, default=512, help="Image width")
+    add_history_argument(parser)
+    args = parser.parse_args()
+
+    from reference_pipeline import ReferencePipeline
+
+    pipeline = ReferencePipeline(args.model_dir)
+    print(f"{'clients':>8} {'img/s':>8} {'mean':>9} {'p95':>9} {'batch':>6}")
+    results = {}
+    for concurrency in args.concurrency:
+        result = asyncio.run(run_level(
+            pipeline, concurrency, args.requests, args.max_batch_size, args.max_wait_ms,
+            args.steps, args.height, args.width
+        ))
+        print(f"{result['concurrency']:>8} {result['images_per_sec']:>8.2f} "
+              f"{result['mean_latency']:>8.2f}s {result['p95_latency']:>8.2f}s "
+              f"{result['mean_batch']:>6.2f}")
+        results[f"{concurrency} clients"] = {
+            "images_per_sec": result["images_per_sec"],
+            "mean_latency_s": result["mean_latency"],
+            "p95_latency_s": result["p95_latency"],
+        }
+
+    if args.history:
+        record_run(args.history, "server", results, args, args.model_dir)
+
+
+if __name__ == "__main__":
+    main()
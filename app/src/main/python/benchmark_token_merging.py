@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Per-step latency and parity of a token merging UNet against the original.
+
+Both UNets run on the same seeded classifier-free guidance batch (batch of
+two) at each resolution. Parity compares the noise predictions with the
+metrics from validate_models.py; merging is lossy by design, so only the
+cosine similarity is gated.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from benchmark_history import add_history_argument, record_run
+from validate_models import DEFAULT_TOLERANCES, check_tolerances, compare_outputs, create_seeded_inputs
+
+
+def time_step(session, feed, warmup, runs):
+    import numpy as np
+
+    for _ in range(warmup):
+        session.run(None, feed)
+    timings = []
+    output = None
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        output = session.run(None, feed)[0]
+        timings.append(time.perf_counter() - start_time)
+    return float(np.median(timings)) * 1000, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark token merging against the original UNet")
+    parser.add_argument("original", help="Original UNet ONNX model")
+    parser.add_argument("merged", help="Token merging UNet (created from the original when missing)")
+    parser.add_argument("--ratios", type=float, nargs="+", default=None,
+                        help="Merge ratios per level when creating the merged model "
+                             "(default: token_merging.DEFAULT_RATIOS)")
+    parser.add_argument("--resolutions", type=int, nargs="+", default=[512, 768],
+                        help="Image resolutions to test (latents are 1/8)")
+    parser.add_argument("--warmup", type=int, default=1, help="Warmup runs per resolution")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per resolution")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the inputs")
+    parser.add_argument("--min-cosine", type=float, default=DEFAULT_TOLERANCES["unet"]["min_cosine"],
+                        help="Minimum cosine similarity of the noise predictions")
+    add_history_argument(parser)
+    args = parser.parse_args()
+
+    import onnxruntime as ort
+
+    if not os.path.exists(args.merged):
+        from token_merging import DEFAULT_RATIOS, apply_token_merging
+
+        ratios = DEFAULT_RATIOS if args.ratios is None else args.ratios
+        print(f"Creating {args.merged} with ratios {ratios}...")
+        apply_token_merging(args.original, args.merged, ratios)
+
+    sessions = {
+        name: ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+        for name, path in (("original", args.original), ("merged", args.merged))
+    }
+    tolerances = {"min_cosine": args.min_cosine}
+    failed = False
+    results = {}
+
+    print(f"{'resolution':>10} {'original':>10} {'merged':>10} {'speedup':>8} {'cosine':>8} {'max_abs':>8}")
+    for resolution in args.resolutions:
+        dims = {"height": resolution // 8, "width": resolution // 8}
+        feed = create_seeded_inputs(sessions["original"], 2, args.seed, dims)
+        original_ms, reference = time_step(sessions["original"], feed, args.warmup, args.runs)
+        merged_ms, candidate = time_step(sessions["merged"], feed, args.warmup, args.runs)
+        metrics = compare_outputs("unet", reference, candidate)
+        print(f"{resolution:>10} {original_ms:>8.1f}ms {merged_ms:>8.1f}ms {original_ms / merged_ms:>7.2f}x "
+              f"{metrics['cosine']:>8.4f} {metrics['max_abs_error']:>8.4f}")
+        results[f"{resolution}px"] = {
+            "original_ms": original_ms,
+            "merged_ms": merged_ms,
+            "speedup": original_ms / merged_ms,
+            "cosine": metrics["cosine"],
+        }
+        for failure in check_tolerances(metrics, tolerances):
+            print(f"  {resolution}px outside tolerance: {failure}")
+            failed = True
+
+    if args.history:
+        record_run(args.history, "token_merging", results, args, args.merged)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Cold start regression check for the pixelvita CLI.
+
+Runs lightweight pixelvita commands in fresh interpreters with
+-X importtime and fails when one of them imports a heavy dependency or when
+the total import time exceeds the budget.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from pixelvita import BENCHMARKS, TOOLS
+
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pixelvita.py")
+
+# Commands that must not load any model tooling; forwarded tools and
+# benchmarks only import their heavy dependencies once arguments are parsed
+LIGHTWEIGHT_COMMANDS = [
+    ["--help"],
+    ["benchmark", "--help"],
+    ["convert", "--help"],
+    ["quantize", "--help"],
+] + [[name, "--help"] for name in TOOLS] + [["benchmark", name, "--help"] for name in BENCHMARKS]
+
+HEAVY_MODULES = {"torch", "diffusers", "optimum", "transformers", "onnx", "onnxruntime", "numpy", "PIL"}
+
+DEFAULT_BUDGET_MS = 100.0
+
+
+def parse_importtime(stderr):
+    """Return (module, depth, cumulative_us) for every line of -X importtime output"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented by two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), depth, int(cumulative)))
+    return imports
+
+
+def measure(command):
+    start_time = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", CLI] + command,
+                            capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start_time) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"pixelvita {' '.join(command)} failed:\n{result.stderr}")
+    imports = parse_importtime(result.stderr)
+    import_ms = sum(cumulative for _, depth, cumulative in imports if depth == 0) / 1000
+    heavy = sorted({name for name, _, _ in imports if name.split(".")[0] in HEAVY_MODULES})
+    return import_ms, wall_ms, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check pixelvita cold start import time")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="Maximum total import time per command")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per command (the fastest counts)")
+    args = parser.parse_args()
+
+    failures = []
+    for command in LIGHTWEIGHT_COMMANDS:
+        results = [measure(command) for _ in range(args.runs)]
+        import_ms = min(result[0] for result in results)
+        wall_ms = min(result[1] for result in results)
+        heavy = results[0][2]
+        label = "pixelvita " + " ".join(command)
+        print(f"{label:<40} imports {import_ms:6.1f}ms  wall {wall_ms:6.1f}ms")
+        if heavy:
+            failures.append(f"{label} imports {', '.join(heavy)}")
+        if import_ms > args.budget_ms:
+            failures.append(f"{label} import time {import_ms:.1f}ms > {args.budget_ms:.1f}ms")
+
+    if failures:
+        print("\nFAILED:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print(f"\nAll lightweight commands within {args.budget_ms:.0f}ms and free of heavy imports")
+
+
+if __name__ == "__main__":
+    main()
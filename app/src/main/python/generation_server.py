@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""Batching generation service over the reference pipeline.
+
+Incoming requests are queued and grouped into dynamic batches: requests that
+share resolution and step count are denoised together with one batched UNet
+call per step. A batch is dispatched as soon as it is full or its oldest
+request has waited max_wait_ms, so latency stays bounded at low load while
+throughput grows with concurrency.
+
+The service speaks newline-delimited JSON over TCP. Each request line is an
+object with an "id", a "prompt" and optional generation parameters; results
+are streamed back as they complete, possibly out of order, with the image as
+a base64 encoded PNG.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from image_batch import ImageEncoder
+from reference_pipeline import ReferencePipeline
+
+
+class GenerationRequest:
+    def __init__(self, prompt, negative_prompt="", num_inference_steps=20, guidance_scale=7.0,
+                 height=512, width=512, seed=0):
+        # Rejected here, before queueing, so a bad request fails on its own
+        # instead of failing every request batched with it
+        if seed < 0:
+            raise ValueError(f"seed must be non-negative, got {seed}")
+        if num_inference_steps < 1:
+            raise ValueError(f"steps must be at least 1, got {num_inference_steps}")
+        if height <= 0 or width <= 0 or height % 8 or width % 8:
+            raise ValueError(f"height and width must be positive multiples of 8, got {height}x{width}")
+        self.prompt = prompt
+        self.negative_prompt = negative_prompt
+        self.num_inference_steps = num_inference_steps
+        self.guidance_scale = guidance_scale
+        self.height = height
+        self.width = width
+        self.seed = seed
+        self.future = None
+        self.arrival_time = None
+
+    @property
+    def batch_key(self):
+        """Requests with equal keys can share a batched UNet call"""
+        return (self.height, self.width, self.num_inference_steps)
+
+
+class GenerationServer:
+    def __init__(self, pipeline, max_batch_size=4, max_wait_ms=50):
+        """
+        Args:
+            pipeline: ReferencePipeline used to run batches
+            max_batch_size: Maximum number of requests denoised together
+            max_wait_ms: Longest time a request waits for batch mates
+        """
+        self.pipeline = pipeline
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batch_sizes = []
+        self._queue = None
+        self._backlog = deque()
+        self._worker = None
+        # Batches run one at a time; new requests queue up behind them
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._batch_loop())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=True)
+
+    async def generate(self, request):
+        """Queue a request and wait for its uint8 HWC image"""
+        loop = asyncio.get_running_loop()
+        request.future = loop.create_future()
+        request.arrival_time = loop.time()
+        await self._queue.put(request)
+        return await request.future
+
+    async def _next_request(self, timeout=None):
+        if self._backlog:
+            return self._backlog.popleft()
+        if timeout is None:
+            return await self._queue.get()
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+    async def _collect_batch(self):
+        loop = asyncio.get_running_loop()
+        first = await self._next_request()
+        batch = [first]
+        deferred = []
+
+        # Compatible requests that were set aside earlier join first
+        for request in list(self._backlog):
+            if len(batch) == self.max_batch_size:
+                break
+            if request.batch_key == first.batch_key:
+                self._backlog.remove(request)
+                batch.append(request)
+
+        deadline = first.arrival_time + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if request.batch_key == first.batch_key:
+                batch.append(request)
+            else:
+                deferred.append(request)
+        self._backlog.extend(deferred)
+        return batch
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            self.batch_sizes.append(len(batch))
+            try:
+                images = await loop.run_in_executor(self._executor, self._run_batch, batch)
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+            for request, image in zip(batch, images):
+                if not request.future.done():
+                    request.future.set_result(image)
+
+    def _run_batch(self, batch):
+        pipeline = self.pipeline
+        first = batch[0]
+        text_embeddings = pipeline.encode_prompt(
+            [request.prompt for request in batch],
+            [request.negative_prompt for request in batch],
+        )
+        # One noise stream per request, so batching never changes a request's image
+        latents = pipeline.prepare_latents(len(batch), first.height, first.width,
+                                           [request.seed for request in batch])
+        guidance = [request.guidance_scale for request in batch]
+        latents = pipeline.denoise(latents, text_embeddings, first.num_inference_steps, guidance)
+        return list(pipeline.decode(latents))
+
+
+async def encode_png(encoder, image):
+    # Compressed in the encoder's thread pool, off the event loop
+    data = await asyncio.wrap_future(encoder.submit(image))
+    return base64.b64encode(data).decode("ascii")
+
+
+async def _handle_client(server, encoder, reader, writer):
+    write_lock = asyncio.Lock()
+    tasks = set()
+
+    async def write(response):
+        async with write_lock:
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+
+    async def respond(message):
+        request_id = message.get("id") if isinstance(message, dict) else None
+        start_time = time.time()
+        try:
+            if not isinstance(message, dict):
+                raise ValueError("Request must be a JSON object")
+            request = GenerationRequest(
+                message["prompt"],
+                negative_prompt=message.get("negative_prompt", ""),
+                num_inference_steps=int(message.get("steps", 20)),
+                guidance_scale=float(message.get("guidance_scale", 7.0)),
+                height=int(message.get("height", 512)),
+                width=int(message.get("width", 512)),
+                seed=int(message.get("seed", 0)),
+            )
+            image = await server.generate(request)
+            response = {"id": request_id, "latency": time.time() - start_time, "image": await encode_png(encoder, image)}
+        except Exception as e:
+            response = {"id": request_id, "error": str(e)}
+        await write(response)
+
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        try:
+            message = json.loads(line)
+        except ValueError as e:
+            # Every line gets a reply, so a client never waits on a dropped request
+            task = asyncio.create_task(write({"id": None, "error": f"Invalid JSON: {e}"}))
+        else:
+            task = asyncio.create_task(respond(message))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    writer.close()
+
+
+async def serve(model_dir, host, port, max_batch_size, max_wait_ms):
+    server = GenerationServer(ReferencePipeline(model_dir), max_batch_size, max_wait_ms)
+    await server.start()
+    encoder = ImageEncoder("PNG")
+    tcp_server = await asyncio.start_server(
+        lambda reader, writer: _handle_client(server, encoder, reader, writer), host, port
+    )
+    print(f"Serving on {host}:{port} (max batch {max_batch_size}, max wait {max_wait_ms}ms)")
+    try:
+        async with tcp_server:
+            await tcp_server.serve_forever()
+    finally:
+        await server.stop()
+        encoder.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batching image generation service")
+    parser.add_argument("model_dir", help="Directory with the exported models")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--max-batch-size", type=int, default=4, help="Maximum requests per batch")
+    parser.add_argument("--max-wait-ms", type=float, default=50, help="Maximum batching delay")
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.model_dir, args.host, args.port, args.max_batch_size, args.max_wait_ms))
+
+
+if __name__ == "__main__":
+    main()
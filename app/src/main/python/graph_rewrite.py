@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Helpers shared by the post-export ONNX graph rewrites.
+
+token_merging.py and attention_fusion.py edit exported models in place:
+they find a pattern, append replacement nodes with GraphBuilder, rewire the
+consumers, then restore a valid node order with topological_sort and drop
+whatever the rewrite left unused with remove_unused_nodes. Tensor shapes
+that the graph only knows symbolically are read from a probe run.
+"""
+
+import os
+import tempfile
+from collections import defaultdict
+
+import numpy as np
+import onnx
+import onnxruntime as ort
+from onnx import TensorProto, helper, numpy_helper
+
+from validate_models import create_seeded_inputs
+
+
+def consumers_of(graph):
+    consumers = defaultdict(list)
+    for node in graph.node:
+        for name in node.input:
+            if name:
+                consumers[name].append(node)
+    return consumers
+
+
+def producers_of(graph):
+    return {output: node for node in graph.node for output in node.output}
+
+
+class GraphBuilder:
+    """Appends uniquely named nodes and constants for one rewritten block"""
+
+    def __init__(self, graph, prefix, constants=None):
+        """
+        Args:
+            graph: Graph the nodes are appended to (e.g. a Loop body)
+            prefix: Name prefix for the new nodes and tensors
+            constants: Graph for the constants (default: graph); a Loop body
+                can read constants from its enclosing graph
+        """
+        self.graph = graph
+        self.constants = constants if constants is not None else graph
+        self.prefix = prefix
+        self.count = 0
+
+    def _name(self, hint):
+        self.count += 1
+        return f"{self.prefix}/{hint}_{self.count}"
+
+    def const(self, value, hint="const"):
+        name = self._name(hint)
+        self.constants.initializer.append(numpy_helper.from_array(np.asarray(value), name))
+        return name
+
+    def op(self, op_type, inputs, num_outputs=1, **attrs):
+        name = self._name(op_type)
+        outputs = [f"{name}_out{i}" for i in range(num_outputs)]
+        self.graph.node.append(helper.make_node(op_type, inputs, outputs, name=name, **attrs))
+        return outputs[0] if num_outputs == 1 else outputs
+
+
+def outer_scope_inputs(node):
+    """Names a node's subgraphs (e.g. a Loop body) read from the enclosing graph"""
+    names = []
+    for attribute in node.attribute:
+        for subgraph in list(attribute.graphs) + ([attribute.g] if attribute.HasField("g") else []):
+            local = ({init.name for init in subgraph.initializer} | {i.name for i in subgraph.input}
+                     | {output for inner in subgraph.node for output in inner.output})
+            for inner in subgraph.node:
+                names.extend(name for name in list(inner.input) + outer_scope_inputs(inner)
+                             if name and name not in local)
+    return names
+
+
+def topological_sort(graph):
+    """Reorder graph nodes so every node follows the producers of its inputs"""
+    available = {init.name for init in graph.initializer} | {i.name for i in graph.input} | {""}
+    producers = producers_of(graph)
+    ordered, visited = [], set()
+    for root in list(graph.node):
+        stack = [(root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if id(node) in visited:
+                continue
+            if expanded:
+                visited.add(id(node))
+                ordered.append(node)
+                continue
+            stack.append((node, True))
+            for name in list(node.input) + outer_scope_inputs(node):
+                producer = producers.get(name)
+                if name not in available and producer is not None and id(producer) not in visited:
+                    stack.append((producer, False))
+    nodes = [onnx.NodeProto() for _ in ordered]
+    for copy, node in zip(nodes, ordered):
+        copy.CopyFrom(node)
+    del graph.node[:]
+    graph.node.extend(nodes)
+
+
+def remove_unused_nodes(graph):
+    """Drop nodes and initializers no graph output depends on; graph must be sorted"""
+    needed = {output.name for output in graph.output}
+    kept = []
+    for node in reversed(graph.node):
+        if any(output in needed for output in node.output):
+            kept.append(node)
+            needed.update(node.input)
+            needed.update(outer_scope_inputs(node))
+    removed = len(graph.node) - len(kept)
+    nodes = [onnx.NodeProto() for _ in kept]
+    for copy, node in zip(nodes, reversed(kept)):
+        copy.CopyFrom(node)
+    del graph.node[:]
+    graph.node.extend(nodes)
+    initializers = [init for init in graph.initializer if init.name in needed]
+    if len(initializers) != len(graph.initializer):
+        kept_initializers = [onnx.TensorProto() for _ in initializers]
+        for copy, init in zip(kept_initializers, initializers):
+            copy.CopyFrom(init)
+        del graph.initializer[:]
+        graph.initializer.extend(kept_initializers)
+    return removed
+
+
+def default_opset(model):
+    return next((o.version for o in model.opset_import if o.domain in ("", "ai.onnx")), 0)
+
+
+def load_model(model_path):
+    """Load a model with its weights; returns (model, whether it used external data)"""
+    model = onnx.load(model_path, load_external_data=False)
+    external = any(init.data_location == TensorProto.EXTERNAL for init in model.graph.initializer)
+    onnx.load_external_data_for_model(model, os.path.dirname(os.path.abspath(model_path)))
+    return model, external
+
+
+def save_model(model, output_path, external):
+    """Save a rewritten model, keeping large weights in one external data file"""
+    if external:
+        onnx.save_model(model, output_path, save_as_external_data=True, all_tensors_to_one_file=True,
+                        location=os.path.basename(output_path) + ".data")
+    else:
+        onnx.save_model(model, output_path)
+
+
+def probe_tensors(model, names, batch_size=1, dims=None):
+    """
+    Values of intermediate tensors from one run on seeded inputs.
+
+    Args:
+        model: Model to probe (not modified)
+        names: Tensor names to return
+        batch_size: Batch size of the seeded inputs
+        dims: Symbolic dimension overrides, see create_seeded_inputs
+    Returns:
+        Dict of name -> numpy array
+    """
+    probe = onnx.ModelProto()
+    probe.CopyFrom(model)
+    known = {output.name for output in probe.graph.output}
+    for name in dict.fromkeys(names):
+        if name not in known:
+            probe.graph.output.append(onnx.ValueInfoProto(name=name))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        probe_path = os.path.join(temp_dir, "probe.onnx")
+        onnx.save_model(probe, probe_path, save_as_external_data=True,
+                        all_tensors_to_one_file=True, location="probe.onnx.data")
+        session = ort.InferenceSession(probe_path, providers=["CPUExecutionProvider"])
+        feed = create_seeded_inputs(session, batch_size, dims=dims)
+        names = list(dict.fromkeys(names))
+        values = dict(zip(names, session.run(names, feed)))
+        del session
+    return values
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Batch latent noise, postprocessing and image encoding.
+
+- seeded_latents() draws Gaussian latents for a whole batch with one
+  independent stream per sample, so a request's noise depends only on its
+  own seed and not on the batch it was scheduled in. PCG64 streams match
+  np.random.default_rng(seed); Philox streams are keyed directly by the seed.
+- Postprocessor converts NCHW float VAE output in [-1, 1] to contiguous NHWC
+  uint8 with out= arithmetic into buffers that are reused across batches.
+- ImageEncoder encodes PNG/WebP in a thread pool; Pillow releases the GIL
+  while compressing, so encoding scales with the number of workers.
+"""
+
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BIT_GENERATORS = {
+    "pcg64": np.random.PCG64,
+    "philox": lambda seed: np.random.Philox(key=seed),
+}
+
+
+def seeded_latents(seeds, shape, bit_generator="pcg64", dtype=np.float32, out=None):
+    """
+    Gaussian latents with one independent seeded stream per sample.
+
+    Args:
+        seeds: One integer seed per sample
+        shape: Per-sample shape, e.g. (4, height // 8, width // 8)
+        bit_generator: 'pcg64' or 'philox'
+        dtype: float32 or float64
+        out: Optional preallocated array of shape (len(seeds),) + shape
+    """
+    if bit_generator not in BIT_GENERATORS:
+        raise ValueError(f"Unknown bit generator {bit_generator}, expected one of {list(BIT_GENERATORS)}")
+    seeds = list(seeds)
+    if out is None:
+        out = np.empty((len(seeds),) + tuple(shape), dtype=dtype)
+    for sample, seed in zip(out, seeds):
+        rng = np.random.Generator(BIT_GENERATORS[bit_generator](int(seed)))
+        rng.standard_normal(out=sample, dtype=out.dtype)
+    return out
+
+
+class Postprocessor:
+    """VAE output to uint8 images without per-batch allocations"""
+
+    def __init__(self):
+        self._scratch = None
+        self._images = None
+
+    def __call__(self, decoded, out=None):
+        """
+        Convert NCHW float output in [-1, 1] to contiguous NHWC uint8.
+
+        Args:
+            decoded: VAE output, NCHW
+            out: Optional uint8 array of shape (batch, height, width, channels)
+                to write into. Without it the images go to a buffer that is
+                reused by the next call; copy them (or finish encoding them)
+                before postprocessing another batch.
+        """
+        batch, channels, height, width = decoded.shape
+        if self._scratch is None or self._scratch.shape != decoded.shape:
+            self._scratch = np.empty(decoded.shape, dtype=np.float32)
+            self._images = None
+        if out is None:
+            if self._images is None:
+                self._images = np.empty((batch, height, width, channels), dtype=np.uint8)
+            out = self._images
+        scratch = self._scratch
+        # Same operations in the same order as postprocess, so rounding agrees
+        np.multiply(decoded, 0.5, out=scratch)
+        np.add(scratch, 0.5, out=scratch)
+        np.clip(scratch, 0.0, 1.0, out=scratch)
+        np.multiply(scratch, 255.0, out=scratch)
+        np.rint(scratch, out=scratch)
+        # One strided pass: the layout change happens in the cast to uint8
+        np.copyto(out, scratch.transpose(0, 2, 3, 1), casting="unsafe")
+        return out
+
+
+class ImageEncoder:
+    def __init__(self, image_format="PNG", workers=None, **save_options):
+        """
+        Args:
+            image_format: Pillow format name, e.g. 'PNG' or 'WEBP'
+            workers: Encoding threads (default: CPU count)
+            save_options: Passed to Image.save, e.g. compress_level=1 or quality=90
+        """
+        self.image_format = image_format
+        self.save_options = save_options
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image-encode")
+
+    def _encode(self, image):
+        # Imported lazily: only needed when images are written out
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.fromarray(image).save(buffer, format=self.image_format, **self.save_options)
+        return buffer.getvalue()
+
+    def submit(self, image):
+        """Encode one HWC uint8 image in the pool; returns a Future of the bytes"""
+        return self.executor.submit(self._encode, image)
+
+    def encode(self, images):
+        """Encode a batch in parallel and return the bytes in order"""
+        return list(self.executor.map(self._encode, images))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""Binary delta updates for exported model artifacts.
+
+Splits model files into content-defined chunks with a gear rolling hash, so
+chunk boundaries follow the bytes rather than fixed offsets and survive
+insertions such as a re-quantized initializer changing size. A patch stores
+copy instructions for chunks the device already has and literal bytes for
+the rest. Applying it rebuilds the new artifact from the old one and checks
+its SHA-256.
+
+Usage:
+    model_delta.py build <old_model> <new_model> <patch>
+    model_delta.py apply <old_model> <patch> <output>
+
+Models may be single files or directories (e.g. ONNX with external data).
+Every base file is identified by the SHA-256 recorded in the patch header;
+a single-file base is matched by that hash alone, so it may have been
+renamed since the patch was built.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+MAGIC = b"PVDELTA1"
+
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 256 * 1024
+# 16 high bits must be zero: one boundary every 64KB on average
+BOUNDARY_MASK = np.uint32(0xFFFF0000)
+WINDOW = 32
+BLOCK_SIZE = 8 * 1024 * 1024
+IO_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Stable across platforms and numpy versions: derived from SHA-256 of each byte value
+GEAR = np.array(
+    [int.from_bytes(hashlib.sha256(bytes([value])).digest()[:4], "little") for value in range(256)],
+    dtype=np.uint32,
+)
+
+
+def _rolling_hash(data):
+    """Gear hash of the WINDOW bytes ending at each position, computed by doubling"""
+    hashes = GEAR[data]
+    width = 1
+    while width < WINDOW:
+        shifted = np.zeros_like(hashes)
+        shifted[width:] = hashes[:-width] << np.uint32(width)
+        hashes += shifted
+        width *= 2
+    return hashes
+
+
+def chunk_boundaries(data):
+    """
+    Return content-defined chunk end offsets for a uint8 array.
+
+    Args:
+        data: numpy uint8 array (a memmap works) holding the file contents
+    """
+    size = len(data)
+    candidates = []
+    for start in range(0, size, BLOCK_SIZE):
+        # Overlap the previous block so every window sees the same bytes
+        context = min(start, WINDOW - 1)
+        block = np.asarray(data[start - context:min(start + BLOCK_SIZE, size)])
+        hashes = _rolling_hash(block)[context:]
+        positions = np.flatnonzero((hashes & BOUNDARY_MASK) == 0)
+        candidates.append(positions + start + 1)
+    candidates = np.concatenate(candidates) if candidates else np.array([], dtype=np.int64)
+
+    boundaries = []
+    position = 0
+    while position < size:
+        index = np.searchsorted(candidates, position + MIN_CHUNK_SIZE)
+        if index < len(candidates) and candidates[index] <= position + MAX_CHUNK_SIZE:
+            end = int(candidates[index])
+        else:
+            end = position + MAX_CHUNK_SIZE
+        position = min(end, size)
+        boundaries.append(position)
+    return boundaries
+
+
+def _chunk_digest(chunk):
+    return hashlib.blake2b(chunk.tobytes(), digest_size=16).digest()
+
+
+def _list_files(path):
+    """Map relative file names to absolute paths for a file or directory"""
+    if os.path.isfile(path):
+        return {os.path.basename(path): path}
+    files = {}
+    for root, _, names in os.walk(path):
+        for name in sorted(names):
+            full_path = os.path.join(root, name)
+            files[os.path.relpath(full_path, path)] = full_path
+    return files
+
+
+def _open(path):
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for buffer in iter(lambda: f.read(IO_BUFFER_SIZE), b""):
+            digest.update(buffer)
+    return digest.hexdigest()
+
+
+def _index_sources(sources):
+    """Map chunk digests of the old artifact to (source index, offset, length)"""
+    index = {}
+    for source_index, path in enumerate(sources):
+        data = _open(path)
+        start = 0
+        for end in chunk_boundaries(data):
+            index.setdefault(_chunk_digest(data[start:end]), (source_index, start, end - start))
+            start = end
+    return index
+
+
+def _append_op(ops, op):
+    """Append an op, merging it with the previous one when they are contiguous"""
+    if ops:
+        last = ops[-1]
+        if op[0] == "copy" and last[0] == "copy" and last[1] == op[1] and last[2] + last[3] == op[2]:
+            last[3] += op[3]
+            return
+        if op[0] == "data" and last[0] == "data" and last[1] + last[2] == op[1]:
+            last[2] += op[2]
+            return
+    ops.append(op)
+
+
+def build_patch(old_path, new_path, patch_path):
+    """
+    Build a patch that turns old_path into new_path.
+
+    Returns a report with the patch size, the full download size and the share
+    of bytes reused from the old artifact.
+    """
+    start_time = time.time()
+    old_files = _list_files(old_path)
+    new_files = _list_files(new_path)
+    sources = sorted(old_files)
+    index = _index_sources([old_files[name] for name in sources])
+
+    header = {
+        "sources": [
+            {"path": name, "size": os.path.getsize(old_files[name]), "sha256": file_sha256(old_files[name])}
+            for name in sources
+        ],
+        "files": [],
+        "single_file": os.path.isfile(new_path),
+    }
+    literal_ranges = []
+    literal_size = 0
+    new_size = 0
+    for name, path in sorted(new_files.items()):
+        data = _open(path)
+        ops = []
+        start = 0
+        for end in chunk_boundaries(data):
+            match = index.get(_chunk_digest(data[start:end]))
+            if match is not None:
+                _append_op(ops, ["copy", match[0], match[1], match[2]])
+            else:
+                _append_op(ops, ["data", literal_size, end - start])
+                literal_ranges.append((path, start, end - start))
+                literal_size += end - start
+            start = end
+        new_size += len(data)
+        header["files"].append({
+            "path": name,
+            "size": len(data),
+            "sha256": file_sha256(path),
+            "ops": ops,
+        })
+
+    encoded = json.dumps(header).encode()
+    with open(patch_path, "wb") as out:
+        out.write(MAGIC)
+        out.write(struct.pack("<Q", len(encoded)))
+        out.write(encoded)
+        for path, offset, length in literal_ranges:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                out.write(f.read(length))
+
+    patch_size = os.path.getsize(patch_path)
+    return {
+        "patch_size": patch_size,
+        "full_size": new_size,
+        "ratio": patch_size / new_size if new_size else 0.0,
+        "reused_bytes": new_size - literal_size,
+        "time": time.time() - start_time,
+    }
+
+
+def _read_header(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a model delta patch")
+    (length,) = struct.unpack("<Q", f.read(8))
+    return json.loads(f.read(length)), len(MAGIC) + 8 + length
+
+
+def apply_patch(old_path, patch_path, output_path):
+    """
+    Rebuild the new artifact from old_path and a patch, verifying every hash.
+
+    Raises ValueError when the base artifact does not match the one the patch
+    was built against or when a rebuilt file fails verification.
+    """
+    old_files = _list_files(old_path)
+    with open(patch_path, "rb") as patch:
+        header, data_start = _read_header(patch)
+        if os.path.isfile(old_path) and len(header["sources"]) != 1:
+            raise ValueError(f"Patch was built against {len(header['sources'])} base files, not one")
+        sources = []
+        for source in header["sources"]:
+            # Directory bases are matched by relative path; a single file by its hash alone
+            path = old_path if os.path.isfile(old_path) else old_files.get(source["path"])
+            if path is None:
+                raise ValueError(f"Base file {source['path']} is missing")
+            if os.path.getsize(path) != source["size"] or file_sha256(path) != source["sha256"]:
+                raise ValueError(f"Base file {path} does not match the SHA-256 the patch was built against")
+            sources.append(path)
+
+        for entry in header["files"]:
+            if header["single_file"]:
+                target = output_path
+            else:
+                target = os.path.join(output_path, entry["path"])
+            os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+            temp_path = target + ".tmp"
+            digest = hashlib.sha256()
+            with open(temp_path, "wb") as out:
+                for op in entry["ops"]:
+                    if op[0] == "copy":
+                        with open(sources[op[1]], "rb") as f:
+                            f.seek(op[2])
+                            remaining = op[3]
+                            while remaining > 0:
+                                buffer = f.read(min(IO_BUFFER_SIZE, remaining))
+                                digest.update(buffer)
+                                out.write(buffer)
+                                remaining -= len(buffer)
+                    else:
+                        patch.seek(data_start + op[1])
+                        buffer = patch.read(op[2])
+                        digest.update(buffer)
+                        out.write(buffer)
+            if digest.hexdigest() != entry["sha256"]:
+                os.remove(temp_path)
+                raise ValueError(f"Rebuilt {entry['path']} failed hash verification")
+            os.replace(temp_path, target)
+            print(f"Rebuilt {entry['path']} ({entry['size'] / (1024 * 1024):.2f}MB, hash verified)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delta updates for model artifacts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Build a patch between two model versions")
+    build.add_argument("old", help="Previous model file or directory")
+    build.add_argument("new", help="New model file or directory")
+    build.add_argument("patch", help="Path of the patch to write")
+    apply = subparsers.add_parser("apply", help="Rebuild a model from a patch")
+    apply.add_argument("old", help="Previous model file or directory")
+    apply.add_argument("patch", help="Patch produced by 'build'")
+    apply.add_argument("output", help="Output file or directory")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "build":
+            report = build_patch(args.old, args.new, args.patch)
+            print(f"Patch size: {report['patch_size'] / (1024 * 1024):.2f}MB")
+            print(f"Full download: {report['full_size'] / (1024 * 1024):.2f}MB")
+            print(f"Patch is {report['ratio'] * 100:.1f}% of the full download "
+                  f"({report['reused_bytes'] / (1024 * 1024):.2f}MB reused, {report['time']:.1f}s)")
+        else:
+            apply_patch(args.old, args.patch, args.output)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -68,6 +68,15 @@ python optimize_model.py \
     ../assets/models/sd35_medium_optimized/vae_decoder.onnx \
     vae
 
+# Optimize VAE encoder (img2img and inpainting) when it was exported
+if [ -f "../assets/models/sd35_medium/vae_encoder.onnx" ]; then
+    echo -e "${YELLOW}Optimizing VAE encoder...${NC}"
+    python optimize_model.py \
+        ../assets/models/sd35_medium/vae_encoder.onnx \
+        ../assets/models/sd35_medium_optimized/vae_encoder.onnx \
+        vae
+fi
+
 # Copy and update model config
 echo "Updating model configuration..."
 cp ../assets/models/sd35_medium/model_config.json \
@@ -89,6 +98,15 @@ verify_optimization "text_encoder"
 verify_optimization "unet"
 verify_optimization "vae_decoder"
 
+# Check numerical parity against the original models
+echo -e "${YELLOW}Validating optimized model outputs...${NC}"
+if ! python validate_models.py \
+    ../assets/models/sd35_medium \
+    ../assets/models/sd35_medium_optimized; then
+    echo -e "${RED}Error: Optimized models exceed parity tolerances${NC}"
+    exit 1
+fi
+
 echo -e "${GREEN}All models optimized successfully!${NC}"
 echo -e "${YELLOW}Optimized models are in: ../assets/models/sd35_medium_optimized/${NC}"
 
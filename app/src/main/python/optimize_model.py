@@ -1,12 +1,43 @@
 #!/usr/bin/env python3
+import argparse
 import os
 import sys
-import onnx
-import numpy as np
-from onnxruntime.quantization import quantize_dynamic, QuantType
-import onnxruntime as ort
+import json
 
-def optimize_model(model_path, output_path, model_type):
+QUANTIZE_OP_TYPES = ['Conv', 'MatMul', 'Gemm', 'Attention']
+
+def quantize_weights(model_path, output_path, nodes_to_quantize=None, nodes_to_exclude=None):
+    """
+    Apply dynamic INT8 weight quantization.
+    
+    Args:
+        model_path: Path to the FP32 ONNX model
+        output_path: Path to save the quantized model
+        nodes_to_quantize: Optional node names to restrict quantization to
+        nodes_to_exclude: Optional node names to keep in FP32
+    """
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(
+        model_input=model_path,
+        model_output=output_path,
+        weight_type=QuantType.QInt8,
+        per_channel=False,
+        reduce_range=False,
+        op_types_to_quantize=QUANTIZE_OP_TYPES,
+        nodes_to_quantize=nodes_to_quantize or [],
+        nodes_to_exclude=nodes_to_exclude or []
+    )
+
+def load_exclusion_list(path):
+    """Load node names to keep in FP32 from a sensitivity analysis result"""
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("nodes_to_exclude", [])
+    return list(data)
+
+def optimize_model(model_path, output_path, model_type, nodes_to_exclude=None):
     """
     Optimize and quantize an ONNX model for mobile deployment.
     
@@ -14,7 +45,11 @@ def optimize_model(model_path, output_path, model_type):
         model_path: Path to the input ONNX model
         output_path: Path to save the optimized model
         model_type: Type of model ('text_encoder', 'unet', or 'vae')
+        nodes_to_exclude: Optional node names to keep in FP32 during quantization
     """
+    import onnx
+    import onnxruntime as ort
+
     print(f"Optimizing {model_type} model...")
     
     try:
@@ -56,28 +91,21 @@ def optimize_model(model_path, output_path, model_type):
         
         # Step 3: INT8 Quantization
         print("Applying INT8 quantization...")
+        if nodes_to_exclude:
+            print(f"Keeping {len(nodes_to_exclude)} sensitive nodes in FP32")
+        # No FP32 fallback: the caller asked for a quantized model (possibly with
+        # a sensitivity exclusion list), so a failure must not write FP32 weights
         try:
-            quantize_dynamic(
-                model_input=temp_path,
-                model_output=output_path,
-                weight_type=QuantType.QInt8,
-                per_channel=False,
-                reduce_range=False,
-                op_types_to_quantize=['Conv', 'MatMul', 'Gemm', 'Attention']
-            )
+            quantize_weights(temp_path, output_path, nodes_to_exclude=nodes_to_exclude)
         except Exception as e:
-            print(f"Warning during quantization: {str(e)}")
-            print("Falling back to basic optimization...")
-            try:
-                onnx.save_model(model, output_path, save_as_external_data=False)
-            except Exception as e2:
-                print(f"Warning during model saving: {str(e2)}")
-                print("Trying alternative saving method...")
-                onnx.save(model, output_path)
-        
-        # Clean up temporary files
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+            print(f"Error during quantization: {str(e)}")
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+        finally:
+            # Clean up temporary files
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
         
         print(f"Model optimized and saved to: {output_path}")
         
@@ -106,24 +134,26 @@ def optimize_model(model_path, output_path, model_type):
         raise
 
 def main():
-    if len(sys.argv) != 4:
-        print("Usage: optimize_model.py <input_model> <output_model> <model_type>")
-        sys.exit(1)
-    
-    input_model = sys.argv[1]
-    output_model = sys.argv[2]
-    model_type = sys.argv[3]
+    # Parsed before onnx/onnxruntime are imported, so --help stays fast
+    parser = argparse.ArgumentParser(description="Optimize and INT8-quantize one ONNX component")
+    parser.add_argument("input_model", help="Input ONNX model")
+    parser.add_argument("output_model", help="Path for the optimized model")
+    parser.add_argument("model_type", choices=['text_encoder', 'unet', 'vae'], help="Component type")
+    parser.add_argument("exclusion_list", nargs="?", default=None,
+                        help="Sensitivity analysis JSON with nodes to keep in FP32")
+    args = parser.parse_args()
+    input_model = args.input_model
+    output_model = args.output_model
+    model_type = args.model_type
+    exclusion_list = args.exclusion_list
     
     if not os.path.exists(input_model):
         print(f"Error: Input model {input_model} does not exist")
         sys.exit(1)
     
-    if model_type not in ['text_encoder', 'unet', 'vae']:
-        print("Error: model_type must be one of: text_encoder, unet, vae")
-        sys.exit(1)
-    
     try:
-        optimize_model(input_model, output_model, model_type)
+        nodes_to_exclude = load_exclusion_list(exclusion_list) if exclusion_list else None
+        optimize_model(input_model, output_model, model_type, nodes_to_exclude)
     except Exception as e:
         print(f"Error during optimization: {str(e)}")
         sys.exit(1)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Tuned ONNX Runtime session settings.
+
+autotune_sessions.py writes the fastest settings it found for each component
+to ort_profile.json next to the models. Tools that create sessions call
+tuned_session_options() so they pick those settings up automatically.
+"""
+
+import json
+import os
+
+PROFILE_FILENAME = "ort_profile.json"
+
+# Enum member names, resolved when options are built so that importing this
+# module does not import onnxruntime
+EXECUTION_MODES = {
+    "sequential": "ORT_SEQUENTIAL",
+    "parallel": "ORT_PARALLEL",
+}
+
+OPTIMIZATION_LEVELS = {
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+DEFAULT_SETTINGS = {
+    "intra_op_num_threads": 0,
+    "inter_op_num_threads": 0,
+    "execution_mode": "sequential",
+    "enable_mem_pattern": True,
+    "enable_cpu_mem_arena": True,
+    "allow_spinning": True,
+    "graph_optimization_level": "all",
+}
+
+
+def build_session_options(settings):
+    """Create SessionOptions from a settings dict (missing keys use the defaults)"""
+    import onnxruntime as ort
+
+    merged = dict(DEFAULT_SETTINGS)
+    merged.update(settings or {})
+    sess_options = ort.SessionOptions()
+    sess_options.intra_op_num_threads = merged["intra_op_num_threads"]
+    sess_options.inter_op_num_threads = merged["inter_op_num_threads"]
+    sess_options.execution_mode = getattr(ort.ExecutionMode, EXECUTION_MODES[merged["execution_mode"]])
+    sess_options.enable_mem_pattern = merged["enable_mem_pattern"]
+    sess_options.enable_mem_reuse = True
+    sess_options.enable_cpu_mem_arena = merged["enable_cpu_mem_arena"]
+    sess_options.graph_optimization_level = getattr(ort.GraphOptimizationLevel,
+                                                    OPTIMIZATION_LEVELS[merged["graph_optimization_level"]])
+    sess_options.add_session_config_entry(
+        "session.intra_op.allow_spinning", "1" if merged["allow_spinning"] else "0"
+    )
+    return sess_options
+
+
+def profile_path(model_dir):
+    return os.path.join(model_dir, PROFILE_FILENAME)
+
+
+def load_profile(model_dir):
+    """Load the tuned profile for a model directory, or None when it has not been tuned"""
+    path = profile_path(model_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def tuned_settings(model_path):
+    """Tuned settings for a model file, looked up by its name without extension"""
+    profile = load_profile(os.path.dirname(os.path.abspath(model_path)))
+    if not profile:
+        return None
+    component = os.path.splitext(os.path.basename(model_path))[0]
+    entry = profile.get("components", {}).get(component)
+    return entry["settings"] if entry else None
+
+
+def tuned_session_options(model_path, default=None):
+    """SessionOptions from the tuned profile, falling back to default (or ORT defaults)"""
+    settings = tuned_settings(model_path)
+    if settings is not None:
+        return build_session_options(settings)
+    return default
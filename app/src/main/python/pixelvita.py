@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""pixelvita: one entry point for the model toolchain.
+
+Every command imports its implementation (and with it torch, diffusers, onnx
+or onnxruntime) only when it runs, and the forwarded tools and benchmarks defer
+those imports until their arguments are parsed, so `pixelvita --help` and the
+help of every command start in milliseconds. check_import_time.py keeps it
+that way.
+
+    pixelvita convert <checkpoint> <output_dir> [--variant sd35_medium]
+    pixelvita optimize <input.onnx> <output.onnx> <text_encoder|unet|vae> [exclusions.json]
+    pixelvita quantize <input.onnx> <output.onnx> [--budget 0.01]
+    pixelvita benchmark <name> [args...]
+    pixelvita profile <model_dir> [args...]
+    pixelvita validate <original_dir> <optimized_dir> [args...]
+    pixelvita history <report|list|check> [args...]
+
+Benchmarks and profile append their results to a SQLite history with
+--history or when PIXELVITA_HISTORY is set.
+"""
+
+import argparse
+import importlib
+import os
+import sys
+
+PYTHON_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.normpath(os.path.join(PYTHON_DIR, "..", "..", "..", "..", "scripts"))
+
+# Commands that forward their arguments to an existing tool: (directory, module, help)
+TOOLS = {
+    "optimize": (PYTHON_DIR, "optimize_model", "Optimize and quantize one ONNX component"),
+    "profile": (PYTHON_DIR, "autotune_sessions", "Tune ORT session settings and write ort_profile.json"),
+    "validate": (PYTHON_DIR, "validate_models", "Check optimized models against the originals"),
+    "history": (PYTHON_DIR, "benchmark_history", "Benchmark history report and regression check"),
+}
+
+BENCHMARKS = {
+    "io-binding": (PYTHON_DIR, "benchmark_io_binding", "IO binding denoising loop latency and allocations"),
+    "server": (PYTHON_DIR, "benchmark_server", "Batching generation server throughput"),
+    "deepcache": (PYTHON_DIR, "benchmark_deepcache", "DeepCache speedup and parity"),
+    "img2img": (PYTHON_DIR, "benchmark_img2img", "img2img/inpaint latency versus strength and mask area"),
+    "token-merging": (PYTHON_DIR, "benchmark_token_merging", "Token merging UNet latency and parity"),
+    "attention": (PYTHON_DIR, "benchmark_attention_fusion", "Fused/sliced attention UNet latency and memory"),
+    "postprocess": (PYTHON_DIR, "benchmark_postprocess", "Postprocess and image encoding throughput"),
+    "schedulers": (SCRIPTS_DIR, "benchmark_schedulers", "Scheduler step timing"),
+    "download": (SCRIPTS_DIR, "benchmark_download", "Parallel and resumable download throughput"),
+}
+
+CONVERTERS = {
+    "sd35_medium": "convert_sd35_medium",
+    "sd_turbo": "convert_sd_turbo",
+    "sdxl": "convert_sdxl",
+}
+
+QUANTIZATION_METRICS = ["nmse", "max_abs_error", "cosine"]
+
+
+def _import(directory, module_name):
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    return importlib.import_module(module_name)
+
+
+def _run_tool(directory, module_name, prog, args):
+    """Run a tool's main() as if it had been started with args"""
+    sys.argv = [prog] + list(args)
+    _import(directory, module_name).main()
+
+
+def convert(prog, args):
+    parser = argparse.ArgumentParser(prog=prog, description="Export a diffusers checkpoint to ONNX")
+    parser.add_argument("model_path", help="Checkpoint file or diffusers directory")
+    parser.add_argument("output_dir", help="Directory for the exported models")
+    parser.add_argument("--variant", choices=list(CONVERTERS), default="sd35_medium", help="Model family")
+    parser.add_argument("--device", default=None, help="Torch device (default: best available)")
+    parser.add_argument("--deep-cache", action="store_true",
+                        help="Also export the DeepCache UNet pair (sd35_medium only)")
+    options = parser.parse_args(args)
+
+    if options.deep_cache and options.variant != "sd35_medium":
+        parser.error("--deep-cache is only supported for sd35_medium")
+
+    converter = _import(SCRIPTS_DIR, CONVERTERS[options.variant])
+    device = options.device or converter.get_device()
+    pipeline = converter.setup_pipeline(options.model_path, device)
+    if options.variant == "sd35_medium":
+        output_dir = converter.optimize_model(
+            pipeline,
+            options.model_path,
+            options.output_dir,
+            optimization_config={"deep_cache": options.deep_cache},
+        )
+    else:
+        output_dir = converter.optimize_model(pipeline, options.output_dir)
+    print(f"Exported models to: {output_dir}")
+
+
+def quantize(prog, args):
+    parser = argparse.ArgumentParser(prog=prog, description="INT8 weight quantization of one ONNX model")
+    parser.add_argument("model", help="FP32 ONNX model")
+    parser.add_argument("output", help="Path for the quantized model")
+    parser.add_argument("--exclusions", default=None,
+                        help="Exclusion list JSON to read, or to write when --budget is given")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="Run the sensitivity analysis first and keep the error within this budget")
+    parser.add_argument("--metric", choices=QUANTIZATION_METRICS, default="nmse",
+                        help="Error metric the budget applies to")
+    parser.add_argument("--num-samples", type=int, default=8, help="Calibration samples for the analysis")
+    parser.add_argument("--workers", type=int, default=None, help="Analysis worker processes")
+    options = parser.parse_args(args)
+
+    optimize_model = _import(PYTHON_DIR, "optimize_model")
+    nodes_to_exclude = []
+    if options.budget is not None:
+        quantization_sensitivity = _import(PYTHON_DIR, "quantization_sensitivity")
+        exclusions = options.exclusions or options.output + ".exclusions.json"
+        result = quantization_sensitivity.analyze(
+            options.model,
+            exclusions,
+            options.budget,
+            metric=options.metric,
+            num_samples=options.num_samples,
+            workers=options.workers,
+        )
+        nodes_to_exclude = result["nodes_to_exclude"]
+    elif options.exclusions:
+        nodes_to_exclude = optimize_model.load_exclusion_list(options.exclusions)
+
+    optimize_model.quantize_weights(options.model, options.output, nodes_to_exclude=nodes_to_exclude)
+    print(f"Quantized model saved to: {options.output} ({len(nodes_to_exclude)} nodes kept in FP32)")
+
+
+def benchmark(prog, args):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Run one of the toolchain benchmarks",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=_command_list(BENCHMARKS, "benchmarks"),
+    )
+    parser.add_argument("name", choices=list(BENCHMARKS), metavar="name", help="Benchmark to run")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Benchmark arguments (see <name> --help)")
+    options = parser.parse_args(args)
+    directory, module_name, _ = BENCHMARKS[options.name]
+    _run_tool(directory, module_name, f"{prog} {options.name}", options.args)
+
+
+COMMANDS = {
+    "convert": (convert, "Export a diffusers checkpoint to ONNX"),
+    "optimize": (None, TOOLS["optimize"][2]),
+    "quantize": (quantize, "INT8 weight quantization, optionally sensitivity-guided"),
+    "benchmark": (benchmark, "Run a benchmark"),
+    "profile": (None, TOOLS["profile"][2]),
+    "validate": (None, TOOLS["validate"][2]),
+    "history": (None, TOOLS["history"][2]),
+}
+
+
+def _command_list(commands, title="commands"):
+    width = max(len(name) for name in commands)
+    lines = [f"  {name:<{width}}  {entry[-1]}" for name, entry in commands.items()]
+    return f"{title}:\n" + "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="pixelvita",
+        description="PixelVita model toolchain",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=_command_list(COMMANDS),
+    )
+    parser.add_argument("command", choices=list(COMMANDS), metavar="command", help="Command to run")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Command arguments (see <command> --help)")
+    options = parser.parse_args(argv)
+
+    prog = f"pixelvita {options.command}"
+    handler, _ = COMMANDS[options.command]
+    if handler is not None:
+        handler(prog, options.args)
+    else:
+        directory, module_name, _ = TOOLS[options.command]
+        _run_tool(directory, module_name, prog, options.args)
+
+
+if __name__ == "__main__":
+    main()
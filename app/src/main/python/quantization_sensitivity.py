@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""Per-layer quantization sensitivity analysis.
+
+Quantizes one layer (or block of layers) at a time, measures the output error
+against the FP32 model over a seeded calibration set and ranks the layers.
+It then searches for the configuration that quantizes the most layers while
+staying under an error budget, and writes the nodes that must stay in FP32 as
+an exclusion list for optimize_model.py.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import onnx
+import onnxruntime as ort
+
+from optimize_model import QUANTIZE_OP_TYPES, quantize_weights
+from validate_models import cosine_similarity, create_seeded_inputs
+
+# Per-process calibration state, filled by _init_worker
+_worker_state = {}
+
+
+def list_quantizable_nodes(model_path, op_types=QUANTIZE_OP_TYPES):
+    """Return the names of nodes that dynamic quantization would touch"""
+    model = onnx.load(model_path, load_external_data=False)
+    names = []
+    unnamed = 0
+    for node in model.graph.node:
+        if node.op_type not in op_types:
+            continue
+        if node.name:
+            names.append(node.name)
+        else:
+            unnamed += 1
+    if unnamed:
+        print(f"Warning: {unnamed} unnamed nodes cannot be targeted and are ignored")
+    return names
+
+
+def group_nodes(node_names, block_depth=0):
+    """
+    Group node names into analysis units.
+
+    Args:
+        node_names: Quantizable node names in graph order
+        block_depth: 0 analyses every node on its own; N > 0 groups nodes by
+            the first N components of their '/'-separated scope, e.g.
+            depth 2 groups '/down_blocks.0/attentions.0/...' together
+    """
+    groups = {}
+    for name in node_names:
+        if block_depth > 0:
+            scope = [part for part in name.split("/") if part][:-1]
+            key = "/" + "/".join(scope[:block_depth]) if scope else name
+        else:
+            key = name
+        groups.setdefault(key, []).append(name)
+    return groups
+
+
+def _create_session(model_path):
+    sess_options = ort.SessionOptions()
+    sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    sess_options.intra_op_num_threads = 1
+    sess_options.inter_op_num_threads = 1
+    return ort.InferenceSession(model_path, sess_options, providers=["CPUExecutionProvider"])
+
+
+def _run_calibration(session, feeds):
+    return [session.run(None, feed)[0].astype(np.float32) for feed in feeds]
+
+
+def output_error(references, candidates):
+    """Error of candidate outputs: normalized MSE plus cosine and max abs error"""
+    reference = np.concatenate(references)
+    candidate = np.concatenate(candidates)
+    mse = float(np.mean((reference - candidate) ** 2))
+    variance = float(np.var(reference)) or 1.0
+    return {
+        "nmse": mse / variance,
+        "cosine": cosine_similarity(reference, candidate),
+        "max_abs_error": float(np.max(np.abs(reference - candidate))),
+    }
+
+
+def _init_worker(model_path, num_samples, batch_size, seed):
+    session = _create_session(model_path)
+    feeds = [
+        create_seeded_inputs(session, min(batch_size, num_samples - offset), seed + index)
+        for index, offset in enumerate(range(0, num_samples, batch_size))
+    ]
+    _worker_state["model_path"] = model_path
+    _worker_state["feeds"] = feeds
+    _worker_state["references"] = _run_calibration(session, feeds)
+
+
+def _evaluate(nodes_to_quantize=None, nodes_to_exclude=None):
+    """Quantize the worker's model with the given node selection and measure the error"""
+    handle, quantized_path = tempfile.mkstemp(suffix=".onnx")
+    os.close(handle)
+    try:
+        quantize_weights(
+            _worker_state["model_path"],
+            quantized_path,
+            nodes_to_quantize=nodes_to_quantize,
+            nodes_to_exclude=nodes_to_exclude,
+        )
+        session = _create_session(quantized_path)
+        candidates = _run_calibration(session, _worker_state["feeds"])
+    finally:
+        if os.path.exists(quantized_path):
+            os.remove(quantized_path)
+    return output_error(_worker_state["references"], candidates)
+
+
+def _evaluate_group(group):
+    key, nodes = group
+    return key, nodes, _evaluate(nodes_to_quantize=nodes)
+
+
+def rank_sensitivity(executor, groups, metric="nmse"):
+    """
+    Quantize each group alone in parallel and rank groups by their error, worst first.
+
+    Worst is the largest error, or the lowest similarity for cosine.
+    """
+    ranking = []
+    for key, nodes, error in executor.map(_evaluate_group, groups.items()):
+        print(f"  {key}: {metric}={error[metric]:.6f}")
+        ranking.append({"group": key, "nodes": nodes, **error})
+    ranking.sort(key=lambda entry: entry[metric], reverse=metric != "cosine")
+    return ranking
+
+
+def search_exclusions(executor, ranking, budget, metric="nmse"):
+    """
+    Find the fewest most-sensitive groups to keep in FP32 so the error stays in budget.
+
+    Binary-searches the number of excluded groups, assuming the error shrinks
+    as more of the worst groups are excluded. Raises ValueError if the budget
+    is not met even with every group excluded.
+    """
+    def excluded_nodes(count):
+        return [node for entry in ranking[:count] for node in entry["nodes"]]
+
+    def within_budget(error):
+        if metric == "cosine":
+            return error["cosine"] >= budget
+        return error[metric] <= budget
+
+    low, high = 0, len(ranking)
+    best = None
+    while low <= high:
+        count = (low + high) // 2
+        error = executor.submit(_evaluate, None, excluded_nodes(count)).result()
+        print(f"  excluding {count} groups: {metric}={error[metric]:.6f}")
+        if within_budget(error):
+            best = (count, excluded_nodes(count), error)
+            high = count - 1
+        else:
+            low = count + 1
+    # Without a passing count the search ends on the all-excluded configuration
+    if best is None:
+        raise ValueError(f"Budget {budget} is unreachable: excluding all {len(ranking)} groups "
+                         f"still gives {metric}={error[metric]:.6f}")
+    return best
+
+
+def analyze(model_path, output_path, budget, metric="nmse", num_samples=8, batch_size=1,
+            seed=0, block_depth=0, workers=None):
+    """Run the sensitivity analysis and write the exclusion list"""
+    groups = group_nodes(list_quantizable_nodes(model_path), block_depth)
+    if not groups:
+        raise ValueError("Model has no quantizable nodes")
+    workers = workers or max(1, (os.cpu_count() or 1) // 2)
+    print(f"Analyzing {len(groups)} groups with {workers} workers...")
+
+    start_time = time.time()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(model_path, num_samples, batch_size, seed),
+    ) as executor:
+        ranking = rank_sensitivity(executor, groups, metric)
+        print("Searching for the fastest configuration within budget...")
+        excluded_count, nodes_to_exclude, error = search_exclusions(executor, ranking, budget, metric)
+
+    result = {
+        "model": os.path.basename(model_path),
+        "metric": metric,
+        "budget": budget,
+        "error": error,
+        "excluded_groups": [entry["group"] for entry in ranking[:excluded_count]],
+        "nodes_to_exclude": nodes_to_exclude,
+        "ranking": ranking,
+        "time": time.time() - start_time,
+    }
+    with open(output_path, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"Quantizing {len(groups) - excluded_count}/{len(groups)} groups, "
+          f"keeping {len(nodes_to_exclude)} nodes in FP32")
+    print(f"Exclusion list written to: {output_path}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank layers by INT8 quantization sensitivity")
+    parser.add_argument("model", help="FP32 ONNX model to analyze (typically unet.onnx)")
+    parser.add_argument("output", help="Path of the exclusion list JSON to write")
+    parser.add_argument("--budget", type=float, default=0.01,
+                        help="Maximum allowed error (minimum similarity for --metric cosine)")
+    parser.add_argument("--metric", choices=["nmse", "max_abs_error", "cosine"], default="nmse",
+                        help="Error metric the budget applies to")
+    parser.add_argument("--num-samples", type=int, default=8, help="Calibration samples")
+    parser.add_argument("--batch-size", type=int, default=1, help="Samples per inference call")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the calibration set")
+    parser.add_argument("--block-depth", type=int, default=0,
+                        help="Group nodes by scope depth instead of analysing single nodes")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel worker processes")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"Error: Input model {args.model} does not exist")
+        sys.exit(1)
+
+    try:
+        analyze(
+            args.model,
+            args.output,
+            args.budget,
+            metric=args.metric,
+            num_samples=args.num_samples,
+            batch_size=args.batch_size,
+            seed=args.seed,
+            block_depth=args.block_depth,
+            workers=args.workers,
+        )
+    except Exception as e:
+        print(f"Error during sensitivity analysis: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,614 @@
+#!/usr/bin/env python3
+"""Reference text-to-image pipeline over the exported ONNX models.
+
+Mirrors the on-device flow (text encoder, classifier-free guided UNet loop
+with an Euler scheduler, VAE decoder) with ONNX Runtime and NumPy so the
+exported and optimized models can be exercised and benchmarked on a host.
+
+DeepCache: when the model directory also holds unet_deepcache.onnx (the full
+UNet that additionally outputs the features entering its last up block) and
+unet_shallow.onnx (conv_in, the first down block and the last up block fed
+with those cached features), denoise() can run the full graph every N steps
+and the much cheaper shallow graph in between.
+
+IO binding: denoise(io_binding=True) binds buffers allocated once per
+generation to the UNet and updates them in place, so the step loop makes no
+per-step NumPy or ORT output allocations.
+
+img2img and inpainting encode the input image with vae_encoder.onnx, noise it
+to step (1 - strength) * steps with the scheduler's add_noise and run only the
+remaining steps. Inpainting re-noises the unmasked latents after every step
+and, by default, runs the UNet only on the tile-aligned bounding box of the
+mask plus some context.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import onnxruntime as ort
+
+from image_batch import Postprocessor, seeded_latents
+from ort_profile import tuned_session_options
+
+DEFAULT_TOKENIZER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "assets", "tokenizer")
+MAX_TOKEN_LENGTH = 77
+LATENT_CHANNELS = 4
+VAE_SCALE_FACTOR = 8
+# Latent crops for inpainting stay a multiple of the UNet's total downsampling
+INPAINT_TILE = 8
+INPAINT_CONTEXT = 8
+
+COMPONENT_FILES = {
+    "text_encoder": "text_encoder.onnx",
+    "unet": "unet.onnx",
+    "vae_decoder": "vae_decoder.onnx",
+    "vae_encoder": "vae_encoder.onnx",
+    "unet_deepcache": "unet_deepcache.onnx",
+    "unet_shallow": "unet_shallow.onnx",
+}
+
+
+class EulerDiscreteScheduler:
+    """NumPy port of diffusers' EulerDiscreteScheduler for epsilon prediction"""
+
+    def __init__(self, num_train_timesteps=1000, beta_start=0.00085, beta_end=0.012,
+                 beta_schedule="scaled_linear", steps_offset=1, timestep_spacing="leading"):
+        if beta_schedule == "scaled_linear":
+            betas = np.linspace(beta_start ** 0.5, beta_end ** 0.5, num_train_timesteps, dtype=np.float64) ** 2
+        else:
+            betas = np.linspace(beta_start, beta_end, num_train_timesteps, dtype=np.float64)
+        self.alphas_cumprod = np.cumprod(1.0 - betas)
+        self.num_train_timesteps = num_train_timesteps
+        self.steps_offset = steps_offset
+        self.timestep_spacing = timestep_spacing
+        self.timesteps = np.array([], dtype=np.float64)
+        self.sigmas = np.array([0.0])
+
+    @classmethod
+    def from_config(cls, path):
+        """Create a scheduler from a saved scheduler_config.json"""
+        with open(path) as f:
+            config = json.load(f)
+        return cls(
+            num_train_timesteps=config.get("num_train_timesteps", 1000),
+            beta_start=config.get("beta_start", 0.00085),
+            beta_end=config.get("beta_end", 0.012),
+            beta_schedule=config.get("beta_schedule", "scaled_linear"),
+            steps_offset=config.get("steps_offset", 1),
+            timestep_spacing=config.get("timestep_spacing", "leading"),
+        )
+
+    def set_timesteps(self, num_inference_steps):
+        n = self.num_train_timesteps
+        if self.timestep_spacing == "linspace":
+            timesteps = np.linspace(0, n - 1, num_inference_steps)[::-1]
+        elif self.timestep_spacing == "trailing":
+            timesteps = np.round(np.arange(n, 0, -n / num_inference_steps)) - 1
+        else:
+            step_ratio = n // num_inference_steps
+            timesteps = (np.arange(0, num_inference_steps) * step_ratio).round()[::-1] + self.steps_offset
+        sigmas = ((1 - self.alphas_cumprod) / self.alphas_cumprod) ** 0.5
+        sigmas = np.interp(timesteps, np.arange(0, len(sigmas)), sigmas)
+        self.timesteps = timesteps.astype(np.float64)
+        self.sigmas = np.append(sigmas, 0.0)
+
+    @property
+    def init_noise_sigma(self):
+        max_sigma = float(self.sigmas.max())
+        if self.timestep_spacing in ("linspace", "trailing"):
+            return max_sigma
+        return (max_sigma ** 2 + 1) ** 0.5
+
+    def scale_model_input(self, sample, step_index):
+        return sample / ((self.sigmas[step_index] ** 2 + 1) ** 0.5)
+
+    def input_scale(self, step_index):
+        """Factor scale_model_input applies, for callers scaling into their own buffers"""
+        return float(1.0 / ((self.sigmas[step_index] ** 2 + 1) ** 0.5))
+
+    def step(self, noise_pred, step_index, sample):
+        """Euler update: x_{i+1} = x_i + eps * (sigma_{i+1} - sigma_i)"""
+        dt = self.sigmas[step_index + 1] - self.sigmas[step_index]
+        return (sample + noise_pred * dt).astype(sample.dtype)
+
+    def add_noise(self, original, noise, step_index):
+        """Noise clean latents to the level of step_index: x = x_0 + eps * sigma"""
+        return (original + noise * self.sigmas[step_index]).astype(original.dtype)
+
+    def step_in_place(self, noise_pred, step_index, sample):
+        """Euler update written into sample; noise_pred is used as scratch space"""
+        noise_pred *= float(self.sigmas[step_index + 1] - self.sigmas[step_index])
+        sample += noise_pred
+        return sample
+
+
+def create_session(model_path, sess_options=None, providers=None):
+    if sess_options is None:
+        # Settings from autotune_sessions.py when the model directory has been tuned
+        sess_options = tuned_session_options(model_path)
+    if sess_options is None:
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(model_path, sess_options, providers=providers or ["CPUExecutionProvider"])
+
+
+def load_clip_tokenizer(tokenizer_dir=DEFAULT_TOKENIZER_DIR):
+    """Return a callable mapping prompts to padded CLIP token ids"""
+    # Imported lazily: only needed when prompts are given as text
+    from transformers import CLIPTokenizer
+
+    tokenizer = CLIPTokenizer(
+        os.path.join(tokenizer_dir, "vocab.json"),
+        os.path.join(tokenizer_dir, "merges.txt"),
+    )
+
+    def tokenize(prompts):
+        return tokenizer(
+            list(prompts),
+            padding="max_length",
+            max_length=MAX_TOKEN_LENGTH,
+            truncation=True,
+            return_tensors="np",
+        ).input_ids.astype(np.int64)
+
+    return tokenize
+
+
+def _onnx_dtype(node_arg):
+    return {
+        "tensor(int64)": np.int64,
+        "tensor(int32)": np.int32,
+        "tensor(float16)": np.float16,
+        "tensor(double)": np.float64,
+    }.get(node_arg.type, np.float32)
+
+
+def timestep_input(node_arg, timestep, batch_size):
+    """Build the timestep tensor in the dtype and shape the UNet was exported with"""
+    dtype = _onnx_dtype(node_arg)
+    if node_arg.shape and node_arg.shape[0] == 1:
+        return np.array([timestep], dtype=dtype)
+    return np.full((batch_size,), timestep, dtype=dtype)
+
+
+def postprocess(decoded):
+    """Convert VAE output in [-1, 1] (NCHW) to uint8 NHWC images"""
+    images = np.clip(decoded / 2 + 0.5, 0.0, 1.0)
+    return (images.transpose(0, 2, 3, 1) * 255).round().astype(np.uint8)
+
+
+def preprocess(images):
+    """Convert uint8 NHWC (or HWC) images to NCHW float32 in [-1, 1]"""
+    images = np.asarray(images)
+    if images.ndim == 3:
+        images = images[None]
+    return (images.transpose(0, 3, 1, 2).astype(np.float32) / 127.5 - 1.0).astype(np.float32)
+
+
+def strength_start_step(num_inference_steps, strength):
+    """First scheduler step to run when only strength * steps steps are denoised"""
+    init_steps = min(int(num_inference_steps * strength), num_inference_steps)
+    return num_inference_steps - init_steps
+
+
+def latent_mask(mask):
+    """
+    Downsample an image-sized mask (white = repaint) to latent resolution.
+
+    Args:
+        mask: uint8 or float array of shape (H, W) or (B, H, W)
+    Returns:
+        float32 mask of shape (B, 1, H / 8, W / 8) in [0, 1], averaged per 8x8 cell
+    """
+    mask = np.asarray(mask, dtype=np.float32)
+    if mask.max() > 1.0:
+        mask = mask / 255.0
+    if mask.ndim == 2:
+        mask = mask[None]
+    batch, height, width = mask.shape
+    cells = mask.reshape(batch, height // VAE_SCALE_FACTOR, VAE_SCALE_FACTOR,
+                         width // VAE_SCALE_FACTOR, VAE_SCALE_FACTOR)
+    return cells.mean(axis=(2, 4))[:, None].astype(np.float32)
+
+
+def mask_bounding_box(mask, context=INPAINT_CONTEXT, tile=INPAINT_TILE):
+    """
+    Tile-aligned latent bounding box of the masked area grown by context.
+
+    Returns (top, bottom, left, right), or None when nothing is masked.
+    """
+    height, width = mask.shape[-2:]
+    masked = mask > 0
+    rows = np.flatnonzero(masked.any(axis=-1).reshape(-1, height).any(axis=0))
+    cols = np.flatnonzero(masked.any(axis=-2).reshape(-1, width).any(axis=0))
+    if rows.size == 0:
+        return None
+
+    def span(first, last, size):
+        start = max(0, (int(first) - context) // tile * tile)
+        stop = min(size, -(-(int(last) + 1 + context) // tile) * tile)
+        return start, stop
+
+    top, bottom = span(rows[0], rows[-1], height)
+    left, right = span(cols[0], cols[-1], width)
+    return top, bottom, left, right
+
+
+class ReferencePipeline:
+    def __init__(self, model_dir, sess_options=None, providers=None, tokenizer=None, deep_cache=False,
+                 session_manager=None):
+        """
+        Load the exported models from model_dir.
+
+        Args:
+            model_dir: Directory with text_encoder.onnx, unet.onnx and vae_decoder.onnx
+            sess_options: Optional onnxruntime SessionOptions shared by all sessions
+            providers: Execution providers (default: CPU)
+            tokenizer: Optional callable mapping a list of prompts to token ids
+            deep_cache: Also load unet_deepcache.onnx and unet_shallow.onnx
+            session_manager: Optional SessionManager providing warm, shared sessions
+        """
+        self.model_dir = model_dir
+        self.sess_options = sess_options
+        self.providers = providers
+        self.session_manager = session_manager
+        self._tokenizer = tokenizer
+
+        self.text_encoder = self._load("text_encoder")
+        self.unet = self._load("unet")
+        self.vae_decoder = self._load("vae_decoder")
+        self.unet_deepcache = self._load("unet_deepcache") if deep_cache else None
+        self.unet_shallow = self._load("unet_shallow") if deep_cache else None
+        self._vae_encoder = None
+        self.postprocessor = Postprocessor()
+
+        scheduler_config = os.path.join(model_dir, "scheduler_config.json")
+        if os.path.exists(scheduler_config):
+            self.scheduler = EulerDiscreteScheduler.from_config(scheduler_config)
+        else:
+            self.scheduler = EulerDiscreteScheduler()
+
+    def _load(self, component):
+        model_path = os.path.join(self.model_dir, COMPONENT_FILES[component])
+        if self.session_manager is not None:
+            return self.session_manager.get((os.path.abspath(self.model_dir), component), model_path)
+        return create_session(model_path, self.sess_options, self.providers)
+
+    @property
+    def vae_encoder(self):
+        # Only img2img and inpainting need the encoder, so it is loaded on first use
+        if self._vae_encoder is None:
+            self._vae_encoder = self._load("vae_encoder")
+        return self._vae_encoder
+
+    def tokenize(self, prompts):
+        if self._tokenizer is None:
+            self._tokenizer = load_clip_tokenizer()
+        return self._tokenizer(prompts)
+
+    def encode_prompt(self, prompts, negative_prompts):
+        """Encode unconditional and conditional prompts into one [2B, seq, dim] batch"""
+        input_ids = self.tokenize(list(negative_prompts) + list(prompts))
+        feed = {}
+        for node_arg in self.text_encoder.get_inputs():
+            if "mask" in node_arg.name:
+                feed[node_arg.name] = np.ones_like(input_ids, dtype=_onnx_dtype(node_arg))
+            else:
+                feed[node_arg.name] = input_ids.astype(_onnx_dtype(node_arg))
+        return self.text_encoder.run(None, feed)[0].astype(np.float32)
+
+    def prepare_latents(self, batch_size, height, width, seed):
+        """Initial noise from one seed, or from one seed per sample when seed is a list"""
+        shape = (LATENT_CHANNELS, height // VAE_SCALE_FACTOR, width // VAE_SCALE_FACTOR)
+        if np.ndim(seed) > 0:
+            return seeded_latents(seed, shape)
+        return seeded_latents([seed], (batch_size,) + shape)[0]
+
+    def _unet_feed(self, session, latent_input, timestep, text_embeddings, deep_features=None):
+        inputs = session.get_inputs()
+        feed = {
+            inputs[0].name: latent_input,
+            inputs[1].name: timestep_input(inputs[1], timestep, latent_input.shape[0]),
+            inputs[2].name: text_embeddings,
+        }
+        if deep_features is not None:
+            feed[inputs[3].name] = deep_features
+        return feed
+
+    def predict_noise(self, latents, step_index, text_embeddings, guidance_scale,
+                      session=None, deep_features=None):
+        """
+        Run one classifier-free guided UNet call.
+
+        Returns the guided noise prediction and, for the DeepCache full graph,
+        the deep features to reuse on the following steps.
+        """
+        session = session or self.unet
+        latent_input = np.concatenate([latents, latents])
+        latent_input = self.scheduler.scale_model_input(latent_input, step_index).astype(np.float32)
+        timestep = self.scheduler.timesteps[step_index]
+        outputs = session.run(None, self._unet_feed(session, latent_input, timestep, text_embeddings, deep_features))
+        noise_uncond, noise_text = np.split(outputs[0], 2)
+        if np.ndim(guidance_scale) > 0:
+            # One guidance weight per sample when batching unrelated requests
+            guidance_scale = np.asarray(guidance_scale, dtype=np.float32).reshape(-1, 1, 1, 1)
+        noise_pred = noise_uncond + guidance_scale * (noise_text - noise_uncond)
+        return noise_pred, (outputs[1] if len(outputs) > 1 else None)
+
+    def denoise(self, latents, text_embeddings, num_inference_steps, guidance_scale,
+                deep_cache_interval=0, callback=None, io_binding=False, start_step=None):
+        """
+        Run the scheduler loop.
+
+        Args:
+            latents: Initial noise (unscaled), or latents already noised to
+                start_step with scheduler.add_noise when start_step is given
+            text_embeddings: Output of encode_prompt
+            num_inference_steps: Number of scheduler steps
+            guidance_scale: Classifier-free guidance weight, or one weight per sample
+            deep_cache_interval: Run the full UNet every N steps and the shallow
+                graph in between; 0 or 1 always runs the full UNet
+            callback: Optional callable(step_index, latents)
+            io_binding: Run the allocation-free IO binding loop (see denoise_bound)
+            start_step: First step to run (img2img); None starts from pure noise
+        """
+        if io_binding:
+            if deep_cache_interval > 1:
+                raise ValueError("IO binding is not supported together with DeepCache")
+            return self.denoise_bound(latents, text_embeddings, num_inference_steps, guidance_scale, callback,
+                                      start_step)
+        if deep_cache_interval > 1 and self.unet_shallow is None:
+            raise ValueError("DeepCache requires the pipeline to be created with deep_cache=True")
+        self.scheduler.set_timesteps(num_inference_steps)
+        if start_step is None:
+            latents = (latents * self.scheduler.init_noise_sigma).astype(np.float32)
+        first_step = start_step or 0
+        deep_features = None
+        for step_index in range(first_step, num_inference_steps):
+            if deep_cache_interval <= 1:
+                noise_pred, _ = self.predict_noise(latents, step_index, text_embeddings, guidance_scale)
+            elif (step_index - first_step) % deep_cache_interval == 0:
+                noise_pred, deep_features = self.predict_noise(
+                    latents, step_index, text_embeddings, guidance_scale, session=self.unet_deepcache
+                )
+            else:
+                noise_pred, _ = self.predict_noise(
+                    latents, step_index, text_embeddings, guidance_scale,
+                    session=self.unet_shallow, deep_features=deep_features
+                )
+            latents = self.scheduler.step(noise_pred, step_index, latents)
+            if callback is not None:
+                callback(step_index, latents)
+        return latents
+
+    def denoise_bound(self, latents, text_embeddings, num_inference_steps, guidance_scale, callback=None,
+                      start_step=None):
+        """
+        Scheduler loop over preallocated buffers bound to the UNet with IO binding.
+
+        The latents, the doubled UNet input, the timestep, the text embeddings
+        and the UNet output are allocated once per generation and bound by
+        address, so ORT reads and writes them in place. Guidance and scheduler
+        updates use out= arithmetic on the same buffers, leaving no NumPy or
+        ORT output allocations inside the step loop.
+        """
+        scheduler = self.scheduler
+        scheduler.set_timesteps(num_inference_steps)
+        session = self.unet
+        inputs = session.get_inputs()
+        batch_size = latents.shape[0]
+
+        if start_step is None:
+            latents = latents * scheduler.init_noise_sigma
+        # Always a private copy: the loop updates sample in place
+        sample = np.array(latents, dtype=np.float32, order="C")
+        latent_input = np.empty((2 * batch_size,) + sample.shape[1:], dtype=np.float32)
+        noise_pred = np.empty_like(latent_input)
+        guided = np.empty_like(sample)
+        timestep = timestep_input(inputs[1], scheduler.timesteps[0], 2 * batch_size)
+        embeddings = np.ascontiguousarray(text_embeddings, dtype=np.float32)
+        if np.ndim(guidance_scale) > 0:
+            guidance_scale = np.asarray(guidance_scale, dtype=np.float32).reshape(-1, 1, 1, 1)
+
+        binding = session.io_binding()
+        for node_arg, array in ((inputs[0], latent_input), (inputs[1], timestep), (inputs[2], embeddings)):
+            binding.bind_input(node_arg.name, "cpu", 0, array.dtype.type, array.shape, array.ctypes.data)
+        binding.bind_output(session.get_outputs()[0].name, "cpu", 0, np.float32,
+                            noise_pred.shape, noise_pred.ctypes.data)
+
+        input_uncond, input_text = latent_input[:batch_size], latent_input[batch_size:]
+        noise_uncond, noise_text = noise_pred[:batch_size], noise_pred[batch_size:]
+        for step_index in range(start_step or 0, num_inference_steps):
+            np.multiply(sample, scheduler.input_scale(step_index), out=input_uncond)
+            np.copyto(input_text, input_uncond)
+            timestep[...] = scheduler.timesteps[step_index]
+            session.run_with_iobinding(binding)
+            np.subtract(noise_text, noise_uncond, out=guided)
+            np.multiply(guided, guidance_scale, out=guided)
+            np.add(guided, noise_uncond, out=guided)
+            scheduler.step_in_place(guided, step_index, sample)
+            if callback is not None:
+                callback(step_index, sample)
+        return sample
+
+    def denoise_image(self, init_latents, text_embeddings, num_inference_steps, guidance_scale,
+                      strength, seed=0, io_binding=False):
+        """img2img: noise init_latents to the strength level and run only the remaining steps"""
+        start_step = strength_start_step(num_inference_steps, strength)
+        self.scheduler.set_timesteps(num_inference_steps)
+        noise = self.prepare_latents(init_latents.shape[0], init_latents.shape[2] * VAE_SCALE_FACTOR,
+                                     init_latents.shape[3] * VAE_SCALE_FACTOR, seed)
+        latents = self.scheduler.add_noise(init_latents, noise, start_step)
+        return self.denoise(latents, text_embeddings, num_inference_steps, guidance_scale,
+                            io_binding=io_binding, start_step=start_step)
+
+    def denoise_inpaint(self, init_latents, mask, text_embeddings, num_inference_steps, guidance_scale,
+                        strength=1.0, seed=0, crop_to_mask=True, context=INPAINT_CONTEXT):
+        """
+        Inpaint the masked latents, keeping the rest of init_latents.
+
+        After every step the unmasked latents are replaced by init_latents
+        noised to the next step's level. With crop_to_mask the loop only runs
+        on the tile-aligned bounding box of the mask grown by context latent
+        pixels; everything outside it ends up as init_latents either way.
+
+        Args:
+            init_latents: Encoded input image latents
+            mask: Latent mask from latent_mask() (1 = repaint)
+            text_embeddings: Output of encode_prompt
+            num_inference_steps: Number of scheduler steps
+            guidance_scale: Classifier-free guidance weight
+            strength: Fraction of the schedule to run
+            seed: Seed for the noise
+            crop_to_mask: Run the UNet on the mask's bounding tiles only
+            context: Unmasked latent pixels kept around the mask when cropping
+        """
+        scheduler = self.scheduler
+        start_step = strength_start_step(num_inference_steps, strength)
+        scheduler.set_timesteps(num_inference_steps)
+        batch_size, _, height, width = init_latents.shape
+        noise = self.prepare_latents(batch_size, height * VAE_SCALE_FACTOR, width * VAE_SCALE_FACTOR, seed)
+        mask = np.broadcast_to(mask, (batch_size, 1, height, width)).astype(np.float32)
+
+        box = mask_bounding_box(mask, context) if crop_to_mask else (0, height, 0, width)
+        if box is None:
+            return init_latents.copy()
+        top, bottom, left, right = box
+        region = (slice(None), slice(None), slice(top, bottom), slice(left, right))
+        known, noise, mask = init_latents[region], noise[region], mask[region]
+
+        latents = scheduler.add_noise(known, noise, start_step)
+        for step_index in range(start_step, num_inference_steps):
+            noise_pred, _ = self.predict_noise(latents, step_index, text_embeddings, guidance_scale)
+            latents = scheduler.step(noise_pred, step_index, latents)
+            latents = mask * latents + (1.0 - mask) * scheduler.add_noise(known, noise, step_index + 1)
+
+        result = init_latents.copy()
+        result[region] = latents
+        return result
+
+    def encode_image(self, images):
+        """Encode uint8 NHWC images into latents (the exported encoder applies the scaling factor)"""
+        sample = preprocess(images)
+        return self.vae_encoder.run(None, {self.vae_encoder.get_inputs()[0].name: sample})[0].astype(np.float32)
+
+    def decode(self, latents, out=None):
+        """
+        Decode latents to contiguous uint8 NHWC images.
+
+        Args:
+            latents: Denoised latents
+            out: Optional uint8 (batch, height, width, 3) array to write into;
+                by default a new array the caller owns
+        """
+        # The exported VAE decoder applies the 1 / scaling_factor itself
+        decoded = self.vae_decoder.run(None, {self.vae_decoder.get_inputs()[0].name: latents})[0]
+        if out is None:
+            batch, channels, height, width = decoded.shape
+            out = np.empty((batch, height, width, channels), dtype=np.uint8)
+        return self.postprocessor(decoded, out)
+
+    def _encode_prompts(self, prompt, negative_prompt):
+        prompts = [prompt] if isinstance(prompt, str) else list(prompt)
+        if isinstance(negative_prompt, str):
+            negative_prompts = [negative_prompt] * len(prompts)
+        else:
+            negative_prompts = list(negative_prompt)
+        return len(prompts), self.encode_prompt(prompts, negative_prompts)
+
+    def _encode_batch(self, image, batch_size):
+        init_latents = self.encode_image(image)
+        if init_latents.shape[0] != batch_size:
+            init_latents = np.repeat(init_latents, batch_size, axis=0)
+        return init_latents
+
+    def generate(self, prompt, negative_prompt="", num_inference_steps=20, guidance_scale=7.0,
+                 height=512, width=512, seed=0, deep_cache_interval=0, io_binding=False):
+        """Generate uint8 NHWC images for one prompt or a list of prompts"""
+        batch_size, text_embeddings = self._encode_prompts(prompt, negative_prompt)
+        latents = self.prepare_latents(batch_size, height, width, seed)
+        latents = self.denoise(latents, text_embeddings, num_inference_steps, guidance_scale,
+                               deep_cache_interval, io_binding=io_binding)
+        return self.decode(latents)
+
+    def image_to_image(self, prompt, image, strength=0.8, negative_prompt="", num_inference_steps=20,
+                       guidance_scale=7.0, seed=0, io_binding=False):
+        """Redraw uint8 image(s) guided by the prompt; only strength * steps steps run"""
+        batch_size, text_embeddings = self._encode_prompts(prompt, negative_prompt)
+        init_latents = self._encode_batch(image, batch_size)
+        latents = self.denoise_image(init_latents, text_embeddings, num_inference_steps, guidance_scale,
+                                     strength, seed, io_binding)
+        return self.decode(latents)
+
+    def inpaint(self, prompt, image, mask, strength=1.0, negative_prompt="", num_inference_steps=20,
+                guidance_scale=7.0, seed=0, crop_to_mask=True, context=INPAINT_CONTEXT):
+        """Repaint the white area of mask in uint8 image(s)"""
+        batch_size, text_embeddings = self._encode_prompts(prompt, negative_prompt)
+        init_latents = self._encode_batch(image, batch_size)
+        latents = self.denoise_inpaint(init_latents, latent_mask(mask), text_embeddings, num_inference_steps,
+                                       guidance_scale, strength, seed, crop_to_mask, context)
+        return self.decode(latents)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate an image with the exported ONNX models")
+    parser.add_argument("model_dir", help="Directory with the exported models")
+    parser.add_argument("prompt", help="Text prompt")
+    parser.add_argument("--negative-prompt", default="", help="Negative prompt")
+    parser.add_argument("--steps", type=int, default=20, help="Number of inference steps")
+    parser.add_argument("--guidance-scale", type=float, default=7.0, help="Guidance scale")
+    parser.add_argument("--height", type=int, default=512, help="Image height")
+    parser.add_argument("--width", type=int, default=512, help="Image width")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the initial latents")
+    parser.add_argument("--deep-cache-interval", type=int, default=0,
+                        help="Run the full UNet every N steps (requires DeepCache exports)")
+    parser.add_argument("--io-binding", action="store_true",
+                        help="Run the UNet loop over preallocated IO-bound buffers")
+    parser.add_argument("--init-image", default=None, help="Input image for img2img or inpainting")
+    parser.add_argument("--mask", default=None, help="Inpainting mask (white = repaint)")
+    parser.add_argument("--strength", type=float, default=None,
+                        help="Fraction of the schedule to run on the input image (default: 0.8, inpaint 1.0)")
+    parser.add_argument("--output", default="output.png", help="Output image path")
+    args = parser.parse_args()
+
+    # Imported lazily: only needed for image files
+    from PIL import Image
+
+    pipeline = ReferencePipeline(args.model_dir, deep_cache=args.deep_cache_interval > 1)
+    common = dict(
+        negative_prompt=args.negative_prompt,
+        num_inference_steps=args.steps,
+        guidance_scale=args.guidance_scale,
+        seed=args.seed,
+    )
+    start_time = time.time()
+    if args.init_image:
+        size = (args.width, args.height)
+        image = np.asarray(Image.open(args.init_image).convert("RGB").resize(size))
+        if args.mask:
+            mask = np.asarray(Image.open(args.mask).convert("L").resize(size))
+            strength = 1.0 if args.strength is None else args.strength
+            images = pipeline.inpaint(args.prompt, image, mask, strength, **common)
+        else:
+            strength = 0.8 if args.strength is None else args.strength
+            images = pipeline.image_to_image(args.prompt, image, strength, io_binding=args.io_binding, **common)
+    else:
+        images = pipeline.generate(
+            args.prompt,
+            height=args.height,
+            width=args.width,
+            deep_cache_interval=args.deep_cache_interval,
+            io_binding=args.io_binding,
+            **common,
+        )
+    print(f"Generated image in {time.time() - start_time:.2f}s")
+
+    Image.fromarray(images[0]).save(args.output)
+    print(f"Saved image to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
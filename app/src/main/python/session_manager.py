@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""Warm InferenceSession pool with LRU eviction under a memory budget.
+
+Creating a session (graph load, optimization, kernel setup) costs far more
+than running it, so sessions for text_encoder/unet/vae are kept resident and
+shared. All sessions use one process-wide ONNX Runtime thread pool instead of
+a pool per session. When loading another model variant would exceed the
+memory budget, the least recently used sessions are evicted first.
+"""
+
+import argparse
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import onnxruntime as ort
+import psutil
+
+from memory_profiler import format_bytes
+from ort_profile import tuned_session_options
+from validate_models import create_seeded_inputs
+
+_global_threads_lock = threading.Lock()
+_global_threads_configured = False
+
+
+def configure_global_thread_pool(intra_op_threads=0, inter_op_threads=0):
+    """
+    Create the process-wide thread pools shared by every session.
+
+    Must run before the first session is created; returns False when the
+    pools can no longer be configured and sessions fall back to their own.
+    """
+    global _global_threads_configured
+    with _global_threads_lock:
+        if _global_threads_configured:
+            return True
+        try:
+            from onnxruntime.capi import _pybind_state
+            _pybind_state.set_global_thread_pool_sizes(intra_op_threads, inter_op_threads)
+        except Exception as e:
+            if "already been created" not in str(e):
+                print(f"Warning: shared thread pool unavailable ({str(e)})")
+                return False
+        _global_threads_configured = True
+        return True
+
+
+def _model_size(model_path):
+    """Size of the model including external data files next to it"""
+    size = os.path.getsize(model_path)
+    data_path = model_path + ".data"
+    if os.path.exists(data_path):
+        size += os.path.getsize(data_path)
+    return size
+
+
+class _Entry:
+    def __init__(self, session, memory, load_time, warmup_time):
+        self.session = session
+        self.memory = memory
+        self.load_time = load_time
+        self.warmup_time = warmup_time
+
+
+class SessionManager:
+    def __init__(self, memory_budget_mb=4096, intra_op_threads=0, inter_op_threads=0,
+                 graph_optimization_level=ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+                 providers=None, warmup=True):
+        """
+        Args:
+            memory_budget_mb: Total memory resident sessions may use
+            intra_op_threads: Size of the shared intra-op pool (0 = ORT default)
+            inter_op_threads: Size of the shared inter-op pool (0 = ORT default)
+            graph_optimization_level: Optimization level for every session
+            providers: Execution providers (default: CPU)
+            warmup: Run a dummy inference after loading each session
+        """
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.graph_optimization_level = graph_optimization_level
+        self.providers = providers or ["CPUExecutionProvider"]
+        self.warmup = warmup
+        self.shared_threads = configure_global_thread_pool(intra_op_threads, inter_op_threads)
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self._sessions = OrderedDict()
+        self._oversized = set()
+        self._lock = threading.RLock()
+        self._process = psutil.Process(os.getpid())
+        self.stats = {
+            "cold_loads": 0,
+            "warm_hits": 0,
+            "evictions": 0,
+            "cold_time": 0.0,
+            "warm_time": 0.0,
+        }
+
+    @property
+    def memory_used(self):
+        return sum(entry.memory for entry in self._sessions.values())
+
+    def _session_options(self, model_path):
+        # A tuned profile carries its own thread settings, so it gets per-session pools
+        sess_options = tuned_session_options(model_path)
+        if sess_options is not None:
+            return sess_options
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = self.graph_optimization_level
+        sess_options.enable_mem_pattern = True
+        sess_options.enable_mem_reuse = True
+        if self.shared_threads:
+            sess_options.use_per_session_threads = False
+        else:
+            sess_options.intra_op_num_threads = self.intra_op_threads
+            sess_options.inter_op_num_threads = self.inter_op_threads
+        return sess_options
+
+    def _evict_until(self, required, keep=None):
+        """Evict least recently used sessions, never keep, until required more bytes fit"""
+        while len(self._sessions) > (keep in self._sessions) and self.memory_used + required > self.memory_budget:
+            key = next(key for key in self._sessions if key != keep)
+            entry = self._sessions.pop(key)
+            print(f"Evicting {key} ({format_bytes(entry.memory)})")
+            del entry
+            self.stats["evictions"] += 1
+        gc.collect()
+
+    def get(self, key, model_path):
+        """
+        Return a warm session for key, loading model_path on a miss.
+
+        Args:
+            key: Cache key, e.g. ('sd35_medium_optimized', 'unet')
+            model_path: ONNX model to load when the key is not resident
+        """
+        start_time = time.perf_counter()
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is not None:
+                self._sessions.move_to_end(key)
+                self.stats["warm_hits"] += 1
+                self.stats["warm_time"] += time.perf_counter() - start_time
+                return entry.session
+
+            self._evict_until(_model_size(model_path))
+            rss_before = self._process.memory_info().rss
+            session = ort.InferenceSession(model_path, self._session_options(model_path), providers=self.providers)
+            load_time = time.perf_counter() - start_time
+            warmup_time = 0.0
+            if self.warmup:
+                warmup_start = time.perf_counter()
+                session.run(None, create_seeded_inputs(session))
+                warmup_time = time.perf_counter() - warmup_start
+            # Fall back to the file size when the allocator reuses freed memory
+            memory = max(self._process.memory_info().rss - rss_before, _model_size(model_path))
+            self._sessions[key] = _Entry(session, memory, load_time, warmup_time)
+            # The session just loaded stays resident even when it alone exceeds
+            # the budget; evicting it would turn every call into a cold load
+            self._evict_until(0, keep=key)
+            if memory > self.memory_budget and key not in self._oversized:
+                self._oversized.add(key)
+                print(f"Warning: {key} needs {format_bytes(memory)}, more than the "
+                      f"{format_bytes(self.memory_budget)} budget; keeping it resident")
+
+            self.stats["cold_loads"] += 1
+            self.stats["cold_time"] += time.perf_counter() - start_time
+            return session
+
+    def prewarm(self, models):
+        """Load and warm up a mapping of key -> model path at startup"""
+        for key, model_path in models.items():
+            self.get(key, model_path)
+
+    def release(self, key):
+        with self._lock:
+            if self._sessions.pop(key, None) is not None:
+                gc.collect()
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            gc.collect()
+
+    def timing_report(self):
+        """Cold load and warm hit counts with average latencies in milliseconds"""
+        stats = self.stats
+        return {
+            "cold_loads": stats["cold_loads"],
+            "cold_ms": 1000 * stats["cold_time"] / max(stats["cold_loads"], 1),
+            "warm_hits": stats["warm_hits"],
+            "warm_ms": 1000 * stats["warm_time"] / max(stats["warm_hits"], 1),
+            "evictions": stats["evictions"],
+            "resident": {
+                str(key): {
+                    "memory": format_bytes(entry.memory),
+                    "load_ms": 1000 * entry.load_time,
+                    "warmup_ms": 1000 * entry.warmup_time,
+                }
+                for key, entry in self._sessions.items()
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold and warm session acquisition")
+    parser.add_argument("model_dirs", nargs="+", help="Model variant directories to cycle through")
+    parser.add_argument("--budget-mb", type=int, default=4096, help="Memory budget for sessions")
+    parser.add_argument("--rounds", type=int, default=3, help="Passes over all variants")
+    parser.add_argument("--threads", type=int, default=0, help="Shared intra-op threads")
+    args = parser.parse_args()
+
+    components = ["text_encoder.onnx", "unet.onnx", "vae_decoder.onnx"]
+    manager = SessionManager(args.budget_mb, intra_op_threads=args.threads)
+    for _ in range(args.rounds):
+        for model_dir in args.model_dirs:
+            for component in components:
+                manager.get((os.path.basename(os.path.normpath(model_dir)), component),
+                            os.path.join(model_dir, component))
+
+    report = manager.timing_report()
+    print(f"Cold loads: {report['cold_loads']} (avg {report['cold_ms']:.1f}ms)")
+    print(f"Warm hits: {report['warm_hits']} (avg {report['warm_ms']:.3f}ms)")
+    print(f"Evictions: {report['evictions']}")
+    print(f"Resident memory: {format_bytes(manager.memory_used)} of {format_bytes(manager.memory_budget)}")
+
+
+if __name__ == "__main__":
+    main()
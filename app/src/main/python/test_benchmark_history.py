@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Tests for benchmark_history metric directions and regressions (run with pytest)"""
+
+import pytest
+
+from benchmark_history import detect_regressions, higher_is_better
+
+# Every metric name recorded by the benchmarks, the autotuner, the model
+# smoke test and model_delta.py, with whether higher values are better
+EMITTED_METRICS = {
+    # benchmark_attention_fusion.py
+    "step_memory_bytes": False,
+    # benchmark_deepcache.py
+    "latency_s": False,
+    "step_s": False,
+    "latent_cosine": True,
+    "psnr": True,
+    "ssim": True,
+    # benchmark_img2img.py
+    "full_latency_s": False,
+    "cropped_latency_s": False,
+    # benchmark_io_binding.py, benchmark_attention_fusion.py, benchmark_schedulers.py
+    "step_ms": False,
+    "step_python_alloc_bytes": False,
+    "step_rss_growth_bytes": False,
+    # benchmark_postprocess.py
+    "reference_images_per_sec": True,
+    "fused_images_per_sec": True,
+    "sequential_images_per_sec": True,
+    "pooled_images_per_sec": True,
+    "speedup": True,
+    # benchmark_server.py
+    "images_per_sec": True,
+    "mean_latency_s": False,
+    "p95_latency_s": False,
+    # benchmark_token_merging.py
+    "original_ms": False,
+    "merged_ms": False,
+    "cosine": True,
+    # benchmark_download.py
+    "throughput_mb_s": True,
+    # autotune_sessions.py
+    "latency_ms": False,
+    "default_latency_ms": False,
+    # test_optimized_models.py
+    "size_bytes": False,
+    "session_load_ms": False,
+    "inference_ms": False,
+    "rss_bytes": False,
+    # model_delta.py
+    "patch_size": False,
+    "full_size": False,
+    "ratio": False,
+    "reused_bytes": True,
+    "time": False,
+}
+
+
+@pytest.mark.parametrize("metric,expected", sorted(EMITTED_METRICS.items()))
+def test_metric_direction(metric, expected):
+    assert higher_is_better(metric) == expected
+
+
+def _points(values):
+    return [{"value": value} for value in values]
+
+
+def test_drop_in_higher_is_better_metric_regresses():
+    points = detect_regressions(_points([100, 101, 99, 100, 80]), "reused_bytes")
+    assert points[-1]["regression"]
+    assert not detect_regressions(_points([100, 101, 99, 100, 120]), "reused_bytes")[-1]["regression"]
+
+
+def test_rise_in_lower_is_better_metric_regresses():
+    points = detect_regressions(_points([100, 101, 99, 100, 120]), "step_ms")
+    assert points[-1]["regression"]
+    assert not detect_regressions(_points([100, 101, 99, 100, 80]), "step_ms")[-1]["regression"]
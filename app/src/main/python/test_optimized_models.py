@@ -1,18 +1,53 @@
 #!/usr/bin/env python3
 import os
-import onnx
-import onnxruntime as ort
+import argparse
 import numpy as np
+import psutil
+from benchmark_history import add_history_argument, record_run
 from memory_profiler import profile_memory
+from session_manager import SessionManager
 import time
 
+def check_model(model_path):
+    """Run the full ONNX checker; onnx is only imported when this is requested"""
+    import onnx
+    # Checking by path also handles models with external data over 2GB
+    onnx.checker.check_model(model_path)
+
 class ModelTester:
-    def __init__(self, model_dir):
+    def __init__(self, model_dir, session_manager=None, check_models=False):
         self.model_dir = model_dir
-        self.sess_options = ort.SessionOptions()
-        self.sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
-        self.sess_options.enable_mem_pattern = True
-        self.sess_options.enable_mem_reuse = True
+        # Sessions stay warm across test methods and testers sharing a manager
+        self.sessions = session_manager or SessionManager(warmup=False)
+        # Creating the session already validates the graph; the ONNX checker is opt-in
+        self.check_models = check_models
+        # Per-component numbers for the benchmark history
+        self.results = {}
+        
+    def load_model(self, filename):
+        """Optionally check a model, then return a warm inference session for it"""
+        if self.check_models:
+            check_model(os.path.join(self.model_dir, filename))
+        return self.get_session(filename)
+        
+    def get_session(self, filename):
+        """Get a warm inference session for a model in this directory"""
+        model_path = os.path.join(self.model_dir, filename)
+        return self.sessions.get((self.model_dir, filename), model_path)
+        
+    def record(self, component, filename, inference_time):
+        """Keep size, session load time, latency and resident memory of a tested component"""
+        model_path = os.path.join(self.model_dir, filename)
+        size = os.path.getsize(model_path)
+        if os.path.exists(model_path + ".data"):
+            size += os.path.getsize(model_path + ".data")
+        resident = self.sessions.timing_report()["resident"].get(str((self.model_dir, filename)), {})
+        self.results[component] = {
+            "size_bytes": size,
+            "session_load_ms": resident.get("load_ms"),
+            "inference_ms": 1000 * inference_time,
+            "rss_bytes": psutil.Process(os.getpid()).memory_info().rss,
+        }
         
     def create_dummy_input(self, input_shape):
         """Create dummy input data for testing"""
@@ -23,12 +58,8 @@ class ModelTester:
         print("\nTesting Text Encoder...")
         model_path = os.path.join(self.model_dir, "text_encoder.onnx")
         
-        # Load and check model
-        model = onnx.load(model_path)
-        onnx.checker.check_model(model)
-        
-        # Create inference session
-        session = ort.InferenceSession(model_path, self.sess_options)
+        # Get a warm inference session (checking the model when requested)
+        session = self.load_model(os.path.basename(model_path))
         
         # Prepare dummy input
         input_ids = np.random.randint(0, 1000, size=(1, 77), dtype=np.int64)
@@ -39,6 +70,7 @@ class ModelTester:
         inference_time = time.time() - start_time
         
         print(f"Text Encoder inference time: {inference_time:.2f}s")
+        self.record("text_encoder", os.path.basename(model_path), inference_time)
         return True
     
     @profile_memory
@@ -46,12 +78,8 @@ class ModelTester:
         print("\nTesting UNet...")
         model_path = os.path.join(self.model_dir, "unet.onnx")
         
-        # Load and check model
-        model = onnx.load(model_path)
-        onnx.checker.check_model(model)
-        
-        # Create inference session
-        session = ort.InferenceSession(model_path, self.sess_options)
+        # Get a warm inference session (checking the model when requested)
+        session = self.load_model(os.path.basename(model_path))
         
         # Prepare dummy inputs
         latent_shape = (2, 4, 64, 64)  # Batch size 2 for classifier-free guidance
@@ -72,6 +100,7 @@ class ModelTester:
         inference_time = time.time() - start_time
         
         print(f"UNet inference time: {inference_time:.2f}s")
+        self.record("unet", os.path.basename(model_path), inference_time)
         return True
     
     @profile_memory
@@ -79,12 +108,8 @@ class ModelTester:
         print("\nTesting VAE Decoder...")
         model_path = os.path.join(self.model_dir, "vae_decoder.onnx")
         
-        # Load and check model
-        model = onnx.load(model_path)
-        onnx.checker.check_model(model)
-        
-        # Create inference session
-        session = ort.InferenceSession(model_path, self.sess_options)
+        # Get a warm inference session (checking the model when requested)
+        session = self.load_model(os.path.basename(model_path))
         
         # Prepare dummy input
         latent_shape = (1, 4, 64, 64)
@@ -96,12 +121,19 @@ class ModelTester:
         inference_time = time.time() - start_time
         
         print(f"VAE inference time: {inference_time:.2f}s")
+        self.record("vae_decoder", os.path.basename(model_path), inference_time)
         return True
 
 def main():
+    parser = argparse.ArgumentParser(description="Smoke test the original and optimized models")
+    parser.add_argument("--check-models", action="store_true", help="Also run the ONNX model checker")
+    add_history_argument(parser)
+    args = parser.parse_args()
+
     # Test original models
     print("Testing original models...")
-    original_tester = ModelTester("../assets/models/sd35_medium")
+    session_manager = SessionManager(warmup=False)
+    original_tester = ModelTester("../assets/models/sd35_medium", session_manager, args.check_models)
     try:
         original_tester.test_text_encoder()
         original_tester.test_unet()
@@ -111,13 +143,23 @@ def main():
     
     # Test optimized models
     print("\nTesting optimized models...")
-    optimized_tester = ModelTester("../assets/models/sd35_medium_optimized")
+    optimized_tester = ModelTester("../assets/models/sd35_medium_optimized", session_manager, args.check_models)
     try:
         optimized_tester.test_text_encoder()
         optimized_tester.test_unet()
         optimized_tester.test_vae()
     except Exception as e:
         print(f"Error testing optimized models: {str(e)}")
+    
+    report = session_manager.timing_report()
+    print(f"\nSession loads: {report['cold_loads']} cold (avg {report['cold_ms']:.1f}ms), "
+          f"{report['warm_hits']} warm (avg {report['warm_ms']:.3f}ms)")
+
+    if args.history:
+        for tester in (original_tester, optimized_tester):
+            if tester.results:
+                record_run(args.history, "model_smoke_test", tester.results,
+                           {"model_dir": tester.model_dir}, tester.model_dir)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Tests for SessionManager eviction under its memory budget (run with pytest)"""
+
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+
+from session_manager import SessionManager
+
+
+def _write_model(path, weight_count=256 * 1024):
+    """Tiny Add model whose constant weight makes the file about weight_count * 4 bytes"""
+    weight = numpy_helper.from_array(np.zeros(weight_count, np.float32), "weight")
+    graph = helper.make_graph(
+        [helper.make_node("Add", ["x", "weight"], ["y"])],
+        "add",
+        [helper.make_tensor_value_info("x", TensorProto.FLOAT, [weight_count])],
+        [helper.make_tensor_value_info("y", TensorProto.FLOAT, [weight_count])],
+        [weight],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)], ir_version=8)
+    onnx.save_model(model, str(path))
+    return str(path)
+
+
+def test_model_larger_than_budget_stays_resident(tmp_path, capsys):
+    model_path = _write_model(tmp_path / "large.onnx")
+    manager = SessionManager(memory_budget_mb=0, warmup=False)
+
+    session = manager.get("large", model_path)
+    assert manager.get("large", model_path) is session
+    assert manager.stats["cold_loads"] == 1
+    assert manager.stats["warm_hits"] == 1
+    assert manager.stats["evictions"] == 0
+    assert "more than the" in capsys.readouterr().out
+
+    # Warned once per key, not on every hit
+    manager.get("large", model_path)
+    assert "more than the" not in capsys.readouterr().out
+
+
+def test_oversized_model_evicts_the_others(tmp_path):
+    small_path = _write_model(tmp_path / "small.onnx", 16)
+    large_path = _write_model(tmp_path / "large.onnx")
+    manager = SessionManager(memory_budget_mb=0, warmup=False)
+
+    manager.get("small", small_path)
+    manager.get("large", large_path)
+    assert list(manager.timing_report()["resident"]) == ["large"]
+    assert manager.stats["evictions"] == 1
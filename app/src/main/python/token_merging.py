@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""Token merging (ToMe) rewrite for UNet self-attention.
+
+Self-attention cost is quadratic in the number of spatial tokens, so at 64x64
+latents and above it dominates the UNet step. This post-export rewrite
+inserts a bipartite soft matching merge in front of every self-attention
+block (the normed tokens feeding the q/k/v projections) and the matching
+unmerge in front of its residual add:
+
+- one token of every 2x2 spatial cell is a destination, the rest are sources
+- each source is matched to its most similar destination (cosine similarity)
+- the r most similar sources are averaged into their destinations
+- after attention, merged sources copy their destination's output back
+
+r = floor(tokens * ratio) is computed inside the graph, so the rewritten
+model keeps its dynamic height/width. Ratios are set per resolution level
+(0 = full latent resolution, 1 = after the first downsample, ...); a level
+with ratio 0 is left untouched. Levels are found by running the model once
+at a small probe size.
+"""
+
+import argparse
+import math
+import sys
+
+import numpy as np
+from onnx import TensorProto, helper
+
+from graph_rewrite import (GraphBuilder, consumers_of, default_opset, load_model, probe_tensors, save_model,
+                           topological_sort)
+
+DEFAULT_RATIOS = [0.5, 0.0, 0.0, 0.0]
+MIN_OPSET = 16  # ScatterElements reduction
+INT64_MAX = np.iinfo(np.int64).max
+
+
+def _reachable(consumers, start):
+    """Names of all tensors computed from start"""
+    seen = set()
+    stack = [start]
+    while stack:
+        for node in consumers.get(stack.pop(), []):
+            for output in node.output:
+                if output not in seen:
+                    seen.add(output)
+                    stack.append(output)
+    return seen
+
+
+def find_self_attention_blocks(graph):
+    """
+    Find self-attention blocks as exported from diffusers transformer blocks.
+
+    A block is a LayerNormalization output consumed by at least three MatMuls
+    with constant weights (q, k and v share the input; cross-attention only
+    projects q from it), and the Add that sums the attention output with the
+    LayerNormalization input.
+    """
+    initializers = {init.name for init in graph.initializer}
+    consumers = consumers_of(graph)
+    blocks = []
+    for node in graph.node:
+        if node.op_type != "LayerNormalization":
+            continue
+        normed, residual = node.output[0], node.input[0]
+        projections = [c for c in consumers[normed] if c.op_type == "MatMul" and c.input[1] in initializers]
+        if len(projections) < 3:
+            continue
+        downstream = _reachable(consumers, normed)
+        for add in consumers[residual]:
+            if add.op_type != "Add":
+                continue
+            other = add.input[1] if add.input[0] == residual else add.input[0]
+            if other in downstream:
+                blocks.append({
+                    "name": node.name or normed,
+                    "normed": normed,
+                    "attention_output": other,
+                    "residual_add": add,
+                })
+                break
+    return blocks
+
+
+def _spatial_input(graph):
+    for graph_input in graph.input:
+        if len(graph_input.type.tensor_type.shape.dim) == 4:
+            return graph_input.name
+    raise ValueError("Model has no 4D latent input")
+
+
+def probe_levels(model, blocks, probe_size=32):
+    """
+    Resolution level of each block, from its token count at probe_size latents.
+
+    Level l holds (probe_size / 2**l)**2 tokens.
+    """
+    names = [block["normed"] for block in blocks]
+    values = probe_tensors(model, names, dims={"height": probe_size, "width": probe_size})
+    tokens = [values[name].shape[1] for name in names]
+    return [round(math.log(probe_size * probe_size / count, 4)) for count in tokens]
+
+
+def insert_token_merging(graph, block, ratio, level, sample_name):
+    """Insert merge/unmerge around one self-attention block"""
+    b = GraphBuilder(graph, block["name"] + "/tome")
+    x = block["normed"]
+    consumers = [node for node in graph.node if x in node.input]
+    i0, i1, i2, i3 = (b.const(np.array([i], np.int64), "axis") for i in range(4))
+
+    shape = b.op("Shape", [x])
+    tokens = b.op("Slice", [shape, i1, i2])
+    channels = b.op("Slice", [shape, i2, i3])
+    batch_tokens = b.op("Slice", [shape, i0, i2])
+
+    # Width of this level: the latent width after `level` stride-2 downsamples
+    stride = 2 ** level
+    sample_width = b.op("Slice", [b.op("Shape", [sample_name]), i3, b.const(np.array([4], np.int64))])
+    width = b.op("Div", [b.op("Add", [sample_width, b.const(np.array([stride - 1], np.int64))]),
+                         b.const(np.array([stride], np.int64))])
+
+    # One destination per 2x2 cell, every other token is a source
+    index = b.op("Range", [b.const(np.array(0, np.int64)), b.op("Squeeze", [tokens, i0]),
+                           b.const(np.array(1, np.int64))])
+    two = b.const(np.array([2], np.int64))
+    zero = b.const(np.array([0], np.int64))
+    row_even = b.op("Equal", [b.op("Mod", [b.op("Div", [index, width]), two]), zero])
+    col_even = b.op("Equal", [b.op("Mod", [b.op("Mod", [index, width]), two]), zero])
+    is_dst = b.op("And", [row_even, col_even])
+    dst_idx = b.op("Squeeze", [b.op("NonZero", [is_dst]), i0])
+    src_idx = b.op("Squeeze", [b.op("NonZero", [b.op("Not", [is_dst])]), i0])
+    num_src = b.op("Shape", [src_idx])
+
+    src = b.op("Gather", [x, src_idx], axis=1)
+    dst = b.op("Gather", [x, dst_idx], axis=1)
+    scores = b.op("MatMul", [b.op("LpNormalization", [src], axis=-1, p=2),
+                             b.op("Transpose", [b.op("LpNormalization", [dst], axis=-1, p=2)], perm=[0, 2, 1])])
+    best_dst = b.op("ArgMax", [scores], axis=2, keepdims=1)
+    best_score = b.op("Cast", [b.op("Squeeze", [b.op("GatherElements", [scores, best_dst], axis=2), i2])],
+                      to=TensorProto.FLOAT)
+    best_dst = b.op("Squeeze", [best_dst, i2])
+
+    r = b.op("Cast", [b.op("Floor", [b.op("Mul", [b.op("Cast", [tokens], to=TensorProto.FLOAT),
+                                                  b.const(np.array([ratio], np.float32))])])],
+             to=TensorProto.INT64)
+    r = b.op("Min", [r, num_src])
+    _, order = b.op("TopK", [best_score, num_src], num_outputs=2, axis=1, largest=1, sorted=1)
+    merged_sel = b.op("Slice", [order, zero, r, i1])
+    kept_sel = b.op("Slice", [order, r, b.const(np.array([INT64_MAX], np.int64)), i1])
+    merged_target = b.op("GatherElements", [best_dst, merged_sel], axis=1)
+
+    def expand(indices):
+        return b.op("Expand", [b.op("Unsqueeze", [indices, i2]),
+                               b.op("Concat", [b.op("Shape", [indices]), channels], axis=0)])
+
+    target_expanded = expand(merged_target)
+    kept = b.op("GatherElements", [src, expand(kept_sel)], axis=1)
+    merged_src = b.op("GatherElements", [src, expand(merged_sel)], axis=1)
+
+    # Average each destination with the sources merged into it
+    summed = b.op("ScatterElements", [dst, target_expanded, merged_src], axis=1, reduction="add")
+    one = helper.make_tensor("one", TensorProto.FLOAT, [1], [1.0])
+    dst_ones = b.op("CastLike", [b.op("ConstantOfShape", [b.op("Concat", [b.op("Slice", [b.op("Shape", [dst]), i0, i2]), i1], axis=0)],
+                                      value=one), x])
+    src_ones = b.op("CastLike", [b.op("ConstantOfShape", [b.op("Concat", [b.op("Shape", [merged_target]), i1], axis=0)],
+                                      value=one), x])
+    counts = b.op("ScatterElements", [dst_ones, b.op("Unsqueeze", [merged_target, i2]), src_ones],
+                  axis=1, reduction="add")
+    merged = b.op("Concat", [kept, b.op("Div", [summed, counts])], axis=1)
+
+    # Unmerge: kept sources and destinations go back in place, merged sources
+    # take their destination's output
+    y = block["attention_output"]
+    num_kept = b.op("Sub", [num_src, r])
+    kept_out = b.op("Slice", [y, zero, num_kept, i1])
+    dst_out = b.op("Slice", [y, num_kept, b.const(np.array([INT64_MAX], np.int64)), i1])
+    merged_out = b.op("GatherElements", [dst_out, target_expanded], axis=1)
+    dst_positions = b.op("Expand", [b.op("Unsqueeze", [dst_idx, i0]),
+                                    b.op("Concat", [b.op("Slice", [batch_tokens, i0, i1]), b.op("Shape", [dst_idx])], axis=0)])
+    positions = b.op("Concat", [b.op("Gather", [src_idx, kept_sel]), dst_positions,
+                                b.op("Gather", [src_idx, merged_sel])], axis=1)
+    values = b.op("Concat", [kept_out, dst_out, merged_out], axis=1)
+    # Every position is overwritten, x only provides the shape and dtype
+    unmerged = b.op("ScatterElements", [x, expand(positions), values], axis=1)
+
+    for node in consumers:
+        for i, name in enumerate(node.input):
+            if name == x:
+                node.input[i] = merged
+    add = block["residual_add"]
+    for i, name in enumerate(add.input):
+        if name == y:
+            add.input[i] = unmerged
+
+
+def apply_token_merging(model_path, output_path, ratios=None, probe_size=32):
+    """
+    Rewrite a UNet with token merging in front of its self-attention blocks.
+
+    Args:
+        model_path: Exported UNet ONNX model
+        output_path: Path to save the rewritten model
+        ratios: Fraction of tokens merged per resolution level (index = level)
+        probe_size: Latent size used to find each block's resolution level
+    Returns:
+        List of (block name, level, ratio) for the rewritten blocks
+    """
+    ratios = list(DEFAULT_RATIOS if ratios is None else ratios)
+    model, external = load_model(model_path)
+
+    opset = default_opset(model)
+    if opset < MIN_OPSET:
+        raise ValueError(f"Token merging needs opset {MIN_OPSET} or newer, model uses {opset}")
+
+    blocks = find_self_attention_blocks(model.graph)
+    if not blocks:
+        raise ValueError("No self-attention blocks found")
+    levels = probe_levels(model, blocks, probe_size)
+
+    sample_name = _spatial_input(model.graph)
+    rewritten = []
+    for block, level in zip(blocks, levels):
+        ratio = ratios[level] if level < len(ratios) else 0.0
+        if ratio <= 0:
+            continue
+        insert_token_merging(model.graph, block, ratio, level, sample_name)
+        rewritten.append((block["name"], level, ratio))
+    topological_sort(model.graph)
+
+    save_model(model, output_path, external)
+    return rewritten
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add token merging to UNet self-attention")
+    parser.add_argument("input", help="Exported UNet ONNX model")
+    parser.add_argument("output", help="Path for the rewritten model")
+    parser.add_argument("--ratios", type=float, nargs="+", default=DEFAULT_RATIOS,
+                        help="Merge ratio per resolution level, highest resolution first")
+    parser.add_argument("--probe-size", type=int, default=32,
+                        help="Latent size of the probe run that assigns blocks to levels")
+    args = parser.parse_args()
+
+    if any(not 0 <= ratio < 1 for ratio in args.ratios):
+        print("Error: Merge ratios must be in [0, 1)")
+        sys.exit(1)
+
+    try:
+        rewritten = apply_token_merging(args.input, args.output, args.ratios, args.probe_size)
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+
+    for name, level, ratio in rewritten:
+        print(f"  level {level} ratio {ratio:.2f}: {name}")
+    print(f"Rewrote {len(rewritten)} self-attention blocks, saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""Numerical parity validation between original and optimized models.
+
+Runs the original and optimized ONNX exports side by side on a fixed, seeded
+input set and compares their outputs. Components are validated in parallel and
+each one is fed in batches. The script exits with a nonzero status when any
+component drifts past its tolerances, so it can gate more aggressive
+optimization settings.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+COMPONENT_FILES = {
+    "text_encoder": "text_encoder.onnx",
+    "unet": "unet.onnx",
+    "vae": "vae_decoder.onnx",
+}
+
+# Values used for symbolic dimensions that the exporters leave dynamic.
+DEFAULT_DIMS = {
+    "batch": 1,
+    "sequence": 77,
+    "height": 64,
+    "width": 64,
+}
+
+DEFAULT_TOLERANCES = {
+    "text_encoder": {"min_cosine": 0.99, "max_abs_error": 0.5},
+    "unet": {"min_cosine": 0.98, "max_abs_error": 1.0},
+    "vae": {"min_cosine": 0.98, "max_abs_error": 0.5, "min_psnr": 25.0, "min_ssim": 0.90},
+}
+
+VOCAB_SIZE = 49408
+NUM_TRAIN_TIMESTEPS = 1000
+
+
+def _numpy_dtype(onnx_type):
+    import numpy as np
+
+    if onnx_type == "tensor(int64)":
+        return np.int64
+    if onnx_type == "tensor(int32)":
+        return np.int32
+    if onnx_type == "tensor(float16)":
+        return np.float16
+    return np.float32
+
+
+def _resolve_shape(node_arg, batch_size, dims):
+    shape = []
+    for index, dim in enumerate(node_arg.shape):
+        if isinstance(dim, int) and dim > 0:
+            shape.append(dim)
+        elif index == 0:
+            shape.append(batch_size)
+        elif isinstance(dim, str) and dim in dims:
+            shape.append(dims[dim])
+        elif len(node_arg.shape) == 4:
+            # Latent tensors: (batch, channels, height, width)
+            shape.append(dims["height"] if index == 2 else dims["width"])
+        else:
+            shape.append(dims["sequence"])
+    return shape
+
+
+def create_seeded_inputs(session, batch_size=1, seed=0, dims=None):
+    """
+    Create a deterministic input feed for an inference session.
+
+    Args:
+        session: onnxruntime InferenceSession to build inputs for
+        batch_size: Value used for the leading (batch) dimension
+        seed: Seed for the input generator
+        dims: Optional overrides for symbolic dimensions
+    """
+    import numpy as np
+
+    resolved_dims = dict(DEFAULT_DIMS)
+    resolved_dims.update(dims or {})
+    rng = np.random.default_rng(seed)
+    feed = {}
+    for node_arg in session.get_inputs():
+        name = node_arg.name.lower()
+        dtype = _numpy_dtype(node_arg.type)
+        if "timestep" in name:
+            shape = [d if isinstance(d, int) and d > 0 else 1 for d in node_arg.shape]
+            value = rng.integers(0, NUM_TRAIN_TIMESTEPS, size=shape)
+        else:
+            shape = _resolve_shape(node_arg, batch_size, resolved_dims)
+            if "mask" in name:
+                value = np.ones(shape)
+            elif np.issubdtype(dtype, np.integer):
+                value = rng.integers(0, VOCAB_SIZE, size=shape)
+            else:
+                value = rng.standard_normal(shape)
+        feed[node_arg.name] = value.astype(dtype)
+    return feed
+
+
+def cosine_similarity(reference, candidate):
+    """Minimum per-sample cosine similarity between two batched outputs"""
+    import numpy as np
+
+    ref = reference.reshape(reference.shape[0], -1).astype(np.float64)
+    cand = candidate.reshape(candidate.shape[0], -1).astype(np.float64)
+    numerator = np.sum(ref * cand, axis=1)
+    denominator = np.linalg.norm(ref, axis=1) * np.linalg.norm(cand, axis=1)
+    similarity = np.where(denominator > 0, numerator / np.maximum(denominator, 1e-12), 1.0)
+    return float(similarity.min())
+
+
+def _to_unit_images(decoded):
+    """Map VAE output in [-1, 1] to images in [0, 1]"""
+    import numpy as np
+
+    return np.clip(decoded.astype(np.float64) / 2 + 0.5, 0.0, 1.0)
+
+
+def psnr(reference, candidate):
+    """Peak signal-to-noise ratio in dB for images in [0, 1]"""
+    import numpy as np
+
+    mse = np.mean((reference - candidate) ** 2)
+    if mse == 0:
+        return float("inf")
+    return float(10 * np.log10(1.0 / mse))
+
+
+def _box_filter(images, window):
+    """Mean over a window x window neighbourhood of the last two axes"""
+    import numpy as np
+
+    padded = np.pad(images, [(0, 0)] * (images.ndim - 2) + [(1, 0), (1, 0)])
+    integral = padded.cumsum(axis=-1).cumsum(axis=-2)
+    total = (
+        integral[..., window:, window:]
+        - integral[..., :-window, window:]
+        - integral[..., window:, :-window]
+        + integral[..., :-window, :-window]
+    )
+    return total / (window * window)
+
+
+def ssim(reference, candidate, window=7):
+    """Mean structural similarity for NCHW images in [0, 1]"""
+    import numpy as np
+
+    c1 = 0.01 ** 2
+    c2 = 0.03 ** 2
+    window = min(window, reference.shape[-1], reference.shape[-2])
+    mu_x = _box_filter(reference, window)
+    mu_y = _box_filter(candidate, window)
+    sigma_x = _box_filter(reference * reference, window) - mu_x ** 2
+    sigma_y = _box_filter(candidate * candidate, window) - mu_y ** 2
+    sigma_xy = _box_filter(reference * candidate, window) - mu_x * mu_y
+    numerator = (2 * mu_x * mu_y + c1) * (2 * sigma_xy + c2)
+    denominator = (mu_x ** 2 + mu_y ** 2 + c1) * (sigma_x + sigma_y + c2)
+    return float(np.mean(numerator / denominator))
+
+
+def compare_outputs(component, reference, candidate):
+    """Compute parity metrics for one component's primary output"""
+    import numpy as np
+
+    reference = reference.astype(np.float32)
+    candidate = candidate.astype(np.float32)
+    diff = np.abs(reference - candidate)
+    metrics = {
+        "cosine": cosine_similarity(reference, candidate),
+        "max_abs_error": float(diff.max()),
+        "mean_abs_error": float(diff.mean()),
+    }
+    if component == "vae":
+        ref_images = _to_unit_images(reference)
+        cand_images = _to_unit_images(candidate)
+        metrics["psnr"] = psnr(ref_images, cand_images)
+        metrics["ssim"] = ssim(ref_images, cand_images)
+    return metrics
+
+
+def check_tolerances(metrics, tolerances):
+    """Return a list of human readable tolerance violations"""
+    failures = []
+    for key, limit in tolerances.items():
+        # 'max_abs_error' is both a metric and an upper bound on itself
+        metric = key if key in metrics else key[4:]
+        if metric not in metrics:
+            continue
+        value = metrics[metric]
+        if key.startswith("min_") and value < limit:
+            failures.append(f"{metric}={value:.4f} < {limit}")
+        elif key.startswith("max_") and value > limit:
+            failures.append(f"{metric}={value:.4f} > {limit}")
+    return failures
+
+
+def _create_session(model_path, num_threads):
+    import onnxruntime as ort
+
+    sess_options = ort.SessionOptions()
+    sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    sess_options.intra_op_num_threads = num_threads
+    sess_options.inter_op_num_threads = 1
+    return ort.InferenceSession(model_path, sess_options, providers=["CPUExecutionProvider"])
+
+
+def validate_component(component, original_dir, optimized_dir, num_samples, batch_size,
+                       seed, tolerances, num_threads=1, dims=None):
+    """
+    Run one component's original and optimized models on the same seeded inputs.
+
+    Args:
+        component: One of 'text_encoder', 'unet' or 'vae'
+        original_dir: Directory holding the reference models
+        optimized_dir: Directory holding the optimized models
+        num_samples: Total number of samples to compare
+        batch_size: Number of samples per inference call
+        seed: Base seed; batch i uses seed + i
+        tolerances: Mapping of min_/max_ metric limits
+        num_threads: Intra-op threads for each session
+        dims: Optional overrides for symbolic dimensions
+    """
+    import numpy as np
+
+    filename = COMPONENT_FILES[component]
+    original = _create_session(os.path.join(original_dir, filename), num_threads)
+    optimized = _create_session(os.path.join(optimized_dir, filename), num_threads)
+
+    references = []
+    candidates = []
+    start_time = time.time()
+    for batch_index, offset in enumerate(range(0, num_samples, batch_size)):
+        current_batch = min(batch_size, num_samples - offset)
+        feed = create_seeded_inputs(original, current_batch, seed + batch_index, dims)
+        references.append(original.run(None, feed)[0])
+        candidates.append(optimized.run(None, feed)[0])
+    elapsed = time.time() - start_time
+
+    metrics = compare_outputs(component, np.concatenate(references), np.concatenate(candidates))
+    failures = check_tolerances(metrics, tolerances)
+    return {
+        "component": component,
+        "metrics": metrics,
+        "failures": failures,
+        "passed": not failures,
+        "time": elapsed,
+    }
+
+
+def load_tolerances(path=None):
+    """Merge tolerances from a JSON file over the built-in defaults"""
+    tolerances = {component: dict(limits) for component, limits in DEFAULT_TOLERANCES.items()}
+    if path:
+        with open(path) as f:
+            overrides = json.load(f)
+        for component, limits in overrides.items():
+            tolerances.setdefault(component, {}).update(limits)
+    return tolerances
+
+
+def validate_models(original_dir, optimized_dir, components, num_samples=8, batch_size=2,
+                    seed=0, tolerances=None, workers=None, dims=None):
+    """Validate several components in parallel and return their results"""
+    tolerances = tolerances or load_tolerances()
+    workers = workers or len(components)
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                validate_component, component, original_dir, optimized_dir, num_samples,
+                batch_size, seed, tolerances.get(component, {}), num_threads, dims
+            )
+            for component in components
+        ]
+        return [future.result() for future in futures]
+
+
+def print_report(results):
+    for result in results:
+        status = "PASS" if result["passed"] else "FAIL"
+        metrics = ", ".join(f"{key}={value:.4f}" for key, value in result["metrics"].items())
+        print(f"[{status}] {result['component']} ({result['time']:.2f}s): {metrics}")
+        for failure in result["failures"]:
+            print(f"    tolerance exceeded: {failure}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare original and optimized model outputs")
+    parser.add_argument("original_dir", help="Directory with the original ONNX models")
+    parser.add_argument("optimized_dir", help="Directory with the optimized ONNX models")
+    parser.add_argument("--components", nargs="+", choices=list(COMPONENT_FILES),
+                        default=list(COMPONENT_FILES), help="Components to validate")
+    parser.add_argument("--num-samples", type=int, default=8,
+                        help="Number of seeded samples per component")
+    parser.add_argument("--batch-size", type=int, default=2,
+                        help="Samples per inference call")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed for the input set")
+    parser.add_argument("--tolerances", help="JSON file overriding per-component tolerances")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Components validated concurrently (default: all)")
+    parser.add_argument("--report", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+
+    for directory in (args.original_dir, args.optimized_dir):
+        if not os.path.isdir(directory):
+            print(f"Error: Model directory {directory} does not exist")
+            sys.exit(1)
+
+    try:
+        results = validate_models(
+            args.original_dir,
+            args.optimized_dir,
+            args.components,
+            num_samples=args.num_samples,
+            batch_size=args.batch_size,
+            seed=args.seed,
+            tolerances=load_tolerances(args.tolerances),
+            workers=args.workers,
+        )
+    except Exception as e:
+        print(f"Error during validation: {str(e)}")
+        sys.exit(2)
+
+    print_report(results)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if not all(result["passed"] for result in results):
+        print("Validation failed: optimized outputs exceed tolerances")
+        sys.exit(1)
+    print("Validation passed")
+
+
+if __name__ == "__main__":
+    main()
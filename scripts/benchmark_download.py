@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""Throughput and resume checks for download_model.py.
+
+Serves a generated model repository from a local HTTP server that stands in
+for the Hugging Face hub (file listing API plus range-capable file endpoint,
+with a per-connection bandwidth cap). It then measures serial versus parallel
+throughput and interrupts a download part way to check that the resumed run
+only transfers the missing ranges and still verifies the digest, and that a
+file corrupted in place (same size) is downloaded again.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from download_model import DownloadError, download_model
+
+# The benchmark history store lives with the runtime tools in the app
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app" / "src" / "main" / "python"))
+from benchmark_history import add_history_argument, record_run
+
+REPO_ID = "local/test-model"
+
+
+class StandInHub:
+    """Local hub stand-in serving in-memory files with Range support."""
+
+    def __init__(self, files, bandwidth_mb_s):
+        self.files = files
+        self.bandwidth = bandwidth_mb_s * 1024 * 1024
+        self.bytes_served = 0
+        self.fail_after_bytes = None
+        self.lock = threading.Lock()
+        hub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                hub.handle(self)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.endpoint = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, request):
+        api_prefix = f"/api/models/{REPO_ID}/revision/"
+        file_prefix = f"/{REPO_ID}/resolve/main/"
+        if request.path.startswith(api_prefix):
+            siblings = [
+                {"rfilename": name, "size": len(data),
+                 "lfs": {"sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}}
+                for name, data in self.files.items()
+            ]
+            self._send(request, 200, json.dumps({"siblings": siblings}).encode())
+            return
+        if not request.path.startswith(file_prefix):
+            self._send(request, 404, b"")
+            return
+        data = self.files.get(request.path[len(file_prefix):])
+        if data is None:
+            self._send(request, 404, b"")
+            return
+
+        status, start, end = 200, 0, len(data) - 1
+        match = re.match(r"bytes=(\d+)-(\d*)", request.headers.get("Range", ""))
+        if match:
+            status = 206
+            start = int(match.group(1))
+            end = min(int(match.group(2) or end), end)
+        request.send_response(status)
+        request.send_header("Content-Length", str(end - start + 1))
+        if status == 206:
+            request.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        request.end_headers()
+
+        block = 64 * 1024
+        for offset in range(start, end + 1, block):
+            payload = data[offset:min(offset + block, end + 1)]
+            with self.lock:
+                if self.fail_after_bytes is not None and self.bytes_served >= self.fail_after_bytes:
+                    # Drop the connection mid-transfer to simulate an interruption
+                    request.close_connection = True
+                    return
+                self.bytes_served += len(payload)
+            request.wfile.write(payload)
+            time.sleep(len(payload) / self.bandwidth)
+
+    @staticmethod
+    def _send(request, status, body):
+        request.send_response(status)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+
+def _generate_files(size_mb):
+    return {
+        "model_index.json": json.dumps({"_class_name": "StableDiffusionPipeline"}).encode(),
+        "unet/diffusion_pytorch_model.safetensors": os.urandom(size_mb * 1024 * 1024),
+        "vae/diffusion_pytorch_model.safetensors": os.urandom(size_mb * 1024 * 1024 // 4),
+    }
+
+
+def _verify(files, local_dir):
+    for name, data in files.items():
+        path = Path(local_dir) / name
+        if not path.exists() or path.read_bytes() != data:
+            return False
+    return True
+
+
+def _completed_bytes(files, local_dir):
+    """Bytes the downloader recorded as done: finished files plus completed ranges."""
+    completed = 0
+    for name, data in files.items():
+        path = Path(local_dir) / name
+        state_path = path.with_name(path.name + ".part.json")
+        if state_path.exists():
+            state = json.loads(state_path.read_text())
+            chunk_size = state["chunk_size"]
+            completed += sum(min(chunk_size, len(data) - index * chunk_size)
+                             for index in state["completed"])
+        elif path.exists():
+            completed += len(data)
+    return completed
+
+
+def run_throughput(hub, files, chunk_size, workers):
+    results = {}
+    for count in (1, workers):
+        local_dir = tempfile.mkdtemp()
+        try:
+            stats = download_model(REPO_ID, local_dir, endpoint=hub.endpoint,
+                                   workers=count, chunk_size=chunk_size)
+            if not _verify(files, local_dir):
+                raise DownloadError(f"downloaded files differ with {count} workers")
+            results[count] = stats["throughput_mb_s"]
+        finally:
+            shutil.rmtree(local_dir, ignore_errors=True)
+    return results
+
+
+def run_resume(hub, files, chunk_size, workers):
+    total = sum(len(data) for data in files.values())
+    local_dir = tempfile.mkdtemp()
+    try:
+        hub.bytes_served = 0
+        hub.fail_after_bytes = total * 3 // 4
+        try:
+            download_model(REPO_ID, local_dir, endpoint=hub.endpoint, workers=workers,
+                           chunk_size=chunk_size, retries=0)
+            raise AssertionError("interrupted download unexpectedly completed")
+        except DownloadError:
+            pass
+        first_run = hub.bytes_served
+        completed = _completed_bytes(files, local_dir)
+        # Anything served but not recorded was a range still in flight
+        if first_run - completed > workers * chunk_size:
+            raise AssertionError(
+                f"{first_run - completed} bytes served but not recorded, more than one "
+                f"range per worker ({workers * chunk_size})"
+            )
+
+        hub.fail_after_bytes = None
+        hub.bytes_served = 0
+        stats = download_model(REPO_ID, local_dir, endpoint=hub.endpoint, workers=workers,
+                               chunk_size=chunk_size)
+        if not _verify(files, local_dir):
+            raise AssertionError("resumed download produced different files")
+        leftovers = list(Path(local_dir).rglob("*.part*"))
+        if leftovers:
+            raise AssertionError(f"partial files left behind: {leftovers}")
+        # Ranges finished before the interruption must not be fetched again
+        if stats["bytes"] != total - completed or stats["bytes"] >= total:
+            raise AssertionError(
+                f"resume transferred {stats['bytes']} bytes, expected the "
+                f"{total - completed} bytes not completed before the interruption"
+            )
+
+        # Same size, different content: only the digest check can catch it
+        name, data = max(files.items(), key=lambda item: len(item[1]))
+        path = Path(local_dir) / name
+        with open(path, "r+b") as f:
+            f.write(bytes([data[0] ^ 0xFF]))
+        refetch = download_model(REPO_ID, local_dir, endpoint=hub.endpoint, workers=workers,
+                                 chunk_size=chunk_size)
+        if not _verify(files, local_dir) or refetch["bytes"] != len(data):
+            raise AssertionError(f"corrupted {name} was not downloaded again")
+        return first_run, stats["bytes"], total
+    finally:
+        shutil.rmtree(local_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parallel model downloader")
+    parser.add_argument("--size-mb", type=int, default=32, help="Size of the largest test file")
+    parser.add_argument("--chunk-size-mb", type=int, default=2, help="Range request size")
+    parser.add_argument("--workers", type=int, default=8, help="Parallel range requests")
+    parser.add_argument("--bandwidth-mb-s", type=float, default=20.0,
+                        help="Per-connection bandwidth cap of the stand-in server")
+    add_history_argument(parser)
+    args = parser.parse_args()
+
+    files = _generate_files(args.size_mb)
+    chunk_size = args.chunk_size_mb * 1024 * 1024
+    hub = StandInHub(files, args.bandwidth_mb_s)
+    try:
+        throughput = run_throughput(hub, files, chunk_size, args.workers)
+        first_run, resumed, total = run_resume(hub, files, chunk_size, args.workers)
+    except (AssertionError, DownloadError) as e:
+        print(f"FAILED: {e}")
+        sys.exit(1)
+    finally:
+        hub.close()
+
+    print(f"Serial throughput: {throughput[1]:.1f} MB/s")
+    print(f"Parallel throughput ({args.workers} workers): {throughput[args.workers]:.1f} MB/s "
+          f"({throughput[args.workers] / throughput[1]:.1f}x)")
+    print(f"Resume: {first_run} bytes before interruption, {resumed} bytes after, "
+          f"{total} bytes total")
+    if args.history:
+        record_run(args.history, "download", {
+            "serial": {"throughput_mb_s": throughput[1]},
+            "parallel": {"throughput_mb_s": throughput[args.workers]},
+        }, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,11 +7,18 @@ different scheduler implementations.
 """
 
 import argparse
+import sys
 import time
-import numpy as np
+from pathlib import Path
+
+# The benchmark history store lives with the runtime tools in the app
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app" / "src" / "main" / "python"))
+from benchmark_history import add_history_argument, record_run
 
 
 def run_benchmark(size: int, steps: int) -> float:
+    import numpy as np
+
     latents = np.random.randn(size).astype(np.float32)
     model_out = np.random.randn(size).astype(np.float32)
 
@@ -29,10 +36,13 @@ def main():
                         help="Number of latent elements")
     parser.add_argument("--steps", type=int, default=20,
                         help="Number of inference steps to simulate")
+    add_history_argument(parser)
     args = parser.parse_args()
 
     duration = run_benchmark(args.size, args.steps)
     print(f"Simulated {args.steps} steps on {args.size} elements in {duration:.4f}s")
+    if args.history:
+        record_run(args.history, "schedulers", {"simulated": {"step_ms": 1000 * duration / args.steps}}, args)
 
 
 if __name__ == "__main__":
@@ -54,8 +54,9 @@ def setup_pipeline(model_path: str, device: str = "cpu") -> StableDiffusionPipel
         low_cpu_mem_usage=True
     )
     
-    # Memory optimizations
-    pipeline.enable_attention_slicing(slice_size="max")
+    # Memory optimizations. Attention slicing is left off: the traced sliced
+    # processor unrolls per-head loops for the export batch size. The exported
+    # attention is fused or query-sliced by attention_fusion.py instead.
     pipeline.enable_vae_tiling()
     
     return pipeline
@@ -93,6 +94,22 @@ def export_text_encoder_to_onnx(text_encoder, output_path: str):
         )
         logger.info("Text Encoder export completed successfully")
 
+def added_cond_kwargs(unet, sample):
+    """
+    Fixed added conditioning (pooled text embeds, time ids) for the UNet exports.
+
+    Neither is an input of the exported graphs, so both are zeros: random
+    values would trace into RandomNormal nodes and make the graph
+    nondeterministic. The full and DeepCache exports share these values, so
+    they compute the same model.
+    """
+    if getattr(unet.config, "addition_embed_type", None) != "text_time":
+        return None
+    time_ids = torch.zeros(sample.shape[0], 6, dtype=sample.dtype, device=sample.device)
+    text_dim = unet.add_embedding.linear_1.in_features - time_ids.shape[1] * unet.config.addition_time_embed_dim
+    text_embeds = torch.zeros(sample.shape[0], text_dim, dtype=sample.dtype, device=sample.device)
+    return {"text_embeds": text_embeds, "time_ids": time_ids}
+
 def export_unet_to_onnx(unet, output_path: str):
     """Export UNet to ONNX with proper input handling."""
     logger.info("Starting UNet export...")
@@ -109,16 +126,11 @@ def export_unet_to_onnx(unet, output_path: str):
             logger.info("- encoder_hidden_states: %s", encoder_hidden_states.shape)
             
             # Handle the output properly for ONNX export
-            added_cond_kwargs = {
-                "text_embeds": torch.randn(1, 1280, device=latent_model_input.device),
-                "time_ids": torch.randn(1, 6, device=latent_model_input.device)
-            }
-            
             output = self.unet(
                 latent_model_input,
                 timesteps,
                 encoder_hidden_states=encoder_hidden_states,
-                added_cond_kwargs=added_cond_kwargs
+                added_cond_kwargs=added_cond_kwargs(self.unet, latent_model_input)
             )
             return output.sample
     
@@ -148,23 +160,209 @@ def export_unet_to_onnx(unet, output_path: str):
         )
         logger.info("UNet export completed successfully")
 
+def check_deepcache_support(unet):
+    """
+    Fail when the UNet uses forward features the DeepCache wrappers do not reimplement.
+
+    The wrappers rebuild UNet2DConditionModel.forward without encoder_hid_proj,
+    class_embedding, time_embed_act, timestep_cond, input centering or added
+    embeddings other than text_time. attention_mask is not an input of either
+    export, so it is None in the full and the DeepCache graphs alike.
+    """
+    config = unet.config
+    unsupported = []
+    if getattr(unet, "encoder_hid_proj", None) is not None:
+        unsupported.append("encoder_hid_proj")
+    if getattr(unet, "class_embedding", None) is not None:
+        unsupported.append("class_embedding")
+    if getattr(unet, "time_embed_act", None) is not None:
+        unsupported.append("time_embed_act")
+    if getattr(unet.time_embedding, "cond_proj", None) is not None:
+        unsupported.append("time_cond_proj_dim")
+    if getattr(config, "center_input_sample", False):
+        unsupported.append("center_input_sample")
+    if getattr(config, "addition_embed_type", None) not in (None, "text_time"):
+        unsupported.append(f"addition_embed_type={config.addition_embed_type}")
+    if unsupported:
+        raise ValueError("DeepCache export does not support this UNet config: " + ", ".join(unsupported))
+
+class _UNetDeepCacheBase(nn.Module):
+    """Re-implements UNet2DConditionModel.forward so the deep up-block features can be exposed."""
+
+    def __init__(self, unet):
+        super().__init__()
+        check_deepcache_support(unet)
+        self.unet = unet
+
+    def time_embedding(self, sample, timesteps):
+        unet = self.unet
+        t_emb = unet.time_proj(timesteps.expand(sample.shape[0])).to(dtype=sample.dtype)
+        emb = unet.time_embedding(t_emb)
+        added = added_cond_kwargs(unet, sample)
+        if added is not None:
+            # The text_time embedding of UNet2DConditionModel, on the same
+            # fixed conditioning as the full UNet export
+            time_embeds = unet.add_time_proj(added["time_ids"].flatten()).reshape(sample.shape[0], -1)
+            add_inputs = torch.cat([added["text_embeds"], time_embeds], dim=-1).to(emb.dtype)
+            emb = emb + unet.add_embedding(add_inputs)
+        return emb
+
+    @staticmethod
+    def run_down_block(block, hidden_states, emb, encoder_hidden_states):
+        if getattr(block, "has_cross_attention", False):
+            return block(hidden_states=hidden_states, temb=emb, encoder_hidden_states=encoder_hidden_states)
+        return block(hidden_states=hidden_states, temb=emb)
+
+    @staticmethod
+    def run_up_block(block, hidden_states, res_samples, emb, encoder_hidden_states, upsample_size=None):
+        if getattr(block, "has_cross_attention", False):
+            return block(
+                hidden_states=hidden_states,
+                res_hidden_states_tuple=res_samples,
+                temb=emb,
+                encoder_hidden_states=encoder_hidden_states,
+                upsample_size=upsample_size
+            )
+        return block(
+            hidden_states=hidden_states,
+            res_hidden_states_tuple=res_samples,
+            temb=emb,
+            upsample_size=upsample_size
+        )
+
+    def output_head(self, hidden_states):
+        unet = self.unet
+        if unet.conv_norm_out is not None:
+            hidden_states = unet.conv_act(unet.conv_norm_out(hidden_states))
+        return unet.conv_out(hidden_states)
+
+
+class UNetDeepCacheFullWrapper(_UNetDeepCacheBase):
+    """Full UNet that also returns the features entering the last up block."""
+
+    def forward(self, latent_model_input, timesteps, encoder_hidden_states):
+        unet = self.unet
+        emb = self.time_embedding(latent_model_input, timesteps)
+
+        hidden_states = unet.conv_in(latent_model_input)
+        down_block_res_samples = (hidden_states,)
+        for block in unet.down_blocks:
+            hidden_states, res_samples = self.run_down_block(block, hidden_states, emb, encoder_hidden_states)
+            down_block_res_samples += res_samples
+
+        if unet.mid_block is not None:
+            hidden_states = unet.mid_block(hidden_states, emb, encoder_hidden_states=encoder_hidden_states)
+
+        deep_features = None
+        for i, block in enumerate(unet.up_blocks):
+            is_final_block = i == len(unet.up_blocks) - 1
+            res_samples = down_block_res_samples[-len(block.resnets):]
+            down_block_res_samples = down_block_res_samples[:-len(block.resnets)]
+            upsample_size = None if is_final_block else down_block_res_samples[-1].shape[2:]
+            if is_final_block:
+                deep_features = hidden_states
+            hidden_states = self.run_up_block(
+                block, hidden_states, res_samples, emb, encoder_hidden_states, upsample_size
+            )
+
+        return self.output_head(hidden_states), deep_features
+
+
+class UNetDeepCacheShallowWrapper(_UNetDeepCacheBase):
+    """Shallow UNet: conv_in, first down block and last up block fed with cached deep features."""
+
+    def forward(self, latent_model_input, timesteps, encoder_hidden_states, deep_features):
+        unet = self.unet
+        emb = self.time_embedding(latent_model_input, timesteps)
+
+        hidden_states = unet.conv_in(latent_model_input)
+        down_block_res_samples = (hidden_states,)
+        _, res_samples = self.run_down_block(unet.down_blocks[0], hidden_states, emb, encoder_hidden_states)
+        down_block_res_samples += res_samples
+
+        last_block = unet.up_blocks[-1]
+        hidden_states = self.run_up_block(
+            last_block,
+            deep_features,
+            down_block_res_samples[:len(last_block.resnets)],
+            emb,
+            encoder_hidden_states
+        )
+        return self.output_head(hidden_states)
+
+
+def export_unet_deepcache_to_onnx(unet, full_path: str, shallow_path: str):
+    """Export the DeepCache UNet pair: a full graph with deep feature output and a shallow graph consuming them."""
+    logger.info("Starting DeepCache UNet export...")
+
+    full_unet = UNetDeepCacheFullWrapper(unet).eval()
+    shallow_unet = UNetDeepCacheShallowWrapper(unet).eval()
+
+    with torch.no_grad():
+        logger.info("Creating dummy inputs for DeepCache UNet")
+        sample = torch.randn(1, 4, 64, 64)
+        timesteps = torch.tensor([999], dtype=torch.int64)
+        encoder_hidden_states = torch.randn(1, 77, 2048)  # SD 3.5 uses 2048 dim
+        _, deep_features = full_unet(sample, timesteps, encoder_hidden_states)
+        logger.info("Deep feature shape: %s", deep_features.shape)
+
+        logger.info("Exporting full DeepCache UNet to ONNX...")
+        torch.onnx.export(
+            full_unet,
+            (sample, timesteps, encoder_hidden_states),
+            full_path,
+            input_names=["sample", "timesteps", "encoder_hidden_states"],
+            output_names=["output", "deep_features"],
+            dynamic_axes={
+                "sample": {0: "batch", 2: "height", 3: "width"},
+                "encoder_hidden_states": {0: "batch", 1: "sequence"},
+                "deep_features": {0: "batch", 2: "deep_height", 3: "deep_width"}
+            },
+            opset_version=17,
+            do_constant_folding=True
+        )
+
+        logger.info("Exporting shallow DeepCache UNet to ONNX...")
+        torch.onnx.export(
+            shallow_unet,
+            (sample, timesteps, encoder_hidden_states, deep_features),
+            shallow_path,
+            input_names=["sample", "timesteps", "encoder_hidden_states", "deep_features"],
+            output_names=["output"],
+            dynamic_axes={
+                "sample": {0: "batch", 2: "height", 3: "width"},
+                "encoder_hidden_states": {0: "batch", 1: "sequence"},
+                "deep_features": {0: "batch", 2: "deep_height", 3: "deep_width"}
+            },
+            opset_version=17,
+            do_constant_folding=True
+        )
+        logger.info("DeepCache UNet export completed successfully")
+
+def vae_latent_scaling(vae):
+    """(scaling_factor, shift_factor) from the VAE config; older VAEs have no shift."""
+    scaling_factor = vae.config.scaling_factor
+    shift_factor = getattr(vae.config, "shift_factor", None) or 0.0
+    return scaling_factor, shift_factor
+
 def export_vae_to_onnx(vae, output_path: str):
     """Export VAE decoder to ONNX with proper input handling."""
     logger.info("Starting VAE Decoder export...")
     
     class VAEDecoderWrapper(nn.Module):
-        def __init__(self, decoder):
+        def __init__(self, vae):
             super().__init__()
-            self.decoder = decoder
+            self.decoder = vae.decoder
+            self.scaling_factor, self.shift_factor = vae_latent_scaling(vae)
         
         def forward(self, latents):
             logger.info("VAE forward pass - Input shape: %s", latents.shape)
-            # Scale the latents appropriately
-            latents = latents / 0.18215
+            # Undo the latent scaling the encoder applied
+            latents = latents / self.scaling_factor + self.shift_factor
             # Return the decoder output directly
             return self.decoder(latents)
     
-    wrapped_decoder = VAEDecoderWrapper(vae.decoder)
+    wrapped_decoder = VAEDecoderWrapper(vae)
     wrapped_decoder.eval()
     
     with torch.no_grad():
@@ -188,6 +386,48 @@ def export_vae_to_onnx(vae, output_path: str):
         )
         logger.info("VAE Decoder export completed successfully")
 
+def export_vae_encoder_to_onnx(vae, output_path: str):
+    """Export VAE encoder to ONNX for img2img and inpainting."""
+    logger.info("Starting VAE Encoder export...")
+    
+    class VAEEncoderWrapper(nn.Module):
+        def __init__(self, vae):
+            super().__init__()
+            self.encoder = vae.encoder
+            self.quant_conv = vae.quant_conv
+            self.scaling_factor, self.shift_factor = vae_latent_scaling(vae)
+        
+        def forward(self, sample):
+            logger.info("VAE encoder forward pass - Input shape: %s", sample.shape)
+            moments = self.quant_conv(self.encoder(sample))
+            # Use the distribution mean; the scheduler adds the noise
+            mean, _ = torch.chunk(moments, 2, dim=1)
+            # Scale so the latents match what the decoder wrapper expects
+            return (mean - self.shift_factor) * self.scaling_factor
+    
+    wrapped_encoder = VAEEncoderWrapper(vae)
+    wrapped_encoder.eval()
+    
+    with torch.no_grad():
+        logger.info("Creating dummy input for VAE Encoder")
+        sample = torch.randn(1, 3, 512, 512)
+        
+        logger.info("Exporting VAE Encoder to ONNX...")
+        torch.onnx.export(
+            wrapped_encoder,
+            (sample,),
+            output_path,
+            input_names=["sample"],
+            output_names=["latents"],
+            dynamic_axes={
+                "sample": {0: "batch", 2: "height", 3: "width"},
+                "latents": {0: "batch", 2: "latent_height", 3: "latent_width"}
+            },
+            opset_version=17,
+            do_constant_folding=True
+        )
+        logger.info("VAE Encoder export completed successfully")
+
 def optimize_model(
     pipeline: StableDiffusionPipeline,
     model_path: str,
@@ -201,24 +441,38 @@ def optimize_model(
     
     try:
         # First save the pipeline components
-        logger.info("Step 1/4: Saving pipeline components...")
+        logger.info("Step 1/5: Saving pipeline components...")
         pipeline.save_pretrained(output_dir)
         
         # Export Text Encoder
-        logger.info("Step 2/4: Converting Text Encoder...")
+        logger.info("Step 2/5: Converting Text Encoder...")
         text_encoder_path = os.path.join(output_dir, "text_encoder.onnx")
         export_text_encoder_to_onnx(pipeline.text_encoder, text_encoder_path)
         
         # Export UNet
-        logger.info("Step 3/4: Converting UNet...")
+        logger.info("Step 3/5: Converting UNet...")
         unet_path = os.path.join(output_dir, "unet.onnx")
         export_unet_to_onnx(pipeline.unet, unet_path)
         
         # Export VAE Decoder
-        logger.info("Step 4/4: Converting VAE Decoder...")
+        logger.info("Step 4/5: Converting VAE Decoder...")
         vae_path = os.path.join(output_dir, "vae_decoder.onnx")
         export_vae_to_onnx(pipeline.vae, vae_path)
         
+        # Export VAE Encoder for img2img and inpainting
+        logger.info("Step 5/5: Converting VAE Encoder...")
+        vae_encoder_path = os.path.join(output_dir, "vae_encoder.onnx")
+        export_vae_encoder_to_onnx(pipeline.vae, vae_encoder_path)
+        
+        # Optional DeepCache UNet pair for cross-step feature caching
+        if optimization_config and optimization_config.get("deep_cache"):
+            logger.info("Converting DeepCache UNet variants...")
+            export_unet_deepcache_to_onnx(
+                pipeline.unet,
+                os.path.join(output_dir, "unet_deepcache.onnx"),
+                os.path.join(output_dir, "unet_shallow.onnx")
+            )
+        
         # Save configurations
         logger.info("Saving model configurations...")
         
@@ -230,6 +484,7 @@ def optimize_model(
         logger.info(f"Saved scheduler config to {scheduler_path}")
         
         # Save model configuration
+        scaling_factor, shift_factor = vae_latent_scaling(pipeline.vae)
         model_config = {
             "model_type": "StableDiffusion",
             "version": "3.5-medium",
@@ -268,7 +523,9 @@ def optimize_model(
                 "in_channels": 3,
                 "out_channels": 3,
                 "latent_channels": 4,
-                "scaling_factor": 0.18215
+                # Already applied inside the exported encoder and decoder
+                "scaling_factor": scaling_factor,
+                "shift_factor": shift_factor
             }
         }
         
@@ -321,7 +578,8 @@ def main():
                 "optimization_level": 99,
                 "optimize_for_mobile": True,
                 "quantization": "int8",
-                "half_precision": True
+                "half_precision": True,
+                "deep_cache": False
             }
         )
         
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""Concurrent, resumable model downloader.
+
+Fetches a Hugging Face model repository's file list and downloads the files
+straight into their final layout. Large files are split into HTTP range
+requests that run in parallel; completed ranges are recorded next to the
+partial file so an interrupted download resumes where it stopped. SHA-256
+digests are checked while the download is still running by hashing ranges as
+soon as they form a contiguous prefix of the file. Files already on disk are
+only skipped when their content matches the listed digest; the verified
+digest is stamped under '<local_dir>/.download' so unchanged files are not
+hashed again on every run.
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import quote
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENDPOINT = "https://huggingface.co"
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+STREAM_BUFFER_SIZE = 1024 * 1024
+REQUEST_TIMEOUT = 60
+STAMP_DIR = ".download"
+
+
+class DownloadError(Exception):
+    """Raised when a file cannot be downloaded or fails verification."""
+
+
+@dataclass
+class RemoteFile:
+    path: str
+    size: int
+    sha256: Optional[str] = None
+    # Git blob id of files stored outside LFS (the same value as their ETag)
+    blob_id: Optional[str] = None
+
+
+def _request(url: str, token: Optional[str] = None, headers: Optional[Dict[str, str]] = None):
+    request = urllib.request.Request(url, headers=dict(headers or {}))
+    if token:
+        request.add_header("Authorization", f"Bearer {token}")
+    return urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT)
+
+
+def list_model_files(repo_id: str, revision: str = "main", endpoint: str = DEFAULT_ENDPOINT,
+                     token: Optional[str] = None) -> List[RemoteFile]:
+    """List the files of a model repository with their sizes and LFS digests."""
+    url = f"{endpoint}/api/models/{repo_id}/revision/{quote(revision, safe='')}?blobs=true"
+    with _request(url, token) as response:
+        info = json.load(response)
+
+    files = []
+    for sibling in info.get("siblings", []):
+        lfs = sibling.get("lfs") or {}
+        files.append(RemoteFile(
+            path=sibling["rfilename"],
+            size=int(lfs.get("size", sibling.get("size", 0)) or 0),
+            sha256=lfs.get("sha256"),
+            blob_id=None if lfs else sibling.get("blobId"),
+        ))
+    return files
+
+
+def filter_files(files: Sequence[RemoteFile], allow_patterns: Optional[Sequence[str]] = None,
+                 ignore_patterns: Optional[Sequence[str]] = None) -> List[RemoteFile]:
+    """Keep files matching any allow pattern and no ignore pattern."""
+    selected = []
+    for remote in files:
+        if allow_patterns and not any(fnmatch.fnmatch(remote.path, p) for p in allow_patterns):
+            continue
+        if ignore_patterns and any(fnmatch.fnmatch(remote.path, p) for p in ignore_patterns):
+            continue
+        selected.append(remote)
+    return selected
+
+
+class _FileDownload:
+    """Range-request state for a single file.
+
+    Progress lives in '<file>.part.json' next to the '<file>.part' data so a
+    later run can skip ranges that were already written.
+    """
+
+    def __init__(self, remote: RemoteFile, url: str, destination: Path, stamp_path: Path,
+                 chunk_size: int):
+        self.remote = remote
+        self.url = url
+        self.destination = destination
+        self.stamp_path = stamp_path
+        self.part_path = destination.with_name(destination.name + ".part")
+        self.state_path = destination.with_name(destination.name + ".part.json")
+        self.chunk_size = chunk_size
+        self.num_chunks = max(1, -(-remote.size // chunk_size))
+        self.completed = set()
+        self.bytes_downloaded = 0
+        self._lock = threading.Lock()
+        self._hasher = hashlib.sha256()
+        self._hashed_chunks = 0
+
+    def prepare(self):
+        """Create or reopen the partial file and load the resume state."""
+        self.destination.parent.mkdir(parents=True, exist_ok=True)
+        state = None
+        if self.part_path.exists() and self.state_path.exists():
+            try:
+                state = json.loads(self.state_path.read_text())
+            except ValueError:
+                state = None
+        if (state and state.get("size") == self.remote.size
+                and state.get("sha256") == self.remote.sha256
+                and state.get("chunk_size") == self.chunk_size):
+            self.completed = set(state.get("completed", []))
+            if self.completed:
+                logger.info("Resuming %s (%d/%d ranges done)",
+                            self.remote.path, len(self.completed), self.num_chunks)
+        else:
+            self.completed = set()
+            with open(self.part_path, "wb") as f:
+                f.truncate(self.remote.size)
+            self._save_state()
+        self._advance_hash()
+
+    def pending_chunks(self) -> List[int]:
+        return [index for index in range(self.num_chunks) if index not in self.completed]
+
+    def chunk_range(self, index: int):
+        start = index * self.chunk_size
+        return start, min(start + self.chunk_size, self.remote.size) - 1
+
+    def fetch_chunk(self, index: int, token: Optional[str], retries: int):
+        """Download one byte range into the partial file, retrying on network errors."""
+        start, end = self.chunk_range(index)
+        for attempt in range(retries + 1):
+            try:
+                self._fetch_range(start, end, token)
+                break
+            except (urllib.error.URLError, OSError, DownloadError) as e:
+                if attempt == retries:
+                    raise DownloadError(f"{self.remote.path} bytes {start}-{end}: {e}") from e
+                time.sleep(min(2 ** attempt, 30))
+        with self._lock:
+            self.completed.add(index)
+            self._save_state()
+            self._advance_hash()
+
+    def _fetch_range(self, start: int, end: int, token: Optional[str]):
+        if self.remote.size == 0:
+            return
+        headers = {"Range": f"bytes={start}-{end}"}
+        with _request(self.url, token, headers) as response:
+            whole_file = start == 0 and end == self.remote.size - 1
+            if response.status != 206 and not whole_file:
+                raise DownloadError("server ignored the range request")
+            written = 0
+            with open(self.part_path, "r+b") as f:
+                f.seek(start)
+                while True:
+                    buffer = response.read(STREAM_BUFFER_SIZE)
+                    if not buffer:
+                        break
+                    f.write(buffer)
+                    written += len(buffer)
+        if written != end - start + 1:
+            raise DownloadError(f"short read ({written} of {end - start + 1} bytes)")
+        with self._lock:
+            self.bytes_downloaded += written
+
+    def _save_state(self):
+        self.state_path.write_text(json.dumps({
+            "size": self.remote.size,
+            "sha256": self.remote.sha256,
+            "chunk_size": self.chunk_size,
+            "completed": sorted(self.completed),
+        }))
+
+    def _advance_hash(self):
+        """Hash every completed range that extends the contiguous prefix."""
+        if not self.remote.sha256:
+            return
+        with open(self.part_path, "rb") as f:
+            while self._hashed_chunks in self.completed:
+                start, end = self.chunk_range(self._hashed_chunks)
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    buffer = f.read(min(STREAM_BUFFER_SIZE, remaining))
+                    if not buffer:
+                        break
+                    self._hasher.update(buffer)
+                    remaining -= len(buffer)
+                self._hashed_chunks += 1
+
+    def finalize(self):
+        """Verify the digest and move the partial file into place."""
+        if self.remote.sha256:
+            digest = self._hasher.hexdigest()
+            if digest != self.remote.sha256:
+                self.part_path.unlink(missing_ok=True)
+                self.state_path.unlink(missing_ok=True)
+                raise DownloadError(
+                    f"{self.remote.path}: SHA-256 mismatch (expected {self.remote.sha256}, got {digest})"
+                )
+        os.replace(self.part_path, self.destination)
+        self.state_path.unlink(missing_ok=True)
+        if self.remote.sha256:
+            _write_stamp(self.stamp_path, self.destination, self.remote.sha256)
+        else:
+            self.stamp_path.unlink(missing_ok=True)
+
+
+def _expected_digest(remote: RemoteFile) -> Optional[str]:
+    return remote.sha256 or remote.blob_id
+
+
+def _file_digest(remote: RemoteFile, path: Path) -> str:
+    """SHA-256 for LFS files, the git blob id (SHA-1 over a header) otherwise."""
+    if remote.sha256:
+        hasher = hashlib.sha256()
+    else:
+        hasher = hashlib.sha1()
+        hasher.update(b"blob %d\0" % path.stat().st_size)
+    with open(path, "rb") as f:
+        for buffer in iter(lambda: f.read(STREAM_BUFFER_SIZE), b""):
+            hasher.update(buffer)
+    return hasher.hexdigest()
+
+
+def _write_stamp(stamp_path: Path, destination: Path, digest: str):
+    stamp_path.parent.mkdir(parents=True, exist_ok=True)
+    stamp_path.write_text(json.dumps({"digest": digest, "mtime_ns": destination.stat().st_mtime_ns}))
+
+
+def _is_complete(remote: RemoteFile, destination: Path, stamp_path: Path) -> bool:
+    """
+    Whether destination already holds remote's content.
+
+    Without a digest in the listing only the size can be compared. With one,
+    a stamp recording that digest for the file's current mtime is enough;
+    otherwise the file is hashed once and stamped when it matches.
+    """
+    if not destination.exists() or destination.stat().st_size != remote.size:
+        return False
+    expected = _expected_digest(remote)
+    if expected is None:
+        return True
+    try:
+        stamp = json.loads(stamp_path.read_text())
+    except (OSError, ValueError):
+        stamp = None
+    if stamp == {"digest": expected, "mtime_ns": destination.stat().st_mtime_ns}:
+        return True
+    if _file_digest(remote, destination) != expected:
+        logger.info("%s differs from the listed digest, downloading again", remote.path)
+        return False
+    _write_stamp(stamp_path, destination, expected)
+    return True
+
+
+def download_model(repo_id: str, local_dir: str, revision: str = "main",
+                   allow_patterns: Optional[Sequence[str]] = None,
+                   ignore_patterns: Optional[Sequence[str]] = None,
+                   token: Optional[str] = None, endpoint: str = DEFAULT_ENDPOINT,
+                   workers: int = 8, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   retries: int = 3) -> Dict[str, float]:
+    """
+    Download a model repository into local_dir with parallel range requests.
+
+    Returns transfer statistics: bytes downloaded in this run, elapsed time and
+    throughput in MB/s.
+    """
+    local_dir = Path(local_dir)
+    files = filter_files(list_model_files(repo_id, revision, endpoint, token),
+                         allow_patterns, ignore_patterns)
+
+    downloads = []
+    for remote in files:
+        destination = local_dir / remote.path
+        stamp_path = local_dir / STAMP_DIR / (remote.path + ".json")
+        if _is_complete(remote, destination, stamp_path):
+            logger.info("Skipping %s (already downloaded)", remote.path)
+            continue
+        url = f"{endpoint}/{repo_id}/resolve/{quote(revision, safe='')}/{quote(remote.path)}"
+        download = _FileDownload(remote, url, destination, stamp_path, chunk_size)
+        download.prepare()
+        downloads.append(download)
+
+    total_bytes = sum(d.remote.size for d in downloads)
+    logger.info("Downloading %d files (%.1f MB) with %d workers...",
+                len(downloads), total_bytes / (1024 * 1024), workers)
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for download in downloads:
+            futures[download] = [
+                executor.submit(download.fetch_chunk, index, token, retries)
+                for index in download.pending_chunks()
+            ]
+        wait([future for pending in futures.values() for future in pending])
+        for download, pending in futures.items():
+            for future in pending:
+                future.result()
+            download.finalize()
+            logger.info("Downloaded %s", download.remote.path)
+    elapsed = time.time() - start_time
+
+    downloaded = sum(d.bytes_downloaded for d in downloads)
+    throughput = downloaded / (1024 * 1024) / elapsed if elapsed > 0 else 0.0
+    logger.info("Downloaded %.1f MB in %.2fs (%.1f MB/s)",
+                downloaded / (1024 * 1024), elapsed, throughput)
+    return {"bytes": downloaded, "time": elapsed, "throughput_mb_s": throughput}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download a model repository")
+    parser.add_argument("repo_id", help="Repository id, e.g. stabilityai/sd-turbo")
+    parser.add_argument("local_dir", help="Directory to download into")
+    parser.add_argument("--revision", default="main", help="Branch, tag or commit")
+    parser.add_argument("--include", nargs="*", default=None, help="Glob patterns to download")
+    parser.add_argument("--exclude", nargs="*", default=None, help="Glob patterns to skip")
+    parser.add_argument("--endpoint", default=os.getenv("HF_ENDPOINT", DEFAULT_ENDPOINT),
+                        help="Hub endpoint (a local server can stand in for testing)")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent range requests")
+    parser.add_argument("--chunk-size-mb", type=int, default=DEFAULT_CHUNK_SIZE // (1024 * 1024),
+                        help="Size of each range request in MB")
+    parser.add_argument("--retries", type=int, default=3, help="Retries per range request")
+    args = parser.parse_args()
+
+    download_model(
+        args.repo_id,
+        args.local_dir,
+        revision=args.revision,
+        allow_patterns=args.include,
+        ignore_patterns=args.exclude,
+        token=os.getenv("HF_TOKEN"),
+        endpoint=args.endpoint.rstrip("/"),
+        workers=args.workers,
+        chunk_size=args.chunk_size_mb * 1024 * 1024,
+        retries=args.retries,
+    )
+
+
+if __name__ == "__main__":
+    main()
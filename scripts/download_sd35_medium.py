@@ -1,42 +1,39 @@
 import os
 from pathlib import Path
-from diffusers import StableDiffusionPipeline
-import torch
+from download_model import download_model
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Diffusers layout with full precision safetensors weights, matching what
+# convert_sd35_medium.py loads with StableDiffusionPipeline.from_pretrained.
+ALLOW_PATTERNS = ["model_index.json", "*/*.json", "*/*.txt", "*/*.safetensors"]
+IGNORE_PATTERNS = ["*.fp16.*", "vae_1_0/*", "*/openvino*"]
+
 def main():
     # Check for token
     token = os.getenv("HF_TOKEN")
     if not token:
         logger.error("Please set the HF_TOKEN environment variable with your Hugging Face token")
         return
-    
+
     # Setup paths
     model_dir = Path("/Users/admin/Downloads/VSCode/Android Diffusion App/Model")
     model_dir.mkdir(parents=True, exist_ok=True)
-    
+
     logger.info("Downloading SD 3.5 model...")
-    
-    # Download the model with token
-    pipeline = StableDiffusionPipeline.from_pretrained(
+
+    # Download the model files straight into the pipeline layout
+    download_model(
         "stabilityai/stable-diffusion-xl-base-1.0",  # Updated repository name
-        torch_dtype=torch.float32,
-        use_safetensors=True,
-        variant="fp16",
-        token=token  # Use the token for authentication
-    )
-    
-    # Save the model
-    logger.info("Saving model to disk...")
-    pipeline.save_pretrained(
         str(model_dir / "sd35_medium"),
-        safe_serialization=True
+        allow_patterns=ALLOW_PATTERNS,
+        ignore_patterns=IGNORE_PATTERNS,
+        token=token  # Use the token for authentication
     )
-    
+
     logger.info("Model downloaded successfully!")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()